@@ -0,0 +1,98 @@
+"""Claim-based authorization helpers for Deliveroo app.
+
+Access tokens carry the user's role (``admin``) and ``token_version``, so
+authorization is decided from the verified JWT alone. Changing a user's
+role bumps ``User.token_version``; each worker caches the current version
+per user for ``TOKEN_VERSION_CACHE_SECONDS`` and rejects tokens minted
+with an older one, so a demotion takes effect within that window without
+a per-request query.
+"""
+import threading
+import time
+from collections import namedtuple
+from functools import wraps
+from flask import current_app
+from flask_jwt_extended import get_jwt, get_jwt_identity, jwt_required
+
+Principal = namedtuple('Principal', ['id', 'admin'])
+
+ADMIN_CLAIM = 'admin'
+VERSION_CLAIM = 'ver'
+
+
+def token_claims(user):
+    """Extra JWT claims for ``user`` -- pass as ``additional_claims``."""
+    return {ADMIN_CLAIM: bool(user.admin), VERSION_CLAIM: user.token_version or 0}
+
+
+class TokenVersionCache:
+    """Per-process TTL cache of ``user_id -> (token_version, admin)``."""
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        ttl = current_app.config.get('TOKEN_VERSION_CACHE_SECONDS', 30)
+        now = time.monotonic()
+        entry = self._entries.get(user_id)
+        if entry is not None and now - entry[0] < ttl:
+            return entry[1]
+
+        from server.config import db
+        from server.models import User
+        row = db.session.query(User.token_version, User.admin).filter(User.id == user_id).first()
+        value = (row[0] or 0, bool(row[1])) if row else None
+        with self._lock:
+            self._entries[user_id] = (now, value)
+        return value
+
+    def invalidate(self, user_id=None):
+        with self._lock:
+            if user_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(user_id, None)
+
+
+token_versions = TokenVersionCache()
+
+
+def current_principal():
+    """Return the caller as a Principal, or None if the token is stale.
+
+    Tokens issued before role claims existed fall back to the cached
+    lookup for their role.
+    """
+    user_id = get_jwt_identity()
+    claims = get_jwt()
+    current = token_versions.get(user_id)
+    if current is None:
+        return None
+
+    version, admin = current
+    if VERSION_CLAIM in claims:
+        if claims[VERSION_CLAIM] != version:
+            return None
+        admin = bool(claims.get(ADMIN_CLAIM))
+    return Principal(user_id, admin)
+
+
+def is_admin():
+    """True when the current (fresh) token carries the admin role."""
+    principal = current_principal()
+    return bool(principal and principal.admin)
+
+
+def admin_required(func):
+    """Require a fresh admin token; passes ``current_user`` as a Principal."""
+    @wraps(func)
+    @jwt_required()
+    def wrapper(*args, **kwargs):
+        principal = current_principal()
+        if principal is None:
+            return {"error": "Token is no longer valid, please log in again"}, 401
+        if not principal.admin:
+            return {"error": "Admin access required"}, 403
+        return func(*args, **kwargs, current_user=principal)
+    return wrapper
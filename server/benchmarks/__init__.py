@@ -0,0 +1 @@
+"""Micro-benchmarks for Deliveroo hot paths (run each module with ``python -m``)."""
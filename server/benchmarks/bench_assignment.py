@@ -0,0 +1,38 @@
+"""Courier assignment: 10,000 pending parcels x 500 couriers on one core and on four.
+
+Run with ``python -m server.benchmarks.bench_assignment``. Parcels and
+couriers are scattered around Nairobi; total parcel weight is about 80% of
+total courier capacity, so the capacity constraint is active.
+"""
+import random
+import time
+from server.services import assignment
+from server.services.assignment import Courier, Job, assign_couriers
+
+PARCELS = 10_000
+COURIERS = 500
+
+
+def main():
+    rng = random.Random(11)
+    jobs = [Job(i, rng.gauss(-1.29, 0.1), rng.gauss(36.82, 0.1), rng.uniform(0.5, 20))
+            for i in range(PARCELS)]
+    capacity = sum(j.weight for j in jobs) / COURIERS / 0.8
+    couriers = [Courier(c, rng.gauss(-1.29, 0.1), rng.gauss(36.82, 0.1), capacity)
+                for c in range(COURIERS)]
+
+    print(f"{PARCELS:,} parcels x {COURIERS} couriers "
+          f"({'numpy' if assignment.np is not None else 'pure Python'} distance matrix)")
+    runs = [("greedy only, 1 worker", dict(improve_seconds=0)),
+            ("greedy + improve, 1 worker", dict()),
+            ("greedy + improve, 4 workers", dict(workers=4))]
+    for label, options in runs:
+        start = time.perf_counter()
+        result = assign_couriers(jobs, couriers, **options)
+        elapsed = time.perf_counter() - start
+        print(f"  {label:<28} {elapsed:>6.2f} s  assigned {len(result.assignments):,}  "
+              f"total {result.total_distance_m / 1000:,.0f} km")
+
+
+if __name__ == '__main__':
+    main()
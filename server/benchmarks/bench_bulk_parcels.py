@@ -0,0 +1,66 @@
+"""Parcels/sec: one POST /parcels per parcel vs. a single POST /parcels/bulk.
+
+Run with ``python -m server.benchmarks.bench_bulk_parcels``. Uses a
+throwaway SQLite file so every COMMIT really hits the disk, and the offline
+route estimator so no network is involved.
+"""
+import os
+import tempfile
+import time
+from server.config import create_app, db
+from server.models import User
+
+PARCELS = 1000
+
+
+def payload(i):
+    return {
+        "pickupLocationText": "Westlands, Nairobi",
+        "destinationLocationText": f"Kilimani, Nairobi #{i}",
+        "pickup_latitude": -1.2676, "pickup_longitude": 36.8108,
+        "destination_latitude": -1.2921, "destination_longitude": 36.7856,
+        "weight": "2.5",
+        "description": "Bench parcel",
+    }
+
+
+def main():
+    path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}',
+        'JWT_SECRET_KEY': 'bench-secret',
+        'GOOGLE_MAPS_API_KEY': None,
+        'RATELIMIT_ENABLED': False,
+    })
+    with app.app_context():
+        db.create_all()
+        user = User(username='bench', email='bench@deliveroo.com', phone_number='0700000000')
+        user.password = 'benchpass123'
+        db.session.add(user)
+        db.session.commit()
+
+        client = app.test_client()
+        token = client.post('/login', json={'username': 'bench', 'password': 'benchpass123'}
+                            ).get_json()['access_token']
+        headers = {'Authorization': f'Bearer {token}'}
+        items = [payload(i) for i in range(PARCELS)]
+
+        start = time.perf_counter()
+        for item in items:
+            assert client.post('/parcels', json=item, headers=headers).status_code == 201
+        single = time.perf_counter() - start
+
+        start = time.perf_counter()
+        response = client.post('/parcels/bulk', json=items, headers=headers)
+        bulk = time.perf_counter() - start
+        assert response.status_code == 201, response.get_json()
+
+    print(f"{PARCELS} parcels, SQLite file database")
+    print(f"  {'POST /parcels x N':<24} {PARCELS / single:>10,.0f} parcels/sec")
+    print(f"  {'POST /parcels/bulk':<24} {PARCELS / bulk:>10,.0f} parcels/sec")
+    print(f"  speedup {single / bulk:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
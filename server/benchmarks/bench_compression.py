@@ -0,0 +1,94 @@
+"""CPU cost vs bytes saved for compressing typical API payloads.
+
+Run with ``python -m server.benchmarks.bench_compression``. Payloads are
+built like the real responses (serialized parcel and history rows with
+varied ids, names, coordinates and timestamps): a user's parcel page, an
+admin listing, a history page and an NDJSON export compressed the streamed
+way, 500 rows per flushed chunk. brotli and zstd rows appear when those
+packages are installed.
+"""
+import random
+import time
+from datetime import datetime, timedelta
+from server.compression import LEVELS, MIN_SIZE, available_codings, compress, compress_stream
+from server.serializers import dumps
+
+ROUNDS = 5
+STATUSES = ('pending', 'in-transit', 'delivered', 'cancelled')
+TOWNS = ('Nairobi', 'Mombasa', 'Kisumu', 'Nakuru', 'Eldoret', 'Thika')
+GRID = {'gzip': (1, 6, 9), 'br': (1, 4, 6), 'zstd': (1, 3, 9)}
+
+
+def parcel_rows(n, rng):
+    start = datetime(2026, 10, 1)
+    rows = []
+    for i in range(n):
+        created = start + timedelta(seconds=rng.randrange(86400 * 14))
+        lat, lng = rng.gauss(-1.29, 0.5), rng.gauss(36.82, 0.5)
+        rows.append({
+            'id': 10_000 + i, 'description': f"Parcel {rng.randrange(10**6)}",
+            'weight': round(rng.uniform(0.5, 30), 1), 'status': rng.choice(STATUSES),
+            'sender_name': f"Sender {rng.randrange(5000)}", 'sender_phone_number': f"07{rng.randrange(10**8):08d}",
+            'pickup_location_text': rng.choice(TOWNS), 'destination_location_text': rng.choice(TOWNS),
+            'pick_up_longitude': lng, 'pick_up_latitude': lat,
+            'destination_longitude': rng.gauss(36.82, 1), 'destination_latitude': rng.gauss(-1.29, 1),
+            'current_location': rng.choice(TOWNS), 'current_location_longitude': lng,
+            'current_location_latitude': lat, 'pickup_geohash': 'kzf0' + f"{rng.randrange(36**5):05x}",
+            'current_geohash': 'kzf0' + f"{rng.randrange(36**5):05x}",
+            'distance': round(rng.uniform(1, 500), 2), 'cost': round(rng.uniform(75, 4500), 1),
+            'created_at': created.isoformat(), 'updated_at': (created + timedelta(hours=3)).isoformat(),
+            'version': rng.randrange(1, 6), 'recipient_name': f"Recipient {rng.randrange(5000)}",
+            'recipient_phone_number': f"07{rng.randrange(10**8):08d}", 'courier_id': rng.randrange(500),
+            'user_id': rng.randrange(2000),
+        })
+    return rows
+
+
+def history_rows(n, rng):
+    start = datetime(2026, 10, 1)
+    return [{
+        'id': 50_000 + i, 'parcel_id': rng.randrange(10_000, 20_000), 'updated_by': rng.randrange(20),
+        'update_type': rng.choice(('status', 'location')), 'old_value': rng.choice(STATUSES + TOWNS),
+        'new_value': rng.choice(STATUSES + TOWNS),
+        'timestamp': (start + timedelta(seconds=rng.randrange(86400 * 14))).strftime("%Y-%m-%d %H:%M:%S"),
+    } for i in range(n)]
+
+
+def timed(fn):
+    best, result = float('inf'), None
+    for _ in range(ROUNDS):
+        began = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - began)
+    return best, result
+
+
+def main():
+    rng = random.Random(3)
+    parcels = parcel_rows(10_000, rng)
+    payloads = [
+        ("user page, 10 parcels", dumps({'parcels': parcels[:10], 'page': 1, 'per_page': 10}).encode()),
+        ("admin listing, 1,000 parcels", dumps(parcels[:1000]).encode()),
+        ("history page, 200 rows", dumps({'histories': history_rows(200, rng)}).encode()),
+    ]
+    ndjson = [''.join(dumps(row) + '\n' for row in parcels[i:i + 500]) for i in range(0, len(parcels), 500)]
+
+    print(f"threshold {MIN_SIZE} B, default levels {LEVELS}, codecs: {', '.join(available_codings())}")
+    print(f"{'payload':<32}{'codec':>6}{'lvl':>5}{'in KB':>10}{'out KB':>9}{'ratio':>7}{'ms':>9}{'KB saved/ms':>13}")
+    for label, data in payloads + [("NDJSON export, 10k (streamed)", None)]:
+        for coding in available_codings():
+            for level in GRID[coding]:
+                if data is None:
+                    size = sum(len(chunk.encode()) for chunk in ndjson)
+                    seconds, out = timed(lambda: b''.join(compress_stream(ndjson, coding, level)))
+                else:
+                    size = len(data)
+                    seconds, out = timed(lambda: compress(data, coding, level))
+                ms = seconds * 1000
+                saved = (size - len(out)) / 1024
+                print(f"{label:<32}{coding:>6}{level:>5}{size / 1024:>10.1f}{len(out) / 1024:>9.1f}"
+                      f"{size / len(out):>7.1f}{ms:>9.2f}{saved / ms if ms else 0:>13.0f}")
+
+
+if __name__ == '__main__':
+    main()
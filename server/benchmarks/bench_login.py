@@ -0,0 +1,85 @@
+"""Logins/sec for POST /login at a fixed vs calibrated bcrypt cost, inline vs pooled.
+
+Run with ``python -m server.benchmarks.bench_login``. Each scenario builds
+an app on a throwaway SQLite file with ``USERS`` users. ``THREADS`` request
+threads then log in ``LOGINS`` times in total, half by username and half
+by email. The first scenario pins 12 rounds, which was the Flask-Bcrypt
+default before calibration. It also reports how many ``users`` queries
+each login ran; before this change an email login ran two.
+
+Pooled hashing (``PASSWORD_HASH_WORKERS``) scales with the cores it is
+given, so compare those rows against ``os.cpu_count()``.
+"""
+import os
+import tempfile
+import threading
+import time
+from sqlalchemy import event
+from server.config import create_app, db, password_hasher
+from server.models import User
+
+USERS = 50
+THREADS = 8
+LOGINS = 48
+SCENARIOS = [
+    ("12 rounds, inline", {'BCRYPT_LOG_ROUNDS': 12}),
+    ("calibrated, inline", {}),
+    ("calibrated, 1 worker", {'PASSWORD_HASH_WORKERS': 1}),
+    ("calibrated, 2 workers", {'PASSWORD_HASH_WORKERS': 2}),
+]
+
+
+def run(config):
+    path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    app = create_app(dict({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}',
+        'JWT_SECRET_KEY': 'bench-secret',
+        'RATELIMIT_ENABLED': False,
+    }, **config))
+    with app.app_context():
+        db.create_all()
+        for i in range(USERS):
+            user = User(username=f'bench{i}', email=f'bench{i}@deliveroo.com', phone_number=f'07{i:08d}')
+            user.password = 'benchpass123'
+            db.session.add(user)
+        db.session.commit()
+        rounds = password_hasher.rounds
+        password_hasher.verify(User.query.first()._password, 'warm-up')  # starts the pool
+
+        queries = []
+
+        def count(conn, cursor, statement, *args):
+            if 'FROM users' in statement:
+                queries.append(1)
+
+        event.listen(db.engine, 'before_cursor_execute', count)
+
+    def worker(n):
+        client = app.test_client()
+        for i in range(n, LOGINS, THREADS):
+            identifier = f'bench{i % USERS}' + ('@deliveroo.com' if i % 2 else '')
+            response = client.post('/login', json={'username': identifier, 'password': 'benchpass123'})
+            assert response.status_code == 200, response.get_json()
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(THREADS)]
+    began = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - began
+    password_hasher.shutdown()
+    return rounds, LOGINS / elapsed, len(queries) / LOGINS
+
+
+def main():
+    print(f"{LOGINS} logins over {THREADS} threads, {os.cpu_count()} CPU(s)")
+    print(f"{'scenario':<24}{'rounds':>7}{'logins/s':>10}{'queries/login':>15}")
+    for label, config in SCENARIOS:
+        rounds, rate, queries = run(config)
+        print(f"{label:<24}{rounds:>7}{rate:>10.1f}{queries:>15.1f}")
+
+
+if __name__ == '__main__':
+    main()
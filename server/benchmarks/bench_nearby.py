@@ -0,0 +1,111 @@
+"""Nearby-pickup lookups: full scan + Python haversine vs. geohash-pruned query.
+
+Run with ``python -m server.benchmarks.bench_nearby [parcels]`` (default
+1,000,000). Parcels are spread over Kenya with a dense cluster around
+Nairobi; each query asks for pending pickups within 3 km of a random
+courier position, once by scanning every row and once through
+``GET /admin/parcels/nearby``.
+"""
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from server.config import create_app, db
+from server.models import Parcel, User, parcel_geohashes, utcnow
+from server.services.geo import haversine_m
+
+PARCELS = 1_000_000
+QUERIES = 20
+RADIUS_M = 3000
+INSERT_BATCH = 10_000
+
+
+def random_point(rng):
+    if rng.random() < 0.5:
+        return rng.gauss(-1.2921, 0.08), rng.gauss(36.8219, 0.08)
+    return rng.uniform(-4.7, 4.6), rng.uniform(33.9, 41.9)
+
+
+def seed(user_id, count, rng):
+    table = Parcel.__table__
+    now = utcnow()
+    for start in range(0, count, INSERT_BATCH):
+        rows = []
+        for _ in range(min(INSERT_BATCH, count - start)):
+            lat, lng = random_point(rng)
+            row = {
+                "user_id": user_id, "status": "pending" if rng.random() < 0.3 else "delivered",
+                "pick_up_latitude": lat, "pick_up_longitude": lng,
+                "created_at": now, "updated_at": now,
+            }
+            row.update(parcel_geohashes(row))
+            rows.append(row)
+        db.session.execute(table.insert(), rows)
+    db.session.commit()
+
+
+def full_scan(origin):
+    rows = db.session.query(Parcel.id, Parcel.pick_up_latitude, Parcel.pick_up_longitude).filter(
+        Parcel.status == "pending"
+    )
+    return sorted(
+        pid for pid, lat, lng in rows
+        if lat is not None and haversine_m(origin, (lat, lng)) <= RADIUS_M
+    )
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else PARCELS
+    path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}',
+        'JWT_SECRET_KEY': 'bench-secret',
+        'RATELIMIT_ENABLED': False,
+        'PARCEL_EVENTS_BACKEND': 'memory',
+    })
+    rng = random.Random(17)
+    with app.app_context():
+        db.create_all()
+        admin = User(username='bench', email='bench@deliveroo.com', phone_number='0700000000',
+                     admin=True)
+        admin.password = 'benchpass123'
+        db.session.add(admin)
+        db.session.commit()
+
+        start = time.perf_counter()
+        seed(admin.id, count, rng)
+        print(f"seeded {count:,} parcels in {time.perf_counter() - start:.1f}s")
+
+        client = app.test_client()
+        token = client.post('/login', json={'username': 'bench', 'password': 'benchpass123'}
+                            ).get_json()['access_token']
+        headers = {'Authorization': f'Bearer {token}'}
+
+        scan_times, index_times = [], []
+        for _ in range(QUERIES):
+            lat, lng = random_point(rng)
+            start = time.perf_counter()
+            expected = full_scan((lat, lng))
+            scan_times.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            response = client.get(
+                f'/admin/parcels/nearby?lat={lat}&lng={lng}&radius_m={RADIUS_M}'
+                f'&status=pending', headers=headers
+            )
+            index_times.append(time.perf_counter() - start)
+            body = response.get_json()
+            assert body["total"] == len(expected), (body["total"], len(expected))
+
+    scan, indexed = statistics.median(scan_times), statistics.median(index_times)
+    print(f"{count:,} parcels, {QUERIES} queries, pending pickups within {RADIUS_M} m")
+    print(f"  {'full scan + haversine':<26} {scan * 1000:>10,.1f} ms median")
+    print(f"  {'GET /admin/parcels/nearby':<26} {indexed * 1000:>10,.1f} ms median")
+    print(f"  speedup {scan / indexed:.0f}x")
+
+
+if __name__ == '__main__':
+    main()
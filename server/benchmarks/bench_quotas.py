@@ -0,0 +1,85 @@
+"""Per-request cost of quota accounting, and who gets throttled under load.
+
+Run with ``python -m server.benchmarks.bench_quotas``. Uses a throwaway
+SQLite file with ``PARCELS`` parcels. First, ``REQUESTS`` authenticated
+tracking reads (GET /parcels/<id>) are timed with quotas disabled and with
+the database backend. Then, with the default role quotas, an admin
+repeatedly pulls the full /admin/parcels listing while a user polls one
+parcel, and the number of 200s and 429s each one got is counted.
+"""
+import os
+import tempfile
+import time
+from collections import Counter
+from server.config import create_app, db
+from server.models import Parcel, User
+
+PARCELS = 20000
+REQUESTS = 2000
+ROUNDS = 40
+
+
+def build(config):
+    path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    app = create_app(dict({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}',
+        'JWT_SECRET_KEY': 'bench-secret',
+        'RATELIMIT_ENABLED': False,
+        'BCRYPT_LOG_ROUNDS': 4,
+    }, **config))
+    with app.app_context():
+        db.create_all()
+        for name, admin in (('admin', True), ('reader', False)):
+            user = User(username=name, email=f'{name}@deliveroo.com', phone_number=f'07{admin:08d}', admin=admin)
+            user.password = 'benchpass123'
+            db.session.add(user)
+        db.session.commit()
+        reader_id = User.query.filter_by(username='reader').one().id
+        db.session.execute(Parcel.__table__.insert(), [{
+            'user_id': reader_id, 'description': f'Bench {i}', 'weight': 2.5, 'status': 'pending',
+            'pickup_location_text': 'Westlands', 'destination_location_text': 'Kilimani', 'version': 1,
+        } for i in range(PARCELS)])
+        db.session.commit()
+    client = app.test_client()
+    tokens = {
+        name: client.post('/login', json={'username': name, 'password': 'benchpass123'}).get_json()['access_token']
+        for name in ('admin', 'reader')
+    }
+    return app, client, {name: {'Authorization': f'Bearer {t}'} for name, t in tokens.items()}
+
+
+def read_latency(config):
+    app, client, headers = build(config)
+    with app.app_context():
+        parcel_id = db.session.query(Parcel.id).first()[0]
+    client.get(f'/parcels/{parcel_id}', headers=headers['reader'])
+    began = time.perf_counter()
+    for _ in range(REQUESTS):
+        assert client.get(f'/parcels/{parcel_id}', headers=headers['reader']).status_code == 200
+    return (time.perf_counter() - began) / REQUESTS, app, client, headers, parcel_id
+
+
+def main():
+    base, *_ = read_latency({'QUOTA_ENABLED': False})
+    # A bucket large enough that the timed reads are never refused.
+    quota, *_ = read_latency({'QUOTA_ROLES': {'user': {'capacity': 10**6, 'refill': 10**6}}})
+    print(f"{REQUESTS} GET /parcels/<id> as one user, SQLite file database")
+    print(f"  quotas disabled   {base * 1000:.3f} ms/request")
+    print(f"  database backend  {quota * 1000:.3f} ms/request (+{(quota - base) * 1000:.3f} ms)")
+
+    app, client, headers = build({})
+    with app.app_context():
+        parcel_id = db.session.query(Parcel.id).first()[0]
+    codes = {'admin': Counter(), 'reader': Counter()}
+    for _ in range(ROUNDS):
+        codes['admin'][client.get('/admin/parcels', headers=headers['admin']).status_code] += 1
+        for _ in range(5):
+            codes['reader'][client.get(f'/parcels/{parcel_id}', headers=headers['reader']).status_code] += 1
+    print(f"{ROUNDS} full listings of {PARCELS} parcels interleaved with {ROUNDS * 5} tracking reads")
+    for name, counter in codes.items():
+        print(f"  {name:<8} {counter[200]:>4} ok  {counter[429]:>4} throttled")
+
+
+if __name__ == '__main__':
+    main()
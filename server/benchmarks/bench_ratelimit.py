@@ -0,0 +1,79 @@
+"""Per-request cost of rate limiting: disabled vs memory:// vs the shared database:// store.
+
+Run with ``python -m server.benchmarks.bench_ratelimit``. Uses a throwaway
+SQLite file, so every batched sync really commits. ``REQUESTS`` GETs of ``/``
+are spread over ``CLIENTS`` addresses; the two default limits (per day and
+per hour) mean two window checks per request. The overhead column is the
+difference from the run with limiting disabled.
+"""
+import os
+import tempfile
+import time
+from limits import parse
+from limits.storage import MemoryStorage
+from limits.strategies import MovingWindowRateLimiter
+from server.config import create_app, db
+from server.ratelimit import SlidingWindowStorage
+
+REQUESTS = 5000
+CLIENTS = 500
+CALLS = 100_000
+
+
+def http_run(config):
+    path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    app = create_app(dict({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}',
+        'JWT_SECRET_KEY': 'bench-secret',
+    }, **config))
+    with app.app_context():
+        db.create_all()
+    client = app.test_client()
+    environs = [{'REMOTE_ADDR': f'10.0.{i // 256}.{i % 256}'} for i in range(CLIENTS)]
+    for environ in environs:  # first hits per window go to the store
+        client.get('/', environ_base=environ)
+    began = time.perf_counter()
+    for i in range(REQUESTS):
+        assert client.get('/', environ_base=environs[i % CLIENTS]).status_code == 200
+    return (time.perf_counter() - began) / REQUESTS
+
+
+def storage_run(storage, app=None):
+    limiter = MovingWindowRateLimiter(storage)
+    item = parse('1000000 per hour')
+    keys = [f'client{i}' for i in range(CLIENTS)]
+    if app is not None:
+        ctx = app.app_context()
+        ctx.push()
+    for key in keys:
+        limiter.hit(item, key)
+    began = time.perf_counter()
+    for i in range(CALLS):
+        limiter.hit(item, keys[i % CLIENTS])
+    elapsed = time.perf_counter() - began
+    if app is not None:
+        ctx.pop()
+    return elapsed / CALLS
+
+
+def main():
+    print(f"{REQUESTS} GET / over {CLIENTS} client addresses, SQLite file database")
+    base = http_run({'RATELIMIT_ENABLED': False})
+    print(f"  {'storage':<22}{'ms/request':>11}{'overhead ms':>13}")
+    print(f"  {'disabled':<22}{base * 1000:>11.3f}{'-':>13}")
+    for label, uri in (("memory:// (per worker)", 'memory://'), ("database:// (shared)", 'database://')):
+        seconds = http_run({'RATELIMIT_STORAGE_URI': uri})
+        print(f"  {label:<22}{seconds * 1000:>11.3f}{(seconds - base) * 1000:>13.3f}")
+
+    path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}', 'JWT_SECRET_KEY': 'bench-secret'})
+    with app.app_context():
+        db.create_all()
+    print(f"{CALLS:,} window checks over {CLIENTS} keys")
+    print(f"  {'memory:// moving window':<30}{storage_run(MemoryStorage()) * 1e6:>8.1f} us/check")
+    print(f"  {'database:// sliding counters':<30}{storage_run(SlidingWindowStorage(), app) * 1e6:>8.1f} us/check")
+
+
+if __name__ == '__main__':
+    main()
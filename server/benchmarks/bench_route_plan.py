@@ -0,0 +1,33 @@
+"""Courier route planning: a 200-stop manifest (100 pickups, 100 deliveries).
+
+Run with ``python -m server.benchmarks.bench_route_plan``. Stops are
+scattered around Nairobi and distances come from the offline estimator, so
+the timings cover the matrix build and the solver, not the network.
+"""
+import random
+import time
+from server.services.route_plan import Stop, plan_route
+from server.services.routing import Router
+
+PARCELS = 100
+
+
+def main():
+    rng = random.Random(7)
+    stops = []
+    for pid in range(PARCELS):
+        stops.append(Stop(pid, 'pickup', rng.gauss(-1.29, 0.05), rng.gauss(36.82, 0.05)))
+        stops.append(Stop(pid, 'delivery', rng.gauss(-1.29, 0.05), rng.gauss(36.82, 0.05)))
+    start = (-1.29, 36.82)
+
+    print(f"{len(stops)} stops, offline distance matrix")
+    for label, seconds in (("nearest neighbour", 0), ("+ 2-opt / or-opt", 0.5)):
+        began = time.perf_counter()
+        plan = plan_route(stops, start, router=Router(), improve_seconds=seconds)
+        elapsed = time.perf_counter() - began
+        print(f"  {label:<20} {elapsed:>6.3f} s  {plan.distance_m / 1000:,.1f} km  "
+              f"{plan.duration_s / 3600:,.2f} h")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+"""Emails/sec through SendGridService against the local stub server.
+
+Run with ``python -m server.benchmarks.bench_sendgrid``. The stub adds a
+fixed per-request latency to stand in for the API round trip.
+"""
+import os
+import time
+import requests
+from server.services.sendgrid_service import SendGridService
+from server.services.sendgrid_stub import SendGridStub
+
+EMAILS = 200
+LATENCY = 0.005
+
+
+def unpooled(stub, recipients):
+    """What SendGridService did before: a fresh connection per email."""
+    for email in recipients:
+        requests.post(stub.url, json={'personalizations': [{'to': [{'email': email}]}]},
+                      headers={'Connection': 'close'})
+
+
+def pooled(service, recipients):
+    for email in recipients:
+        service.deliver(email, "Status update", "<p>Your parcel moved</p>")
+
+
+def bulk(service, recipients):
+    service.send_bulk("Status update", "<p>Your parcel moved</p>", recipients)
+
+
+def main():
+    os.environ.setdefault('SENDGRID_API_KEY', 'bench-key')
+    recipients = [f'user{i}@deliveroo.com' for i in range(EMAILS)]
+
+    with SendGridStub(latency=LATENCY) as stub:
+        service = SendGridService(base_url=stub.url)
+        cases = [
+            ("one request per email, no pool", lambda: unpooled(stub, recipients)),
+            ("one request per email, pooled", lambda: pooled(service, recipients)),
+            ("bulk personalizations", lambda: bulk(service, recipients)),
+        ]
+        print(f"{EMAILS} emails, {LATENCY * 1000:.0f} ms simulated API latency")
+        for name, fn in cases:
+            start = time.perf_counter()
+            fn()
+            elapsed = time.perf_counter() - start
+            print(f"  {name:<32} {EMAILS / elapsed:>10,.0f} emails/sec")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""Email renders/sec: inline f-strings vs. Jinja compiled per call vs. precompiled.
+
+Run with ``python -m server.benchmarks.bench_templates``. The precompiled
+cases render the subject, HTML and text variants; the f-string baseline
+only ever produced unescaped HTML.
+"""
+import os
+import time
+from jinja2 import Environment, FileSystemLoader
+from server.services.email_templates import TEMPLATE_DIR, EmailTemplates
+
+RENDERS = 5000
+PARCEL = {
+    'id': 42,
+    'pickup_location_text': 'Westlands, Nairobi',
+    'destination_location_text': 'Kilimani, Nairobi',
+    'weight': 2.5,
+    'status': 'pending',
+}
+
+
+def fstring(parcel, username):
+    """What SendGridService.send_parcel_created_email used to build per call."""
+    rows = ''.join(
+        f'<tr><td><strong>{label}:</strong></td><td>{value}</td></tr>'
+        for label, value in (
+            ('Parcel ID', parcel.get('id', 'N/A')),
+            ('Pickup Location', parcel.get('pickup_location_text', 'N/A')),
+            ('Destination', parcel.get('destination_location_text', 'N/A')),
+            ('Weight', f"{parcel.get('weight', 'N/A')} kg"),
+            ('Status', parcel.get('status', 'pending')),
+        )
+    )
+    return f"""
+    <html><body>
+        <p>Hello {username}, your parcel has been successfully created!</p>
+        <table>{rows}</table>
+        <a href="{os.getenv('FRONTEND_URL', 'http://localhost:3000')}/track/{parcel.get('id', '')}">Track</a>
+    </body></html>
+    """
+
+
+def compiled_per_call(parcel, username):
+    env = Environment(loader=FileSystemLoader(TEMPLATE_DIR), autoescape=True, cache_size=0)
+    env.globals.update(frontend_url='http://localhost:3000', static={})
+    template = env.get_template('branded/parcel_created.jinja')
+    return str(template.make_module({'parcel': parcel, 'username': username}).html)
+
+
+def main():
+    templates = EmailTemplates(frontend_url='http://localhost:3000').load()
+    contexts = [{'parcel': dict(PARCEL, id=i), 'username': f'user{i}'} for i in range(RENDERS)]
+
+    cases = [
+        ("inline f-string (unescaped HTML)", lambda: [fstring(c['parcel'], c['username']) for c in contexts]),
+        ("jinja compiled per call", lambda: [compiled_per_call(c['parcel'], c['username'])
+                                             for c in contexts[:RENDERS // 50]]),
+        ("precompiled render()", lambda: [templates.render('branded/parcel_created', **c)
+                                          for c in contexts]),
+        ("precompiled render_many()", lambda: templates.render_many('branded/parcel_created', contexts)),
+    ]
+    print(f"{RENDERS} parcel-created emails")
+    for name, fn in cases:
+        start = time.perf_counter()
+        rendered = len(fn())
+        elapsed = time.perf_counter() - start
+        print(f"  {name:<30} {rendered / elapsed:>12,.0f} renders/sec")
+
+
+if __name__ == '__main__':
+    main()
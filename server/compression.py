@@ -0,0 +1,184 @@
+"""Negotiated response compression (zstd, brotli, gzip) for JSON, NDJSON and CSV.
+
+``Compressor`` runs as an ``after_request`` hook. It picks the client's
+preferred coding from ``Accept-Encoding`` and breaks ties in favour of zstd,
+then brotli, then gzip; zstd and brotli are used only when ``zstandard`` and
+``brotli`` are installed. Buffered bodies smaller than
+``COMPRESS_MIN_SIZE`` bytes are sent as they are, because headers and CPU
+time would outweigh the saving.
+
+Streamed responses (the NDJSON/CSV exports) are compressed chunk by chunk.
+Each chunk is flushed, so the client can decode rows while the export is
+still running. SSE streams are never compressed because every event has to
+reach the browser as soon as it is written.
+
+Responses of ``COMPRESS_CACHE_ENDPOINTS`` (the Swagger spec by default) are
+static once the app has started. They are kept precompressed per coding
+and served before the view runs.
+"""
+import gzip
+import threading
+import zlib
+from flask import Response, request
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional codec
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional codec
+    zstandard = None
+
+COMPRESSIBLE_MIMETYPES = frozenset([
+    'application/json', 'application/x-ndjson', 'application/jsonl', 'text/csv',
+    'text/html', 'text/plain', 'text/css', 'application/javascript',
+])
+MIN_SIZE = 1024
+# Picked from bench_compression: on parcel JSON, zstd 1 compresses better and
+# faster than its default of 3, and br 4 / gzip 6 come within ~10% of their
+# best ratios at a third of the CPU.
+LEVELS = {'zstd': 1, 'br': 4, 'gzip': 6}
+PREFERENCE = ('zstd', 'br', 'gzip')
+
+
+def available_codings():
+    """Codings this process can produce, most preferred first."""
+    return tuple(c for c in PREFERENCE if c == 'gzip'
+                 or (c == 'br' and brotli is not None)
+                 or (c == 'zstd' and zstandard is not None))
+
+
+def compress(data, coding, level):
+    """One-shot compression of ``data`` (bytes)."""
+    if coding == 'zstd':
+        return zstandard.ZstdCompressor(level=level).compress(data)
+    if coding == 'br':
+        return brotli.compress(data, quality=level)
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+
+class _StreamEncoder:
+    """Incremental encoder whose ``chunk`` output is decodable up to that point."""
+
+    def __init__(self, coding, level):
+        self.coding = coding
+        if coding == 'zstd':
+            self._obj = zstandard.ZstdCompressor(level=level).compressobj()
+        elif coding == 'br':
+            self._obj = brotli.Compressor(quality=level)
+        else:
+            self._obj = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def chunk(self, data):
+        if self.coding == 'zstd':
+            return self._obj.compress(data) + self._obj.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+        if self.coding == 'br':
+            return self._obj.process(data) + self._obj.flush()
+        return self._obj.compress(data) + self._obj.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        if self.coding == 'zstd':
+            return self._obj.flush()
+        if self.coding == 'br':
+            return self._obj.finish()
+        return self._obj.flush()
+
+
+def compress_stream(chunks, coding, level):
+    """Compress an iterable of str/bytes chunks, flushing after each one."""
+    encoder = _StreamEncoder(coding, level)
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode('utf-8')
+        if chunk:
+            yield encoder.chunk(chunk)
+    yield encoder.finish()
+
+
+class Compressor:
+    """Flask extension that compresses eligible responses."""
+
+    def __init__(self, app=None):
+        self.codings = available_codings()
+        self._cache = {}
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.min_size = app.config.setdefault('COMPRESS_MIN_SIZE', MIN_SIZE)
+        self.levels = dict(LEVELS, **app.config.setdefault('COMPRESS_LEVELS', {}))
+        self.enabled = app.config.setdefault('COMPRESS_ENABLED', True)
+        self.mimetypes = frozenset(app.config.setdefault('COMPRESS_MIMETYPES', COMPRESSIBLE_MIMETYPES))
+        self.cached_endpoints = frozenset(
+            app.config.setdefault('COMPRESS_CACHE_ENDPOINTS', ('flasgger.apispec_1',))
+        )
+        self._cache = {}
+        app.before_request(self.serve_cached)
+        app.after_request(self.after_request)
+
+    def negotiate(self):
+        """The coding to use for this request, or None for identity."""
+        accepted = request.accept_encodings
+        best, best_q = None, 0
+        for coding in self.codings:
+            q = accepted.quality(coding)
+            if q > best_q:
+                best, best_q = coding, q
+        return best
+
+    def serve_cached(self):
+        if not self.enabled or request.method != 'GET' or request.endpoint not in self.cached_endpoints:
+            return None
+        entry = self._cache.get((request.endpoint, self.negotiate()))
+        if entry is None:
+            return None
+        body, mimetype, applied = entry
+        response = Response(body, mimetype=mimetype)
+        response.vary.add('Accept-Encoding')
+        if applied:
+            response.headers['Content-Encoding'] = applied
+        return response
+
+    def after_request(self, response):
+        if not self.enabled or response.mimetype not in self.mimetypes:
+            return response
+        response.vary.add('Accept-Encoding')
+        if (response.status_code < 200 or response.status_code in (204, 206, 304)
+                or request.method == 'HEAD' or response.direct_passthrough
+                or 'Content-Encoding' in response.headers):
+            return response
+
+        coding = self.negotiate()
+        if response.is_streamed:
+            if coding:
+                response.response = compress_stream(response.response, coding, self.levels[coding])
+                self._mark(response, coding)
+                response.headers.pop('Content-Length', None)
+            return response
+
+        data = response.get_data()
+        applied = None
+        if coding and len(data) >= self.min_size:
+            compressed = compress(data, coding, self.levels[coding])
+            if len(compressed) < len(data):
+                response.set_data(compressed)
+                self._mark(response, coding)
+                applied = coding
+        if request.endpoint in self.cached_endpoints and response.status_code == 200:
+            with self._lock:
+                self._cache[(request.endpoint, coding)] = (
+                    response.get_data(), response.mimetype, applied
+                )
+        return response
+
+    @staticmethod
+    def _mark(response, coding):
+        response.headers['Content-Encoding'] = coding
+        # The bytes differ per coding, so a strong tag would be wrong; the
+        # weak form still matches If-None-Match (see server.conditional).
+        etag = response.headers.get('ETag')
+        if etag and not etag.startswith('W/'):
+            response.headers['ETag'] = 'W/' + etag
@@ -0,0 +1,68 @@
+"""Strong ETags and conditional GET (If-None-Match -> 304) for parcel resources.
+
+A parcel's tag is its id, ``version`` and ``updated_at``. ``version`` is
+bumped in the same UPDATE as every change (ORM flushes and the bulk
+statements alike), so the tag can be checked with a primary-key lookup of
+two columns before the row is loaded or serialized.
+
+A listing's tag digests the caller's scope, the query string and two
+values read from indexes: the parcel count from ``parcel_counts`` and the
+newest ``updated_at`` in scope. Any insert, delete or update in scope moves
+one of them, so a client polling an unchanged list gets an empty 304.
+"""
+import hashlib
+from flask import Response, request
+from sqlalchemy import func, select
+
+# Clients may keep the body but must revalidate before reusing it.
+CACHE_CONTROL = 'private, no-cache'
+
+
+def _stamp(value):
+    return value.strftime('%Y%m%d%H%M%S%f') if value else '0'
+
+
+def parcel_etag(parcel_id, version, updated_at):
+    """Strong validator for one parcel's representation."""
+    return f'"p{parcel_id}.{version or 0}.{_stamp(updated_at)}"'
+
+
+def parcel_version(parcel_id):
+    """``(user_id, etag)`` for a parcel by primary key, or None if it does not exist."""
+    from server.config import db
+    from server.models import Parcel
+    table = Parcel.__table__
+    row = db.session.execute(
+        select(table.c.user_id, table.c.version, table.c.updated_at).where(table.c.id == parcel_id)
+    ).first()
+    if row is None:
+        return None
+    return row.user_id, parcel_etag(parcel_id, row.version, row.updated_at)
+
+
+def collection_etag(user_id=None, *extra):
+    """Strong validator for a parcel listing; ``user_id=None`` means every parcel."""
+    from server.config import db
+    from server.models import Parcel, ParcelCount
+    table = Parcel.__table__
+    newest = select(func.max(table.c.updated_at))
+    if user_id is not None:
+        newest = newest.where(table.c.user_id == user_id)
+    parts = (
+        user_id, request.full_path, ParcelCount.total(user_id=user_id),
+        _stamp(db.session.execute(newest).scalar()),
+    ) + extra
+    return '"c.' + hashlib.sha1(repr(parts).encode()).hexdigest()[:24] + '"'
+
+
+def is_fresh(etag):
+    """Whether the request's If-None-Match already names ``etag``."""
+    return request.if_none_match.contains_weak(etag.strip('"'))
+
+
+def not_modified(etag):
+    return Response(status=304, headers=validator_headers(etag))
+
+
+def validator_headers(etag):
+    return {'ETag': etag, 'Cache-Control': CACHE_CONTROL}
@@ -1,7 +1,7 @@
 import os
 from datetime import timedelta
+import click
 from flask import Flask, request
-from flask_bcrypt import Bcrypt
 from flask_migrate import Migrate
 from flask_restful import Api
 from flask_sqlalchemy import SQLAlchemy
@@ -13,6 +13,12 @@ from flask_limiter.util import get_remote_address
 from dotenv import load_dotenv
 from flasgger import Swagger
 from flask_mail import Mail  
+from server.compression import Compressor
+from server.quotas import QuotaManager
+from server.ratelimit import ROUTE_LIMITS  # registers the database:// storage
+from server.events import ParcelEventBus
+from server.revocation import TokenRevocationStore
+from server.services.passwords import PasswordHasher
 
 load_dotenv()
 
@@ -23,7 +29,6 @@ metadata = MetaData(naming_convention={
 
 db = SQLAlchemy(metadata=metadata)
 migrate = Migrate()
-bcrypt = Bcrypt()
 jwt = JWTManager()
 mail = Mail()
 limiter = Limiter(
@@ -31,7 +36,11 @@ limiter = Limiter(
     default_limits=["400 per day", "100 per hour"]
 )
 
-blacklist = set()
+revocation_store = TokenRevocationStore()
+password_hasher = PasswordHasher()
+parcel_events = ParcelEventBus()
+compressor = Compressor()
+quotas = QuotaManager()
 
 # Swagger config (optional, can be customized)
 swagger_template = {
@@ -50,6 +59,9 @@ def create_app(test_config=None):
     """Application factory for Flask app."""
     app = Flask(__name__)
 
+    from server.serializers import FastJSONProvider, output_json, warm_serializers
+    app.json = FastJSONProvider(app)
+
     # Default config
     app.config['SECRET_KEY'] = os.getenv('SECRET_KEY')
     app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URI')
@@ -67,6 +79,12 @@ def create_app(test_config=None):
     app.config['MAIL_USERNAME'] = os.getenv('MAIL_USERNAME')
     app.config['MAIL_PASSWORD'] = os.getenv('MAIL_PASSWORD')
     app.config['MAIL_DEFAULT_SENDER'] = os.getenv('MAIL_USERNAME')
+    app.config['FRONTEND_URL'] = os.getenv('FRONTEND_URL', 'http://localhost:3000')
+
+    # Rate limits are counted in a shared store so they hold across workers
+    app.config['RATELIMIT_STORAGE_URI'] = os.getenv('RATELIMIT_STORAGE_URI', 'database://')
+    app.config['RATELIMIT_STRATEGY'] = 'moving-window'
+    app.config['RATELIMIT_ROUTES'] = dict(ROUTE_LIMITS)
 
     # For CORS preflight/headers
     app.config['CORS_HEADERS'] = 'Content-Type,Authorization'
@@ -77,13 +95,21 @@ def create_app(test_config=None):
     # Initialize extensions
     db.init_app(app)
     migrate.init_app(app, db)
-    bcrypt.init_app(app)
+    password_hasher.init_app(app)
     jwt.init_app(app)
     mail.init_app(app)
     limiter.init_app(app)
+    quotas.init_app(app)
+    revocation_store.init_app(app)
+    parcel_events.init_app(app)
+    compressor.init_app(app)
 
     # Import models *after* db is initialized to avoid circular import
     from server import models  # noqa: F401
+    warm_serializers(models.User, models.Parcel)
+
+    from server.services.email_templates import email_templates
+    email_templates.init_app(app)
 
     # ---- CORS configuration ----
     origins_env = os.getenv("CORS_ORIGINS")
@@ -99,13 +125,17 @@ def create_app(test_config=None):
             "https://your-frontend-domain.com"
         ]
 
+    # Response headers the browser frontend may read (quota feedback, validators)
+    expose_headers = ["Content-Type", "Authorization", "ETag", "Retry-After", "X-RateLimit-Limit",
+                      "X-RateLimit-Remaining", "X-RateLimit-Reset", "X-RateLimit-Cost"]
+
     # CORS configuration for development and production
     CORS(app, 
          supports_credentials=True,
          origins="*",  # Allow all origins temporarily for debugging
          methods=["GET", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"],
-         allow_headers=["Content-Type", "Authorization", "X-Requested-With"],
-         expose_headers=["Content-Type", "Authorization"]
+         allow_headers=["Content-Type", "Authorization", "X-Requested-With", "If-None-Match"],
+         expose_headers=expose_headers
     )
 
     # Add CORS preflight handler
@@ -116,9 +146,10 @@ def create_app(test_config=None):
         if origin:
             response.headers.add('Access-Control-Allow-Origin', origin)
         
-        response.headers.add('Access-Control-Allow-Headers', 'Content-Type,Authorization,X-Requested-With')
+        response.headers.add('Access-Control-Allow-Headers', 'Content-Type,Authorization,X-Requested-With,If-None-Match')
         response.headers.add('Access-Control-Allow-Methods', 'GET,POST,PUT,PATCH,DELETE,OPTIONS')
         response.headers.add('Access-Control-Allow-Credentials', 'true')
+        response.headers.add('Access-Control-Expose-Headers', ','.join(expose_headers))
         return response
 
     # Add OPTIONS route handler for preflight requests
@@ -130,7 +161,7 @@ def create_app(test_config=None):
         if origin:
             response.headers.add('Access-Control-Allow-Origin', origin)
         
-        response.headers.add('Access-Control-Allow-Headers', 'Content-Type,Authorization,X-Requested-With')
+        response.headers.add('Access-Control-Allow-Headers', 'Content-Type,Authorization,X-Requested-With,If-None-Match')
         response.headers.add('Access-Control-Allow-Methods', 'GET,POST,PUT,PATCH,DELETE,OPTIONS')
         response.headers.add('Access-Control-Allow-Credentials', 'true')
         return response
@@ -140,11 +171,12 @@ def create_app(test_config=None):
 
     # Register Flask-Restful API
     api = Api(app)
+    api.representation('application/json')(output_json)
 
     @jwt.token_in_blocklist_loader
     def check_if_token_revoked(jwt_header, jwt_payload):
         """Check if JWT token is revoked."""
-        return jwt_payload['jti'] in blacklist
+        return revocation_store.is_revoked(jwt_payload['jti'])
 
     print("Before registering API resources")
     # Register API resources
@@ -152,9 +184,14 @@ def create_app(test_config=None):
     from server.routes.auth_routes import Login
     from server.routes.admin_routes import (
         AdminParcelList, UpdateParcelStatus, UpdateParcelLocation,
-        ParcelHistoryList, ParcelHistoryDetail, AdminParcelDetail
+        ParcelHistoryList, ParcelHistoryDetail, AdminParcelDetail, MapsCacheStats,
+        AdminParcelScan, ParcelTimeline, AdminParcelsNearby, AdminParcelsWithin,
+        AdminParcelAssign, CourierRoute, AdminStats,
+    )
+    from server.routes.parcels import (
+        ParcelList, ParcelResource, ParcelCancel, ParcelDestination, ParcelStatus, ParcelQuote,
+        ParcelBulk, ParcelEvents, UserParcelEvents,
     )
-    from server.routes.parcels import ParcelList, ParcelResource, ParcelCancel, ParcelDestination, ParcelStatus
     from server.routes.email_routes import (
         EmailParcelCreated, EmailStatusUpdate, EmailLocationUpdate,
         EmailParcelCancelled, EmailWelcome, EmailPasswordReset, EmailTest,
@@ -168,16 +205,28 @@ def create_app(test_config=None):
     api.add_resource(Logout, '/logout')
     api.add_resource(Profile, '/profile')
     api.add_resource(AdminParcelList, '/admin/parcels')
+    api.add_resource(AdminParcelScan, '/admin/parcels/scan')
+    api.add_resource(AdminParcelsNearby, '/admin/parcels/nearby')
+    api.add_resource(AdminParcelsWithin, '/admin/parcels/within')
+    api.add_resource(AdminParcelAssign, '/admin/parcels/assign')
+    api.add_resource(CourierRoute, '/admin/couriers/<int:courier_id>/route')
     api.add_resource(AdminParcelDetail, '/admin/parcels/<int:parcel_id>')
     api.add_resource(UpdateParcelStatus, '/admin/parcels/<int:id>/status')
     api.add_resource(UpdateParcelLocation, '/admin/parcels/<int:id>/location')
+    api.add_resource(ParcelTimeline, '/admin/parcels/<int:parcel_id>/history')
     api.add_resource(ParcelHistoryList, '/admin/histories')
     api.add_resource(ParcelHistoryDetail, '/admin/histories/<int:id>')
+    api.add_resource(MapsCacheStats, '/admin/maps/cache-stats')
+    api.add_resource(AdminStats, '/admin/stats')
     api.add_resource(ParcelList, '/parcels')
+    api.add_resource(ParcelQuote, '/parcels/quote')
+    api.add_resource(ParcelBulk, '/parcels/bulk')
+    api.add_resource(UserParcelEvents, '/parcels/events')
     api.add_resource(ParcelResource, '/parcels/<int:parcel_id>')
     api.add_resource(ParcelCancel, '/parcels/<int:parcel_id>/cancel')
     api.add_resource(ParcelDestination, '/parcels/<int:parcel_id>/destination')
     api.add_resource(ParcelStatus, '/parcels/<int:parcel_id>/status')
+    api.add_resource(ParcelEvents, '/parcels/<int:parcel_id>/events')
 
     # Email routes
     api.add_resource(EmailParcelCreated, '/email/parcel-created')
@@ -191,4 +240,48 @@ def create_app(test_config=None):
     
     print("After registering API resources")
 
+    @app.cli.command('rebuild-parcel-counts')
+    def rebuild_parcel_counts():
+        """Recompute the cached per-user/per-status parcel counters."""
+        from server.models import ParcelCount
+        ParcelCount.rebuild()
+        print("Parcel counters rebuilt")
+
+    @app.cli.command('reconcile-parcel-stats')
+    @click.option('--every', type=float, default=None, help='Repeat every N seconds instead of once.')
+    def reconcile_parcel_stats(every):
+        """Recompute the dashboard rollup from the parcels table and fix any drift."""
+        import time
+        from server.models import ParcelStat
+        while True:
+            print(f"Parcel stats reconciled ({ParcelStat.reconcile()} rows corrected)")
+            if every is None:
+                break
+            time.sleep(every)
+
+    @app.cli.command('email-worker')
+    @click.option('--concurrency', default=4, show_default=True, help='Parallel deliveries.')
+    @click.option('--batch-size', default=50, show_default=True, help='Rows claimed per poll.')
+    @click.option('--max-attempts', default=8, show_default=True, help='Attempts before dead-lettering.')
+    @click.option('--poll-interval', default=2.0, show_default=True, help='Idle sleep in seconds.')
+    @click.option('--once', is_flag=True, help='Drain one batch and exit.')
+    def email_worker(concurrency, batch_size, max_attempts, poll_interval, once):
+        """Deliver queued emails from the outbox."""
+        from server.services.email_outbox import OutboxWorker
+        worker = OutboxWorker(
+            app, concurrency=concurrency, batch_size=batch_size, max_attempts=max_attempts
+        )
+        if once:
+            print(f"Delivered batch of {worker.run_once()} emails")
+        else:
+            print(f"Email worker started (concurrency={concurrency}, batch={batch_size})")
+            worker.run_forever(poll_interval)
+
+    @app.cli.command('purge-revoked-tokens')
+    def purge_revoked_tokens():
+        """Delete revoked-token rows whose JWTs have expired."""
+        import time
+        revocation_store.backend.purge(time.time())
+        print("Expired revoked tokens purged")
+
     return app
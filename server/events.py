@@ -0,0 +1,229 @@
+"""Live parcel events for the Server-Sent Events tracking streams.
+
+Every status or location change is a ``parcel_histories`` row, and the row
+id doubles as the SSE event id. Routes publish the rows they committed to
+``parcel_events``, which fans them out to the streams open in this process
+(one bounded queue per connection, keyed by parcel and by owner). A backend
+carries events between workers:
+
+* ``memory``: this process only (single worker, tests).
+* ``database``: one background thread per worker polls ``parcel_histories``
+  for new ids while anyone is subscribed, so the database sees one cheap
+  primary-key range query per worker per interval however many pages are open.
+  While nobody is subscribed it only reads the newest id.
+
+Any object with ``publish(events)`` and ``listen(bus)`` can be passed
+instead of a name, e.g. a Redis pub/sub adapter. A client that reconnects
+with ``Last-Event-ID`` is replayed the rows it missed from the table itself.
+"""
+import queue
+import threading
+import time
+from collections import defaultdict
+from collections.abc import Mapping
+
+EVENT_COLUMNS = ('id', 'parcel_id', 'update_type', 'old_value', 'new_value', 'timestamp')
+
+
+def history_event(history, user_id):
+    """Event payload for a ``ParcelHistory`` row (or a dict with its columns)."""
+    if not isinstance(history, Mapping):
+        history = {key: getattr(history, key) for key in EVENT_COLUMNS}
+    timestamp = history['timestamp']
+    event = {key: history[key] for key in EVENT_COLUMNS}
+    event['user_id'] = user_id
+    event['timestamp'] = timestamp.strftime("%Y-%m-%d %H:%M:%S") if timestamp else None
+    return event
+
+
+def history_events(after_id, parcel_id=None, user_id=None, limit=None):
+    """Committed events newer than ``after_id`` for one parcel and/or owner, oldest first."""
+    from server.config import db
+    from server.models import Parcel, ParcelHistory
+    query = (
+        db.session.query(ParcelHistory.__table__, Parcel.user_id)
+        .join(Parcel, Parcel.id == ParcelHistory.parcel_id)
+        .filter(ParcelHistory.id > after_id)
+    )
+    if parcel_id is not None:
+        query = query.filter(ParcelHistory.parcel_id == parcel_id)
+    if user_id is not None:
+        query = query.filter(Parcel.user_id == user_id)
+    query = query.order_by(ParcelHistory.id)
+    if limit is not None:
+        query = query.limit(limit)
+    return [history_event(row._mapping, row.user_id) for row in query]
+
+
+class MemoryEventBackend:
+    """Process-local backend: events never leave the worker that published them."""
+
+    def publish(self, events):
+        pass
+
+    def listen(self, bus):
+        pass
+
+
+class DatabaseEventBackend:
+    """Backend that picks up other workers' events by polling ``parcel_histories``."""
+
+    # Ids are assigned at INSERT but become visible at COMMIT, so a row can
+    # appear below the high-water mark; re-read this many ids behind it
+    # (the bus drops the duplicates).
+    ID_OVERLAP = 200
+    # Rows fetched per poll; a larger backlog is worked off over the next polls.
+    POLL_LIMIT = 1000
+
+    def __init__(self, app, interval=1.0):
+        self.app = app
+        self.interval = interval
+        self._high_water = None
+        self._floor = 0
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def publish(self, events):
+        pass  # the rows are already committed; every worker's poller will see them
+
+    def listen(self, bus):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(
+                target=self._run, args=(bus,), name='parcel-events', daemon=True
+            )
+            self._thread.start()
+
+    def _run(self, bus):
+        with self.app.app_context():
+            while True:
+                self.poll(bus)
+                time.sleep(self.interval)
+
+    def poll(self, bus):
+        """Dispatch rows committed since the last poll, or only skip ahead while nobody listens."""
+        from server.config import db
+        from server.models import ParcelHistory
+        try:
+            if self._high_water is None or not bus.has_subscribers():
+                # Rows written while nobody listened are not live events for
+                # the next subscriber (a reconnect replays them from the table).
+                newest = db.session.query(db.func.max(ParcelHistory.id)).scalar() or 0
+                self._floor = self._high_water = newest
+                return
+            after = max(self._floor, self._high_water - self.ID_OVERLAP)
+            events = history_events(after, limit=self.POLL_LIMIT)
+        except Exception:
+            self.app.logger.exception("Parcel event poll failed")
+            return
+        finally:
+            db.session.remove()
+        if events:
+            self._high_water = max(self._high_water, events[-1]["id"])
+            bus.dispatch(events)
+
+
+class Subscription:
+    """One open stream: a bounded queue of events for a parcel or an owner."""
+
+    def __init__(self, bus, key, maxsize):
+        self.bus = bus
+        self.key = key
+        self.queue = queue.Queue(maxsize)
+        self.overflowed = False
+
+    def put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except queue.Full:
+            # A stalled client; the stream closes and the reconnect replays from the table.
+            self.overflowed = True
+
+    def get(self, timeout):
+        """Next event, or None if nothing arrived within ``timeout`` seconds."""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self.bus.unsubscribe(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ParcelEventBus:
+    """In-process pub/sub for parcel events with a pluggable cross-worker backend."""
+
+    def __init__(self, app=None):
+        self.backend = MemoryEventBackend()
+        self.heartbeat = 15
+        self.queue_size = 1000
+        self._subscribers = defaultdict(set)
+        self._seen = {}
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        backend = app.config.setdefault('PARCEL_EVENTS_BACKEND', 'database')
+        interval = app.config.setdefault('PARCEL_EVENTS_POLL_SECONDS', 1.0)
+        self.heartbeat = app.config.setdefault('PARCEL_EVENTS_HEARTBEAT_SECONDS', 15)
+        self.queue_size = app.config.setdefault('PARCEL_EVENTS_QUEUE_SIZE', 1000)
+        if backend == 'database':
+            self.backend = DatabaseEventBackend(app, interval)
+        elif backend == 'memory':
+            self.backend = MemoryEventBackend()
+        else:
+            self.backend = backend
+        self._subscribers = defaultdict(set)
+        self._seen = {}
+
+    def publish(self, events):
+        """Deliver committed events here and hand them to the backend for the other workers."""
+        events = list(events)
+        if events:
+            self.dispatch(events)
+            self.backend.publish(events)
+
+    def dispatch(self, events):
+        """Fan events out to local subscribers, skipping ids already delivered."""
+        with self._lock:
+            fresh = [e for e in events if e["id"] not in self._seen]
+            for event in fresh:
+                self._seen[event["id"]] = True
+            # Only the recent ids can come round again (poll overlap / local publish).
+            while len(self._seen) > 10 * DatabaseEventBackend.ID_OVERLAP:
+                del self._seen[next(iter(self._seen))]
+            targets = [
+                (sub, event) for event in fresh
+                for key in (('parcel', event["parcel_id"]), ('user', event["user_id"]))
+                for sub in self._subscribers.get(key, ())
+            ]
+        for sub, event in targets:
+            sub.put(event)
+
+    def subscribe(self, parcel_id=None, user_id=None):
+        """Open a Subscription to one parcel's or one owner's events."""
+        key = ('parcel', parcel_id) if parcel_id is not None else ('user', user_id)
+        sub = Subscription(self, key, self.queue_size)
+        with self._lock:
+            self._subscribers[key].add(sub)
+        self.backend.listen(self)
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            subs = self._subscribers.get(sub.key)
+            if subs is not None:
+                subs.discard(sub)
+                if not subs:
+                    del self._subscribers[sub.key]
+
+    def has_subscribers(self):
+        return bool(self._subscribers)
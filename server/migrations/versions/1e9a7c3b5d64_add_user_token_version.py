@@ -0,0 +1,32 @@
+"""add users.token_version
+
+Revision ID: 1e9a7c3b5d64
+Revises: c7d2e4f1a9b3
+Create Date: 2026-10-16 12:20:48.604519
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '1e9a7c3b5d64'
+down_revision = 'c7d2e4f1a9b3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    columns = {c['name'] for c in sa.inspect(op.get_bind()).get_columns('users')}
+    if 'token_version' in columns:
+        return
+
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.add_column(
+            sa.Column('token_version', sa.Integer(), nullable=False, server_default='0')
+        )
+
+
+def downgrade():
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.drop_column('token_version')
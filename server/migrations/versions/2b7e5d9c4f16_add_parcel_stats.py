@@ -0,0 +1,38 @@
+"""add parcel_stats
+
+Revision ID: 2b7e5d9c4f16
+Revises: 6c3f9a2e1b84
+Create Date: 2026-10-17 10:14:52.630917
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2b7e5d9c4f16'
+down_revision = '6c3f9a2e1b84'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'parcel_stats',
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('status', sa.String(length=32), nullable=False),
+        sa.Column('count', sa.Integer(), nullable=False),
+        sa.Column('cost_total', sa.Float(), nullable=False),
+        sa.Column('weight_total', sa.Float(), nullable=False),
+        sa.PrimaryKeyConstraint('day', 'status'),
+    )
+    op.execute(
+        "INSERT INTO parcel_stats (day, status, count, cost_total, weight_total) "
+        "SELECT DATE(created_at), COALESCE(status, 'pending'), COUNT(id), "
+        "COALESCE(SUM(cost), 0), COALESCE(SUM(weight), 0) "
+        "FROM parcels GROUP BY DATE(created_at), COALESCE(status, 'pending')"
+    )
+
+
+def downgrade():
+    op.drop_table('parcel_stats')
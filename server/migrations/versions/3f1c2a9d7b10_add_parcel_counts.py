@@ -0,0 +1,41 @@
+"""add parcel_counts
+
+Revision ID: 3f1c2a9d7b10
+Revises: 
+Create Date: 2026-10-16 09:12:41.102311
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1c2a9d7b10'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Earlier deployments built the schema with init_db.py / db.create_all(),
+    # so only create what is not there yet.
+    if 'parcel_counts' in sa.inspect(op.get_bind()).get_table_names():
+        return
+
+    op.create_table(
+        'parcel_counts',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('status', sa.String(length=32), nullable=False),
+        sa.Column('count', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], name='fk_parcel_counts_user_id_users'),
+        sa.PrimaryKeyConstraint('user_id', 'status'),
+    )
+    op.execute(
+        "INSERT INTO parcel_counts (user_id, status, count) "
+        "SELECT user_id, COALESCE(status, 'pending'), COUNT(id) "
+        "FROM parcels GROUP BY user_id, COALESCE(status, 'pending')"
+    )
+
+
+def downgrade():
+    op.drop_table('parcel_counts')
@@ -0,0 +1,33 @@
+"""add rate_limit_windows
+
+Revision ID: 4d9b2f7a1c63
+Revises: 8f1a6c3e7d25
+Create Date: 2026-10-17 16:21:44.307519
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4d9b2f7a1c63'
+down_revision = '8f1a6c3e7d25'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'rate_limit_windows',
+        sa.Column('key', sa.String(length=255), nullable=False),
+        sa.Column('window_start', sa.BigInteger(), autoincrement=False, nullable=False),
+        sa.Column('hits', sa.Integer(), nullable=False),
+        sa.Column('expires_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('key', 'window_start'),
+    )
+    op.create_index('ix_rate_limit_windows_expires_at', 'rate_limit_windows', ['expires_at'])
+
+
+def downgrade():
+    op.drop_index('ix_rate_limit_windows_expires_at', table_name='rate_limit_windows')
+    op.drop_table('rate_limit_windows')
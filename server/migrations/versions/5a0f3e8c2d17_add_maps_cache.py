@@ -0,0 +1,35 @@
+"""add maps_cache
+
+Revision ID: 5a0f3e8c2d17
+Revises: 1e9a7c3b5d64
+Create Date: 2026-10-16 13:48:12.330871
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5a0f3e8c2d17'
+down_revision = '1e9a7c3b5d64'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if 'maps_cache' in sa.inspect(op.get_bind()).get_table_names():
+        return
+
+    op.create_table(
+        'maps_cache',
+        sa.Column('key', sa.String(length=512), nullable=False),
+        sa.Column('value', sa.Text(), nullable=False),
+        sa.Column('expires_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('key'),
+    )
+    op.create_index('ix_maps_cache_expires_at', 'maps_cache', ['expires_at'])
+
+
+def downgrade():
+    op.drop_index('ix_maps_cache_expires_at', table_name='maps_cache')
+    op.drop_table('maps_cache')
@@ -0,0 +1,72 @@
+"""add parcel geohash columns
+
+Revision ID: 6c3f9a2e1b84
+Revises: e4a8c1d7f302
+Create Date: 2026-10-16 23:48:12.604917
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from server.services.geo import point_geohash
+
+
+# revision identifiers, used by Alembic.
+revision = '6c3f9a2e1b84'
+down_revision = 'e4a8c1d7f302'
+branch_labels = None
+depends_on = None
+
+
+INDEXES = [
+    ('ix_parcels_status_pickup_geohash', 'parcels',
+     ['status', 'pickup_geohash', 'pick_up_latitude', 'pick_up_longitude']),
+    ('ix_parcels_pickup_geohash', 'parcels',
+     ['pickup_geohash', 'pick_up_latitude', 'pick_up_longitude']),
+    ('ix_parcels_current_geohash', 'parcels',
+     ['current_geohash', 'current_location_latitude', 'current_location_longitude']),
+]
+BACKFILL_BATCH = 1000
+
+
+def upgrade():
+    with op.batch_alter_table('parcels') as batch_op:
+        batch_op.add_column(sa.Column('pickup_geohash', sa.String(length=12), nullable=True))
+        batch_op.add_column(sa.Column('current_geohash', sa.String(length=12), nullable=True))
+
+    bind = op.get_bind()
+    parcels = sa.table(
+        'parcels', sa.column('id'),
+        sa.column('pick_up_latitude'), sa.column('pick_up_longitude'),
+        sa.column('current_location_latitude'), sa.column('current_location_longitude'),
+        sa.column('pickup_geohash'), sa.column('current_geohash'),
+    )
+    update = parcels.update().where(parcels.c.id == sa.bindparam('b_id')).values(
+        pickup_geohash=sa.bindparam('b_pickup'), current_geohash=sa.bindparam('b_current')
+    )
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(parcels.c.id, parcels.c.pick_up_latitude, parcels.c.pick_up_longitude,
+                      parcels.c.current_location_latitude, parcels.c.current_location_longitude)
+            .where(parcels.c.id > last_id).order_by(parcels.c.id).limit(BACKFILL_BATCH)
+        ).fetchall()
+        if not rows:
+            break
+        bind.execute(update, [
+            {'b_id': row[0], 'b_pickup': point_geohash(row[1], row[2]),
+             'b_current': point_geohash(row[3], row[4])}
+            for row in rows
+        ])
+        last_id = rows[-1][0]
+
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns)
+
+
+def downgrade():
+    for name, table, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
+    with op.batch_alter_table('parcels') as batch_op:
+        batch_op.drop_column('current_geohash')
+        batch_op.drop_column('pickup_geohash')
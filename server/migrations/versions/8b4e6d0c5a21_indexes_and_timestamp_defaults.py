@@ -0,0 +1,79 @@
+"""indexes and per-insert timestamp defaults
+
+Revision ID: 8b4e6d0c5a21
+Revises: 3f1c2a9d7b10
+Create Date: 2026-10-16 09:40:03.557120
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8b4e6d0c5a21'
+down_revision = '3f1c2a9d7b10'
+branch_labels = None
+depends_on = None
+
+
+INDEXES = [
+    ('ix_parcels_user_id_created_at', 'parcels', ['user_id', 'created_at', 'id']),
+    ('ix_parcels_user_id_status_created_at', 'parcels', ['user_id', 'status', 'created_at', 'id']),
+    ('ix_parcels_status_created_at', 'parcels', ['status', 'created_at', 'id']),
+    ('ix_parcels_created_at', 'parcels', ['created_at', 'id']),
+    ('ix_parcels_courier_id', 'parcels', ['courier_id']),
+    ('ix_parcel_histories_parcel_id_timestamp', 'parcel_histories', ['parcel_id', 'timestamp', 'id']),
+    ('ix_parcel_histories_timestamp', 'parcel_histories', ['timestamp', 'id']),
+]
+
+TIMESTAMP_COLUMNS = [
+    ('users', 'created_at'),
+    ('parcels', 'created_at'),
+    ('parcels', 'updated_at'),
+    ('parcel_histories', 'timestamp'),
+]
+
+
+def _existing_indexes(inspector, table):
+    return {ix['name'] for ix in inspector.get_indexes(table)}
+
+
+def upgrade():
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+
+    # Rows written before this revision all carry the process start time as
+    # their timestamp; the real values cannot be recovered. Fill the gaps so
+    # the columns are usable for ordering, and make updated_at no older than
+    # the newest history entry for the parcel.
+    op.execute("UPDATE users SET created_at = CURRENT_TIMESTAMP WHERE created_at IS NULL")
+    op.execute("UPDATE parcels SET created_at = CURRENT_TIMESTAMP WHERE created_at IS NULL")
+    op.execute("UPDATE parcels SET updated_at = created_at WHERE updated_at IS NULL")
+    op.execute("UPDATE parcel_histories SET timestamp = CURRENT_TIMESTAMP WHERE timestamp IS NULL")
+    op.execute(
+        "UPDATE parcels SET updated_at = ("
+        "SELECT MAX(h.timestamp) FROM parcel_histories h WHERE h.parcel_id = parcels.id"
+        ") WHERE updated_at < ("
+        "SELECT MAX(h.timestamp) FROM parcel_histories h WHERE h.parcel_id = parcels.id)"
+    )
+
+    for table, column in TIMESTAMP_COLUMNS:
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.alter_column(
+                column, existing_type=sa.DateTime(), server_default=sa.func.now()
+            )
+
+    for name, table, columns in INDEXES:
+        if name not in _existing_indexes(inspector, table):
+            op.create_index(name, table, columns)
+
+
+def downgrade():
+    inspector = sa.inspect(op.get_bind())
+    for name, table, _ in reversed(INDEXES):
+        if name in _existing_indexes(inspector, table):
+            op.drop_index(name, table_name=table)
+
+    for table, column in TIMESTAMP_COLUMNS:
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.alter_column(column, existing_type=sa.DateTime(), server_default=None)
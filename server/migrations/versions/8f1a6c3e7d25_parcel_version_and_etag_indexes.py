@@ -0,0 +1,30 @@
+"""parcel version and etag indexes
+
+Revision ID: 8f1a6c3e7d25
+Revises: 2b7e5d9c4f16
+Create Date: 2026-10-17 14:38:09.551204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8f1a6c3e7d25'
+down_revision = '2b7e5d9c4f16'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('parcels') as batch_op:
+        batch_op.add_column(sa.Column('version', sa.Integer(), nullable=False, server_default='1'))
+    op.create_index('ix_parcels_user_id_updated_at', 'parcels', ['user_id', 'updated_at'])
+    op.create_index('ix_parcels_updated_at', 'parcels', ['updated_at'])
+
+
+def downgrade():
+    op.drop_index('ix_parcels_updated_at', table_name='parcels')
+    op.drop_index('ix_parcels_user_id_updated_at', table_name='parcels')
+    with op.batch_alter_table('parcels') as batch_op:
+        batch_op.drop_column('version')
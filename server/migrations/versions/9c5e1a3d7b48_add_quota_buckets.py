@@ -0,0 +1,30 @@
+"""add quota_buckets
+
+Revision ID: 9c5e1a3d7b48
+Revises: 4d9b2f7a1c63
+Create Date: 2026-10-17 18:02:13.640928
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9c5e1a3d7b48'
+down_revision = '4d9b2f7a1c63'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'quota_buckets',
+        sa.Column('identity', sa.String(length=64), nullable=False),
+        sa.Column('tokens', sa.Float(), nullable=False),
+        sa.Column('refilled_at', sa.Float(), nullable=False),
+        sa.PrimaryKeyConstraint('identity'),
+    )
+
+
+def downgrade():
+    op.drop_table('quota_buckets')
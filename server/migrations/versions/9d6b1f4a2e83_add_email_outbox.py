@@ -0,0 +1,46 @@
+"""add email_outbox
+
+Revision ID: 9d6b1f4a2e83
+Revises: 5a0f3e8c2d17
+Create Date: 2026-10-16 15:02:39.771204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9d6b1f4a2e83'
+down_revision = '5a0f3e8c2d17'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if 'email_outbox' in sa.inspect(op.get_bind()).get_table_names():
+        return
+
+    op.create_table(
+        'email_outbox',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('transport', sa.String(length=16), nullable=False),
+        sa.Column('recipient', sa.String(length=255), nullable=False),
+        sa.Column('subject', sa.String(length=255), nullable=False),
+        sa.Column('html_body', sa.Text(), nullable=False),
+        sa.Column('text_body', sa.Text(), nullable=True),
+        sa.Column('status', sa.String(length=16), nullable=False),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('next_attempt_at', sa.DateTime(), nullable=False),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), server_default=sa.func.now(), nullable=True),
+        sa.Column('sent_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index(
+        'ix_email_outbox_status_next_attempt_at', 'email_outbox', ['status', 'next_attempt_at']
+    )
+
+
+def downgrade():
+    op.drop_index('ix_email_outbox_status_next_attempt_at', table_name='email_outbox')
+    op.drop_table('email_outbox')
@@ -0,0 +1,37 @@
+"""add revoked_tokens
+
+Revision ID: c7d2e4f1a9b3
+Revises: 8b4e6d0c5a21
+Create Date: 2026-10-16 11:05:27.918342
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c7d2e4f1a9b3'
+down_revision = '8b4e6d0c5a21'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if 'revoked_tokens' in sa.inspect(op.get_bind()).get_table_names():
+        return
+
+    op.create_table(
+        'revoked_tokens',
+        sa.Column('jti', sa.String(length=64), nullable=False),
+        sa.Column('expires_at', sa.DateTime(), nullable=False),
+        sa.Column('revoked_at', sa.DateTime(), server_default=sa.func.now(), nullable=False),
+        sa.PrimaryKeyConstraint('jti'),
+    )
+    op.create_index('ix_revoked_tokens_revoked_at', 'revoked_tokens', ['revoked_at'])
+    op.create_index('ix_revoked_tokens_expires_at', 'revoked_tokens', ['expires_at'])
+
+
+def downgrade():
+    op.drop_index('ix_revoked_tokens_expires_at', table_name='revoked_tokens')
+    op.drop_index('ix_revoked_tokens_revoked_at', table_name='revoked_tokens')
+    op.drop_table('revoked_tokens')
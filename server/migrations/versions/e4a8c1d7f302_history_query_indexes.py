@@ -0,0 +1,42 @@
+"""history query indexes
+
+Revision ID: e4a8c1d7f302
+Revises: 9d6b1f4a2e83
+Create Date: 2026-10-16 23:05:41.218334
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e4a8c1d7f302'
+down_revision = '9d6b1f4a2e83'
+branch_labels = None
+depends_on = None
+
+
+INDEXES = [
+    ('ix_parcel_histories_parcel_id_update_type_timestamp', 'parcel_histories',
+     ['parcel_id', 'update_type', 'timestamp', 'id']),
+    ('ix_parcel_histories_updated_by_timestamp', 'parcel_histories', ['updated_by', 'timestamp', 'id']),
+    ('ix_parcel_histories_update_type_timestamp', 'parcel_histories', ['update_type', 'timestamp', 'id']),
+]
+
+
+def _existing_indexes(inspector, table):
+    return {ix['name'] for ix in inspector.get_indexes(table)}
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    for name, table, columns in INDEXES:
+        if name not in _existing_indexes(inspector, table):
+            op.create_index(name, table, columns)
+
+
+def downgrade():
+    inspector = sa.inspect(op.get_bind())
+    for name, table, _ in reversed(INDEXES):
+        if name in _existing_indexes(inspector, table):
+            op.drop_index(name, table_name=table)
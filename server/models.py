@@ -1,10 +1,20 @@
 """SQLAlchemy models for Deliveroo app."""
-from datetime import datetime, timezone
+from collections import defaultdict
+from datetime import date, datetime, timezone
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy.orm import validates
+from sqlalchemy import event, func, inspect
+from sqlalchemy.orm import Session, object_session, validates
 from sqlalchemy.ext.hybrid import hybrid_property
 from werkzeug.security import generate_password_hash, check_password_hash
 from server.config import db
+from server.serializers import serializer_for
+from server.services.geo import point_geohash
+
+
+def utcnow():
+    """Timestamp default evaluated per row (not once at import)."""
+    return datetime.now(timezone.utc)
+
 
 class User(db.Model):
     """User model for Deliveroo app."""
@@ -18,7 +28,16 @@ class User(db.Model):
     latitude_hash = db.Column(db.Text)
     _password = db.Column(db.String, nullable=False)
     admin = db.Column(db.Boolean, default=False)
-    created_at = db.Column(db.DateTime, default=datetime.now(timezone.utc))
+    # Bumped on every role change; tokens minted with an older value are rejected.
+    token_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    created_at = db.Column(db.DateTime, default=utcnow, server_default=func.now())
+
+    @validates('admin')
+    def validate_admin(self, key, value):
+        """Invalidate outstanding tokens when an existing user's role changes."""
+        if self.id is not None and bool(value) != bool(self.admin):
+            self.token_version = (self.token_version or 0) + 1
+        return value
 
     @validates('email')
     def validate_email(self, key, value):
@@ -36,32 +55,54 @@ class User(db.Model):
     def password(self, value):
         if len(value) < 8:
             raise ValueError("Password must be at least 8 characters long.")
-        from server.config import bcrypt
-        hashed = bcrypt.generate_password_hash(value.encode('utf-8'))
-        self._password = hashed.decode('utf-8')
+        from server.config import password_hasher
+        self._password = password_hasher.hash(value)
 
     def authenticate(self, password):
-        from server.config import bcrypt
-        return bcrypt.check_password_hash(self._password, password.encode('utf-8'))
+        """Check ``password``; on success re-hash it if the work factor has changed.
 
-    def to_dict(self):
+        The new hash is only set on the instance; the caller commits it.
+        """
+        from server.config import password_hasher
+        if not password_hasher.verify(self._password, password):
+            return False
+        if password_hasher.needs_rehash(self._password):
+            self._password = password_hasher.hash(password)
+        return True
+
+    def to_dict(self, columns=None):
         """Return a dictionary representation of the user."""
-        result = {}
-        for c in self.__mapper__.c:  
-            value = getattr(self, c.name)
-            if isinstance(value, datetime):
-                result[c.name] = value.isoformat()
-            else:
-                result[c.name] = value
-        return result
+        return serializer_for(User, columns)(self)
 
 class Parcel(db.Model):
     """Parcel model for Deliveroo app."""
     __tablename__ = 'parcels'
+    # Matched to the route queries: "my parcels" (optionally by status) and the
+    # admin listing are keyset-paged on (created_at, id); couriers look up theirs.
+    __table_args__ = (
+        db.Index('ix_parcels_user_id_created_at', 'user_id', 'created_at', 'id'),
+        db.Index('ix_parcels_user_id_status_created_at', 'user_id', 'status', 'created_at', 'id'),
+        db.Index('ix_parcels_status_created_at', 'status', 'created_at', 'id'),
+        db.Index('ix_parcels_created_at', 'created_at', 'id'),
+        db.Index('ix_parcels_courier_id', 'courier_id'),
+        # Nearby / bounding-box lookups scan geohash prefix ranges; carrying the
+        # coordinates lets the exact box check run on the index alone.
+        db.Index('ix_parcels_status_pickup_geohash', 'status', 'pickup_geohash',
+                 'pick_up_latitude', 'pick_up_longitude'),
+        db.Index('ix_parcels_pickup_geohash', 'pickup_geohash',
+                 'pick_up_latitude', 'pick_up_longitude'),
+        db.Index('ix_parcels_current_geohash', 'current_geohash',
+                 'current_location_latitude', 'current_location_longitude'),
+        # Newest change in scope, for the listings' ETags (see server.conditional).
+        db.Index('ix_parcels_user_id_updated_at', 'user_id', 'updated_at'),
+        db.Index('ix_parcels_updated_at', 'updated_at'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     description = db.Column(db.String(255))
-    weight = db.Column(db.Float)
-    status = db.Column(db.String(32), default='pending')
+    # active_history keeps the pre-change values around for the ParcelCount/ParcelStat listener.
+    weight = db.column_property(db.Column(db.Float), active_history=True)
+    status = db.column_property(db.Column(db.String(32), default='pending'), active_history=True)
     sender_name = db.Column(db.String(64))
     sender_phone_number = db.Column(db.String(32))
     pickup_location_text = db.Column(db.String(255))
@@ -73,27 +114,29 @@ class Parcel(db.Model):
     current_location = db.Column(db.String)
     current_location_longitude = db.Column(db.Float)
     current_location_latitude = db.Column(db.Float)
+    # Derived from the coordinates above on every write; see _sync_parcel_geohashes.
+    pickup_geohash = db.Column(db.String(12))
+    current_geohash = db.Column(db.String(12))
     distance = db.Column(db.Float)
-    cost = db.Column(db.Float)
-    created_at = db.Column(db.DateTime, default=datetime.now(timezone.utc))
-    updated_at = db.Column(db.DateTime, default=datetime.now(timezone.utc), onupdate=datetime.now(timezone.utc))
+    cost = db.column_property(db.Column(db.Float), active_history=True)
+    created_at = db.column_property(
+        db.Column(db.DateTime, default=utcnow, server_default=func.now()), active_history=True
+    )
+    updated_at = db.Column(db.DateTime, default=utcnow, onupdate=utcnow, server_default=func.now())
+    # Bumped by every UPDATE (see _bump_parcel_version); part of the ETag.
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
     recipient_name = db.Column(db.String(64))
     recipient_phone_number = db.Column(db.String(32))
     courier_id = db.Column(db.Integer)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    user_id = db.column_property(
+        db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False), active_history=True
+    )
 
     user = db.relationship('User', backref='parcels')
 
-    def to_dict(self):
+    def to_dict(self, columns=None):
         """Return a dictionary representation of the parcel."""
-        result = {}
-        for c in self.__mapper__.c:  # type: ignore
-            value = getattr(self, c.name)
-            if isinstance(value, datetime):
-                result[c.name] = value.isoformat()
-            else:
-                result[c.name] = value
-        return result
+        return serializer_for(Parcel, columns)(self)
 
     def calculate_cost(self):
         """Calculate cost for the parcel."""
@@ -101,9 +144,46 @@ class Parcel(db.Model):
             return self.weight * 150
         return 0
 
+def parcel_geohashes(values):
+    """Geohash columns for a dict of Parcel coordinates (for Core INSERT/UPDATE paths)."""
+    return {
+        'pickup_geohash': point_geohash(values.get('pick_up_latitude'), values.get('pick_up_longitude')),
+        'current_geohash': point_geohash(
+            values.get('current_location_latitude'), values.get('current_location_longitude')
+        ),
+    }
+
+
+@event.listens_for(Parcel, 'before_insert')
+@event.listens_for(Parcel, 'before_update')
+def _sync_parcel_geohashes(mapper, connection, parcel):
+    """Recompute the geohash columns whenever the ORM writes a parcel."""
+    parcel.pickup_geohash = point_geohash(parcel.pick_up_latitude, parcel.pick_up_longitude)
+    parcel.current_geohash = point_geohash(
+        parcel.current_location_latitude, parcel.current_location_longitude
+    )
+
+
+@event.listens_for(Parcel, 'before_update')
+def _bump_parcel_version(mapper, connection, parcel):
+    """Increment ``version`` in the UPDATE itself, so concurrent writers never share one."""
+    if object_session(parcel).is_modified(parcel, include_collections=False):
+        parcel.version = Parcel.version + 1
+
+
 class ParcelHistory(db.Model):
     """Parcel history model for Deliveroo app."""
     __tablename__ = 'parcel_histories'
+    # Every history query filters on at most one of parcel (optionally by
+    # type), updater or type, then keyset-pages on (timestamp, id).
+    __table_args__ = (
+        db.Index('ix_parcel_histories_parcel_id_timestamp', 'parcel_id', 'timestamp', 'id'),
+        db.Index('ix_parcel_histories_parcel_id_update_type_timestamp',
+                 'parcel_id', 'update_type', 'timestamp', 'id'),
+        db.Index('ix_parcel_histories_updated_by_timestamp', 'updated_by', 'timestamp', 'id'),
+        db.Index('ix_parcel_histories_update_type_timestamp', 'update_type', 'timestamp', 'id'),
+        db.Index('ix_parcel_histories_timestamp', 'timestamp', 'id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     parcel_id = db.Column(db.Integer, db.ForeignKey('parcels.id'), nullable=False)
@@ -111,7 +191,7 @@ class ParcelHistory(db.Model):
     update_type = db.Column(db.String, nullable=False)
     old_value = db.Column(db.String)
     new_value = db.Column(db.String)
-    timestamp = db.Column(db.DateTime, default=datetime.now(timezone.utc))
+    timestamp = db.Column(db.DateTime, default=utcnow, server_default=func.now())
 
     user = db.relationship('User', backref='history_updates')
     parcel = db.relationship('Parcel', backref='history')
@@ -127,3 +207,277 @@ class ParcelHistory(db.Model):
             "new_value": self.new_value,
             "timestamp": self.timestamp.strftime("%Y-%m-%d %H:%M:%S")
         }
+
+
+class ParcelCount(db.Model):
+    """Running number of parcels per (user, status), kept in step with the parcels table."""
+    __tablename__ = 'parcel_counts'
+
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    status = db.Column(db.String(32), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+    @classmethod
+    def total(cls, user_id=None, status=None):
+        """Sum the cached counters, optionally narrowed to one user and/or status."""
+        query = db.session.query(func.coalesce(func.sum(cls.count), 0))
+        if user_id is not None:
+            query = query.filter(cls.user_id == user_id)
+        if status is not None:
+            query = query.filter(cls.status == status)
+        return int(query.scalar())
+
+    @classmethod
+    def apply_deltas(cls, deltas):
+        """Apply ``{(user_id, status): delta}`` for writes that bypass the ORM flush.
+
+        Bulk INSERT/UPDATE statements never reach the after_flush listener,
+        so callers issuing them report their own deltas here, inside the same
+        transaction.
+        """
+        _apply_parcel_count_deltas(db.session.connection(), deltas)
+
+    @classmethod
+    def rebuild(cls):
+        """Recompute every counter from the parcels table (backfill / repair)."""
+        db.session.query(cls).delete()
+        status = func.coalesce(Parcel.status, 'pending')
+        rows = (
+            db.session.query(Parcel.user_id, status, func.count(Parcel.id))
+            .group_by(Parcel.user_id, status)
+            .all()
+        )
+        db.session.add_all(
+            cls(user_id=user_id, status=status, count=count)
+            for user_id, status, count in rows
+        )
+        db.session.commit()
+
+
+def _apply_parcel_count_deltas(connection, deltas):
+    """Upsert ``{(user_id, status): delta}`` into parcel_counts on the flush connection."""
+    table = ParcelCount.__table__
+    for (user_id, status), delta in deltas.items():
+        if not delta:
+            continue
+        result = connection.execute(
+            table.update()
+            .where(table.c.user_id == user_id, table.c.status == status)
+            .values(count=table.c.count + delta)
+        )
+        if result.rowcount == 0:
+            connection.execute(
+                table.insert().values(user_id=user_id, status=status, count=delta)
+            )
+
+
+class ParcelStat(db.Model):
+    """Daily rollup per (creation day, status): parcel count, revenue and weight.
+
+    Maintained by the same flush listener as ParcelCount, so the admin
+    dashboard reads a few rows per day instead of scanning parcels.
+    """
+    __tablename__ = 'parcel_stats'
+
+    day = db.Column(db.Date, primary_key=True)
+    status = db.Column(db.String(32), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    cost_total = db.Column(db.Float, nullable=False, default=0)
+    weight_total = db.Column(db.Float, nullable=False, default=0)
+
+    @staticmethod
+    def deltas():
+        """Empty ``{(day, status): [count, cost, weight]}`` accumulator for ``add``/``apply_deltas``."""
+        return defaultdict(lambda: [0, 0.0, 0.0])
+
+    @staticmethod
+    def add(deltas, values, sign=1):
+        """Count one parcel (a mapping with created_at, status, cost and weight) in or out."""
+        created_at = values.get('created_at') or utcnow()
+        entry = deltas[(created_at.date(), values.get('status') or 'pending')]
+        entry[0] += sign
+        entry[1] += sign * (values.get('cost') or 0.0)
+        entry[2] += sign * (values.get('weight') or 0.0)
+
+    @classmethod
+    def apply_deltas(cls, deltas):
+        """Apply rollup deltas for writes that bypass the ORM flush (see ParcelCount)."""
+        _apply_parcel_stat_deltas(db.session.connection(), deltas)
+
+    @classmethod
+    def reconcile(cls):
+        """Recompute the rollup from parcels and fix rows that drifted; returns how many.
+
+        On PostgreSQL the table is locked first so flushes that would update
+        it wait until the corrected rows are committed.
+        """
+        if db.session.get_bind().dialect.name == 'postgresql':
+            db.session.execute(db.text("LOCK TABLE parcel_stats IN EXCLUSIVE MODE"))
+        day = func.date(Parcel.created_at)
+        status = func.coalesce(Parcel.status, 'pending')
+        actual = {
+            (_as_date(row[0]), row[1]): (row[2], row[3] or 0.0, row[4] or 0.0)
+            for row in db.session.query(
+                day, status, func.count(Parcel.id), func.sum(Parcel.cost), func.sum(Parcel.weight)
+            ).group_by(day, status)
+        }
+        fixed = 0
+        for stat in db.session.query(cls):
+            values = actual.pop((stat.day, stat.status), (0, 0.0, 0.0))
+            if (stat.count, round(stat.cost_total, 2), round(stat.weight_total, 3)) == (
+                    values[0], round(values[1], 2), round(values[2], 3)):
+                continue
+            if values[0] == 0:
+                db.session.delete(stat)
+            else:
+                stat.count, stat.cost_total, stat.weight_total = values
+            fixed += 1
+        for (day_, status), (count, cost, weight) in actual.items():
+            db.session.add(cls(day=day_, status=status, count=count,
+                               cost_total=cost, weight_total=weight))
+            fixed += 1
+        db.session.commit()
+        return fixed
+
+
+def _as_date(value):
+    """``DATE()`` comes back as a string on SQLite and a date elsewhere."""
+    return date.fromisoformat(value) if isinstance(value, str) else value
+
+
+def _apply_parcel_stat_deltas(connection, deltas):
+    """Upsert rollup deltas into parcel_stats on the flush connection."""
+    table = ParcelStat.__table__
+    for (day, status), (count, cost, weight) in deltas.items():
+        if not (count or cost or weight):
+            continue
+        result = connection.execute(
+            table.update()
+            .where(table.c.day == day, table.c.status == status)
+            .values(count=table.c.count + count,
+                    cost_total=table.c.cost_total + cost,
+                    weight_total=table.c.weight_total + weight)
+        )
+        if result.rowcount == 0:
+            connection.execute(
+                table.insert().values(day=day, status=status, count=count,
+                                      cost_total=cost, weight_total=weight)
+            )
+
+
+def _previous(state, obj, name):
+    history = state.attrs[name].history
+    return (history.deleted or history.unchanged or [getattr(obj, name)])[0]
+
+
+_STAT_FIELDS = ('created_at', 'status', 'cost', 'weight')
+
+
+@event.listens_for(Session, 'after_flush')
+def _track_parcel_counts(session, flush_context):
+    """Keep ParcelCount and ParcelStat in step with parcel inserts, deletes and changes."""
+    deltas = defaultdict(int)
+    stats = ParcelStat.deltas()
+
+    for obj in session.new:
+        if isinstance(obj, Parcel):
+            deltas[(obj.user_id, obj.status or 'pending')] += 1
+            ParcelStat.add(stats, {name: getattr(obj, name) for name in _STAT_FIELDS})
+
+    for obj in session.deleted:
+        if isinstance(obj, Parcel):
+            state = inspect(obj)
+            old_status = _previous(state, obj, 'status')
+            old_user = _previous(state, obj, 'user_id')
+            deltas[(old_user, old_status or 'pending')] -= 1
+            ParcelStat.add(stats, {name: _previous(state, obj, name) for name in _STAT_FIELDS}, -1)
+
+    for obj in session.dirty:
+        if not isinstance(obj, Parcel) or obj in session.deleted:
+            continue
+        state = inspect(obj)
+        if any(state.attrs[name].history.has_changes() for name in _STAT_FIELDS):
+            ParcelStat.add(stats, {name: _previous(state, obj, name) for name in _STAT_FIELDS}, -1)
+            ParcelStat.add(stats, {name: getattr(obj, name) for name in _STAT_FIELDS})
+        status = state.attrs.status.history
+        user = state.attrs.user_id.history
+        if not (status.has_changes() or user.has_changes()):
+            continue
+        old_status = _previous(state, obj, 'status')
+        old_user = _previous(state, obj, 'user_id')
+        deltas[(old_user, old_status or 'pending')] -= 1
+        deltas[(obj.user_id, obj.status or 'pending')] += 1
+
+    if deltas:
+        _apply_parcel_count_deltas(session.connection(), deltas)
+    if stats:
+        _apply_parcel_stat_deltas(session.connection(), stats)
+
+
+class RevokedToken(db.Model):
+    """A logged-out JWT, kept only until the token would have expired anyway."""
+    __tablename__ = 'revoked_tokens'
+    __table_args__ = (
+        db.Index('ix_revoked_tokens_revoked_at', 'revoked_at'),
+        db.Index('ix_revoked_tokens_expires_at', 'expires_at'),
+    )
+
+    jti = db.Column(db.String(64), primary_key=True)
+    expires_at = db.Column(db.DateTime, nullable=False)
+    revoked_at = db.Column(db.DateTime, nullable=False, default=utcnow, server_default=func.now())
+
+
+class RateLimitWindow(db.Model):
+    """Hits for one rate-limit key in one fixed window (see server.ratelimit)."""
+    __tablename__ = 'rate_limit_windows'
+    __table_args__ = (
+        db.Index('ix_rate_limit_windows_expires_at', 'expires_at'),
+    )
+
+    key = db.Column(db.String(255), primary_key=True)
+    window_start = db.Column(db.BigInteger, primary_key=True, autoincrement=False)
+    hits = db.Column(db.Integer, nullable=False, default=0)
+    expires_at = db.Column(db.DateTime, nullable=False)
+
+
+class QuotaBucket(db.Model):
+    """Token bucket of one identity's request quota (see server.quotas)."""
+    __tablename__ = 'quota_buckets'
+
+    identity = db.Column(db.String(64), primary_key=True)
+    tokens = db.Column(db.Float, nullable=False)
+    refilled_at = db.Column(db.Float, nullable=False)  # epoch seconds
+
+
+class MapsCacheEntry(db.Model):
+    """Persistent tier of the MapsService geocode / route-metrics cache."""
+    __tablename__ = 'maps_cache'
+    __table_args__ = (
+        db.Index('ix_maps_cache_expires_at', 'expires_at'),
+    )
+
+    key = db.Column(db.String(512), primary_key=True)
+    value = db.Column(db.Text, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False)
+
+
+class EmailOutbox(db.Model):
+    """An email waiting to be delivered by the ``flask email-worker`` process."""
+    __tablename__ = 'email_outbox'
+    __table_args__ = (
+        db.Index('ix_email_outbox_status_next_attempt_at', 'status', 'next_attempt_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    transport = db.Column(db.String(16), nullable=False, default='smtp')
+    recipient = db.Column(db.String(255), nullable=False)
+    subject = db.Column(db.String(255), nullable=False)
+    html_body = db.Column(db.Text, nullable=False)
+    text_body = db.Column(db.Text)
+    # pending -> sending -> sent, or back to pending with a backoff, or dead.
+    status = db.Column(db.String(16), nullable=False, default='pending')
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=utcnow)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=utcnow, server_default=func.now())
+    sent_at = db.Column(db.DateTime)
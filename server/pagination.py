@@ -0,0 +1,73 @@
+"""Keyset (cursor) pagination helpers for Deliveroo app."""
+import base64
+import json
+from datetime import datetime
+from sqlalchemy import and_, or_
+
+
+class InvalidCursor(ValueError):
+    """Raised when a client sends a cursor we did not issue."""
+
+
+def encode_cursor(timestamp, row_id):
+    """Encode a (timestamp, id) position as an opaque URL-safe token."""
+    payload = json.dumps([timestamp.isoformat() if timestamp else None, row_id])
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token):
+    """Decode a token produced by encode_cursor back into (timestamp, id)."""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        raw_ts, row_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        timestamp = datetime.fromisoformat(raw_ts) if raw_ts else None
+        return timestamp, int(row_id)
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor(str(e)) from e
+
+
+def keyset_after(time_col, id_col, timestamp, row_id):
+    """Filter clause selecting rows strictly after (timestamp, id) in ascending order."""
+    if timestamp is None:
+        return id_col > row_id
+    return or_(
+        time_col > timestamp,
+        and_(time_col == timestamp, id_col > row_id),
+    )
+
+
+def keyset_before(time_col, id_col, timestamp, row_id):
+    """Filter clause selecting rows strictly before (timestamp, id), for descending pages."""
+    if timestamp is None:
+        return id_col < row_id
+    return or_(
+        time_col < timestamp,
+        and_(time_col == timestamp, id_col < row_id),
+    )
+
+
+def keyset_page(query, time_col, id_col, cursor, per_page, descending=False):
+    """Return (rows, next_cursor) for one page of a query ordered by (time_col, id_col).
+
+    ``cursor`` is the token from the previous page, or an empty value to start
+    from the beginning. One extra row is fetched to tell whether another page
+    exists, so no COUNT is needed. ``descending=True`` pages newest first; a
+    cursor must be reused with the direction it was issued for.
+    """
+    if cursor:
+        timestamp, row_id = decode_cursor(cursor)
+        after = keyset_before if descending else keyset_after
+        query = query.filter(after(time_col, id_col, timestamp, row_id))
+
+    if descending:
+        query = query.order_by(time_col.desc(), id_col.desc())
+    else:
+        query = query.order_by(time_col.asc(), id_col.asc())
+    rows = query.limit(per_page + 1).all()
+
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        last = rows[-1]
+        next_cursor = encode_cursor(getattr(last, time_col.key), getattr(last, id_col.key))
+    return rows, next_cursor
@@ -0,0 +1,345 @@
+"""Cost-weighted per-user request quotas (token buckets).
+
+Each authenticated identity has a token bucket sized by its role
+(``QUOTA_ROLES``: ``capacity`` tokens, refilled at ``refill`` tokens per
+second). A request must find at least ``QUOTA_COSTS['request']`` tokens,
+or it is answered 429 with ``Retry-After``. After the view runs, the
+request is charged that base cost plus whatever the view reported through
+``charge_rows`` (rows returned), ``charge_items`` (items in a bulk call)
+and ``charge_upstream`` (Maps answers). A client pulling the whole parcel
+table therefore drains its own bucket quickly, while other users' cheap
+tracking reads are unaffected. Charges may take a bucket below zero; the
+client then waits for the refill. Streamed exports are charged chunk by
+chunk as they are sent.
+
+Every quota'd response carries ``X-RateLimit-Limit``,
+``X-RateLimit-Remaining``, ``X-RateLimit-Reset`` (epoch seconds when the
+bucket is full again) and ``X-RateLimit-Cost``.
+
+The pre-check reads the bearer token's claims without verifying them,
+because the view verifies the token anyway. It only reads the bucket: a
+request is charged, and its bucket row written, only when the view
+accepted the same token. Buckets are keyed by role and subject, so a
+forged claim can neither spend nor resize a real bucket.
+
+Buckets live in a shared backend (the ``quota_buckets`` table by default),
+so every worker draws from the same bucket. Each process mirrors the
+buckets it has seen and flushes accumulated charges in one batch at most
+every ``QUOTA_SYNC_SECONDS``, the same scheme as server.ratelimit.
+Buckets that have refilled to capacity are purged now and then, since a
+missing bucket reads as full. Anonymous requests are left to the
+per-address limiter.
+"""
+import math
+import threading
+import time
+from flask import current_app, g, has_request_context, jsonify, request
+import jwt
+from flask_jwt_extended import get_jwt
+from sqlalchemy import case
+from sqlalchemy.exc import SQLAlchemyError
+from server.authorization import ADMIN_CLAIM
+
+SYNC_SECONDS = 1.0
+PURGE_INTERVAL_SECONDS = 600
+ROLE_QUOTAS = {
+    'admin': {'capacity': 2000, 'refill': 10},
+    'user': {'capacity': 300, 'refill': 1},
+}
+COSTS = {
+    'request': 1,     # every request
+    'row': 0.01,      # per row returned: a 1,000-row listing costs 10 more
+    'item': 0.1,      # per item in a bulk write
+    'upstream': 2,    # per route answered by the Maps API
+}
+
+
+def charge(cost):
+    """Add ``cost`` tokens to the current request's charge (no-op outside quota'd requests)."""
+    if not cost or not has_request_context() or g.get('quota_bucket') is None:
+        return
+    if g.get('quota_settled'):  # streamed body: the response has already gone out
+        from server.config import quotas
+        quotas.spend(g.quota_bucket, cost)
+    else:
+        g.quota_cost = g.get('quota_cost', 0) + cost
+
+
+def _unit_cost(kind):
+    from server.config import quotas
+    return quotas.costs[kind]
+
+
+def charge_rows(count):
+    charge(count * _unit_cost('row'))
+
+
+def charge_items(count):
+    charge(count * _unit_cost('item'))
+
+
+def charge_upstream(calls=1):
+    charge(calls * _unit_cost('upstream'))
+
+
+def _refilled(tokens, refilled_at, capacity, rate, now):
+    return min(capacity, tokens + max(0.0, now - refilled_at) * rate)
+
+
+class _Bucket:
+    __slots__ = ('identity', 'tokens', 'refilled_at', 'pending', 'capacity', 'rate')
+
+    def __init__(self, identity, tokens, refilled_at, capacity, rate):
+        self.identity, self.tokens, self.refilled_at = identity, tokens, refilled_at
+        self.capacity, self.rate, self.pending = capacity, rate, 0.0
+
+    def available(self, now):
+        return _refilled(self.tokens, self.refilled_at, self.capacity, self.rate, now) - self.pending
+
+
+class MemoryQuotaBackend:
+    """Process-local backend for single-worker runs and tests."""
+
+    def __init__(self):
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def peek(self, identity, capacity, rate, now):
+        """Tokens ``identity`` has at ``now``, without creating its bucket."""
+        with self._lock:
+            current, refilled_at = self._buckets.get(identity, (capacity, now))
+        return _refilled(current, refilled_at, capacity, rate, now)
+
+    def spend(self, charges, now):
+        """Refill, subtract ``{identity: (amount, capacity, rate)}`` and return the new tokens."""
+        tokens = {}
+        with self._lock:
+            for identity, (amount, capacity, rate) in charges.items():
+                current, refilled_at = self._buckets.get(identity, (capacity, now))
+                left = _refilled(current, refilled_at, capacity, rate, now) - amount
+                self._buckets[identity] = (left, max(now, refilled_at))
+                tokens[identity] = left
+        return tokens
+
+    def purge(self, roles, now):
+        with self._lock:
+            for identity, (current, refilled_at) in list(self._buckets.items()):
+                quota = roles.get(identity.partition(':')[0])
+                if quota is None:
+                    continue
+                capacity = quota['capacity']
+                if _refilled(current, refilled_at, capacity, quota['refill'], now) >= capacity:
+                    del self._buckets[identity]
+
+
+class DatabaseQuotaBackend:
+    """Backend storing buckets in ``quota_buckets``, on a connection separate from db.session."""
+
+    def peek(self, identity, capacity, rate, now):
+        from server.config import db
+        from server.models import QuotaBucket
+        table = QuotaBucket.__table__
+        with db.engine.connect() as conn:
+            row = conn.execute(
+                table.select().with_only_columns(table.c.tokens, table.c.refilled_at)
+                .where(table.c.identity == identity)
+            ).first()
+        return capacity if row is None else _refilled(row.tokens, row.refilled_at, capacity, rate, now)
+
+    def spend(self, charges, now):
+        from server.config import db
+        from server.models import QuotaBucket
+        from server.ratelimit import insert_ignore
+        table = QuotaBucket.__table__
+        elapsed = case((table.c.refilled_at < now, now - table.c.refilled_at), else_=0)
+        with db.engine.begin() as conn:
+            for identity, (amount, capacity, rate) in sorted(charges.items()):
+                conn.execute(insert_ignore(conn, table).values(
+                    identity=identity, tokens=capacity, refilled_at=now
+                ))
+                refilled = table.c.tokens + elapsed * rate
+                conn.execute(
+                    table.update().where(table.c.identity == identity).values(
+                        tokens=case((refilled > capacity, capacity), else_=refilled) - amount,
+                        refilled_at=case((table.c.refilled_at < now, now), else_=table.c.refilled_at),
+                    )
+                )
+            rows = conn.execute(
+                table.select().with_only_columns(table.c.identity, table.c.tokens)
+                .where(table.c.identity.in_(list(charges)))
+            )
+            return {row.identity: row.tokens for row in rows}
+
+    def purge(self, roles, now):
+        """Delete the buckets that have refilled to capacity by ``now``."""
+        from server.config import db
+        from server.models import QuotaBucket
+        table = QuotaBucket.__table__
+        with db.engine.begin() as conn:
+            for role, quota in roles.items():
+                refilled = table.c.tokens + (now - table.c.refilled_at) * quota['refill']
+                conn.execute(table.delete().where(
+                    table.c.identity.startswith(f"{role}:"), refilled >= quota['capacity']
+                ))
+
+
+BACKENDS = {
+    'database': DatabaseQuotaBackend,
+    'memory': MemoryQuotaBackend,
+}
+
+
+class QuotaManager:
+    """Flask extension enforcing the per-identity buckets around each request."""
+
+    def __init__(self, app=None):
+        self.backend = None
+        self.enabled = True
+        self.roles, self.costs = dict(ROLE_QUOTAS), dict(COSTS)
+        self.sync_seconds = SYNC_SECONDS
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self._syncing = threading.Lock()
+        self._last_sync = time.time()
+        self._last_purge = 0.0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        config = app.config
+        self.enabled = config.setdefault('QUOTA_ENABLED', True)
+        backend = config.setdefault('QUOTA_BACKEND', 'database')
+        self.backend = BACKENDS[backend]() if isinstance(backend, str) else backend
+        self.roles = dict(ROLE_QUOTAS, **config.setdefault('QUOTA_ROLES', {}))
+        self.costs = dict(COSTS, **config.setdefault('QUOTA_COSTS', {}))
+        self.sync_seconds = config.setdefault('QUOTA_SYNC_SECONDS', SYNC_SECONDS)
+        self._buckets = {}
+        app.before_request(self.before_request)
+        app.after_request(self.after_request)
+
+    @staticmethod
+    def _identity(claims):
+        """``(identity, role)`` for a token's claims, or None without a subject."""
+        if not claims.get('sub'):
+            return None
+        role = 'admin' if claims.get(ADMIN_CLAIM) else 'user'
+        return f"{role}:{claims['sub']}", role
+
+    def _identify(self):
+        """``(identity, role)`` from the bearer token's claims, unverified."""
+        scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+        if request.method == 'OPTIONS' or scheme != 'Bearer' or not token:
+            return None
+        try:
+            return self._identity(jwt.decode(token, options={'verify_signature': False}))
+        except jwt.PyJWTError:
+            return None
+
+    def bucket(self, identity, role, now=None):
+        """The mirrored bucket for ``identity``, read from the backend on first use."""
+        bucket = self._buckets.get(identity)
+        if bucket is not None:
+            return bucket
+        now = time.time() if now is None else now
+        quota = self.roles[role]
+        capacity, rate = float(quota['capacity']), float(quota['refill'])
+        try:
+            tokens = self.backend.peek(identity, capacity, rate, now)
+        except SQLAlchemyError as e:
+            current_app.logger.warning(f"Quota load failed: {str(e)}")
+            tokens = capacity
+        with self._lock:
+            return self._buckets.setdefault(identity, _Bucket(identity, tokens, now, capacity, rate))
+
+    def spend(self, bucket, cost):
+        with self._lock:
+            # A sync may have dropped the bucket as idle since this request loaded it.
+            self._buckets.setdefault(bucket.identity, bucket).pending += cost
+
+    def sync(self, now=None):
+        """Flush pending charges in one batch, refresh those buckets and purge full ones."""
+        now = time.time() if now is None else now
+        if not self._syncing.acquire(blocking=False):
+            return
+        try:
+            with self._lock:
+                self._last_sync = now
+                batch = {}
+                for identity, bucket in list(self._buckets.items()):
+                    if bucket.pending:
+                        batch[identity] = (bucket.pending, bucket.capacity, bucket.rate)
+                    elif bucket.available(now) >= bucket.capacity:
+                        del self._buckets[identity]  # idle and full: the backend has it
+            if now - self._last_purge >= PURGE_INTERVAL_SECONDS:
+                self._last_purge = now
+                try:
+                    self.backend.purge(self.roles, now)
+                except SQLAlchemyError as e:
+                    current_app.logger.warning(f"Quota purge failed: {str(e)}")
+            if not batch:
+                return
+            try:
+                tokens = self.backend.spend(batch, now)
+            except SQLAlchemyError as e:
+                current_app.logger.warning(f"Quota sync failed: {str(e)}")
+                return
+            with self._lock:
+                for identity, (amount, _, _) in batch.items():
+                    bucket = self._buckets.get(identity)
+                    if bucket is not None and identity in tokens:
+                        bucket.tokens, bucket.refilled_at = tokens[identity], now
+                        bucket.pending -= amount
+        finally:
+            self._syncing.release()
+
+    def headers(self, bucket, cost, now):
+        available = bucket.available(now)
+        full_in = max(0.0, bucket.capacity - available) / bucket.rate if bucket.rate else 0
+        return {
+            'X-RateLimit-Limit': str(int(bucket.capacity)),
+            'X-RateLimit-Remaining': str(max(0, int(available))),
+            'X-RateLimit-Reset': str(math.ceil(now + full_in)),
+            'X-RateLimit-Cost': f"{cost:g}",
+        }
+
+    def before_request(self):
+        g.quota_bucket, g.quota_cost, g.quota_settled = None, 0, False
+        if not self.enabled:
+            return None
+        who = self._identify()
+        if who is None or who[1] not in self.roles:
+            return None
+        now = time.time()
+        if now - self._last_sync >= self.sync_seconds:
+            self.sync(now)
+        bucket = self.bucket(*who, now=now)
+        g.quota_bucket = bucket
+        needed = self.costs['request']
+        available = bucket.available(now)
+        if available >= needed:
+            return None
+
+        g.quota_settled = True  # nothing is charged for a refused request
+        wait = (needed - available) / bucket.rate if bucket.rate else 3600
+        response = jsonify({'error': 'Request quota exhausted, retry later', 'retry_after': math.ceil(wait)})
+        response.status_code = 429
+        response.headers.update(self.headers(bucket, 0, now))
+        response.headers['Retry-After'] = str(math.ceil(wait))
+        return response
+
+    def after_request(self, response):
+        bucket = g.get('quota_bucket')
+        if bucket is None or g.get('quota_settled'):
+            return response
+        try:
+            verified = self._identity(get_jwt())
+        except RuntimeError:  # the view never verified a token
+            verified = None
+        if verified is None or verified[0] != bucket.identity:
+            g.quota_bucket = None
+            return response
+        cost = self.costs['request'] + g.pop('quota_cost', 0)
+        self.spend(bucket, cost)
+        g.quota_settled = True
+        response.headers.update(self.headers(bucket, cost, time.time()))
+        return response
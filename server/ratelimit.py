@@ -0,0 +1,305 @@
+"""Shared sliding-window rate-limit storage for Flask-Limiter.
+
+With ``RATELIMIT_STORAGE_URI = "database://"`` every worker counts hits in
+the ``rate_limit_windows`` table. Otherwise each gunicorn worker would
+enforce its own copy of "100 per hour". Each limit keeps one row per
+(key, fixed window). The sliding estimate is the current window's hits
+plus the previous window's hits, weighted by how much of the previous
+window still overlaps the last ``expiry`` seconds. That is two integers
+per key instead of a timestamp per hit. ``RATELIMIT_STRATEGY =
+"moving-window"`` routes Flask-Limiter through ``acquire_entry``.
+
+A local mirror keeps the per-request cost to a dict lookup:
+
+- The first hit on a key in each window reads the shared count.
+- While a key is below ``exact_above`` of its limit, hits are accepted
+  locally. They are flushed in one batched transaction at most every
+  ``sync_seconds``, which also pulls other workers' counts for those keys.
+- Above that point each hit is a single conditional UPDATE
+  (``hits + n <= cap``), so workers cannot race past the limit.
+- Once a key is over its limit, requests are rejected from the mirror
+  until the window slides, with no storage round trip.
+
+Overshoot is bounded by the hits other workers accept for a key in one
+sync interval while it is below ``exact_above``. Both options come from
+``RATELIMIT_STORAGE_OPTIONS``. Any other ``limits`` URI (``memory://`` for
+tests, ``redis://``) still works unchanged.
+"""
+import threading
+import time
+from datetime import datetime, timezone
+from flask import current_app
+from limits.storage import MovingWindowSupport, Storage
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import SQLAlchemyError
+
+SYNC_SECONDS = 1.0
+EXACT_ABOVE = 0.5
+PURGE_INTERVAL_SECONDS = 600
+# Per-endpoint limits applied on top of the defaults; see ``route_limit``.
+ROUTE_LIMITS = {
+    'login': '10 per minute',
+    'signup': '5 per minute',
+    'register': '5 per minute',
+    'parcelbulk': '30 per minute',
+    'parcelquote': '60 per minute',
+}
+
+
+def _naive_utc(epoch):
+    return datetime.fromtimestamp(epoch, tz=timezone.utc).replace(tzinfo=None)
+
+
+def insert_ignore(conn, table):
+    dialect = {'postgresql': postgresql, 'sqlite': sqlite}[conn.dialect.name]
+    return dialect.insert(table).on_conflict_do_nothing()
+
+
+def route_limit(endpoint):
+    """Limit decorator reading ``RATELIMIT_ROUTES[endpoint]`` per request (absent = none)."""
+    from server.config import limiter
+    return limiter.limit(
+        lambda: current_app.config.get('RATELIMIT_ROUTES', {}).get(endpoint),
+        override_defaults=False,
+    )
+
+
+class _Window:
+    __slots__ = ('synced', 'pending', 'expiry')
+
+    def __init__(self, expiry, synced=0):
+        self.synced, self.pending, self.expiry = synced, 0, expiry
+
+    @property
+    def hits(self):
+        return self.synced + self.pending
+
+
+class DatabaseWindowBackend:
+    """Window counters in ``rate_limit_windows``, on a connection separate from db.session."""
+
+    KEYS_PER_QUERY = 500
+
+    @staticmethod
+    def _table():
+        from server.models import RateLimitWindow
+        return RateLimitWindow.__table__
+
+    @staticmethod
+    def _add(conn, table, key, start, amount, expires_at, cap=None):
+        """Add ``amount`` hits; with ``cap``, only if the total stays within it."""
+        update = (
+            table.update().where(table.c.key == key, table.c.window_start == start)
+            .values(hits=table.c.hits + amount)
+        )
+        if cap is not None:
+            update = update.where(table.c.hits + amount <= cap)
+        if conn.execute(update).rowcount:
+            return True
+        # The row may not exist yet; create it empty (racing workers are
+        # ignored) and retry, so the cap is checked by a single UPDATE.
+        conn.execute(insert_ignore(conn, table).values(
+            key=key, window_start=start, hits=0, expires_at=_naive_utc(expires_at)
+        ))
+        return bool(conn.execute(update).rowcount)
+
+    def flush(self, batch):
+        """Add ``{(key, start): (amount, expiry)}`` and return the stored hits for those keys."""
+        from server.config import db
+        table = self._table()
+        keys = sorted({key for key, _ in batch})
+        counts = {}
+        with db.engine.begin() as conn:
+            for (key, start), (amount, expiry) in sorted(batch.items()):
+                self._add(conn, table, key, start, amount, start + 2 * expiry)
+            now = _naive_utc(time.time())
+            for i in range(0, len(keys), self.KEYS_PER_QUERY):
+                rows = conn.execute(
+                    table.select().with_only_columns(table.c.key, table.c.window_start, table.c.hits)
+                    .where(table.c.key.in_(keys[i:i + self.KEYS_PER_QUERY]), table.c.expires_at > now)
+                )
+                counts.update(((row.key, row.window_start), row.hits) for row in rows)
+        return counts
+
+    def acquire(self, key, start, expiry, amount, limit, weight):
+        """Atomically add ``amount`` if the sliding estimate stays within ``limit``.
+
+        Returns ``(accepted, previous_hits, current_hits)``.
+        """
+        from server.config import db
+        table = self._table()
+        with db.engine.begin() as conn:
+            hits = dict(conn.execute(
+                table.select().with_only_columns(table.c.window_start, table.c.hits)
+                .where(table.c.key == key, table.c.window_start.in_((start - expiry, start)))
+            ).all())
+            previous = hits.get(start - expiry, 0)
+            cap = int(limit - previous * weight)
+            accepted = cap >= amount and self._add(
+                conn, table, key, start, amount, start + 2 * expiry, cap=cap
+            )
+            current = conn.execute(
+                table.select().with_only_columns(table.c.hits)
+                .where(table.c.key == key, table.c.window_start == start)
+            ).scalar() or 0
+        return accepted, previous, current
+
+    def clear(self, key=None):
+        from server.config import db
+        table = self._table()
+        with db.engine.begin() as conn:
+            result = conn.execute(table.delete() if key is None else table.delete().where(table.c.key == key))
+        return result.rowcount
+
+    def purge(self, now):
+        from server.config import db
+        table = self._table()
+        with db.engine.begin() as conn:
+            conn.execute(table.delete().where(table.c.expires_at <= _naive_utc(now)))
+
+    def check(self):
+        from server.config import db
+        with db.engine.connect() as conn:
+            conn.execute(db.text('SELECT 1'))
+        return True
+
+
+class SlidingWindowStorage(Storage, MovingWindowSupport):
+    """``limits`` storage for ``database://``: sliding-window counters mirrored in-process."""
+
+    STORAGE_SCHEME = ['database']
+
+    def __init__(self, uri=None, wrap_exceptions=False, sync_seconds=SYNC_SECONDS,
+                 exact_above=EXACT_ABOVE, backend=None, **options):
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+        self.sync_seconds = float(sync_seconds)
+        self.exact_above = float(exact_above)
+        self.backend = backend or DatabaseWindowBackend()
+        self._windows = {}
+        self._expiries = {}
+        self._last_sync = time.time()
+        self._last_purge = 0.0
+        self._syncing = threading.Lock()
+
+    @property
+    def base_exceptions(self):
+        return SQLAlchemyError
+
+    def _estimate(self, key, expiry, now):
+        """``(window start, previous-window weight, previous hits, current hits)`` from the mirror."""
+        start = int(now // expiry) * expiry
+        weight = 1 - (now - start) / expiry
+        previous = self._windows.get((key, start - expiry))
+        current = self._windows.get((key, start))
+        return start, weight, previous.hits if previous else 0, current.hits if current else 0
+
+    def acquire_entry(self, key, limit, expiry, amount=1):
+        now = time.time()
+        if now - self._last_sync >= self.sync_seconds:
+            self.sync(now)
+        with self.lock:
+            start, weight, previous, current = self._estimate(key, expiry, now)
+            used = previous * weight + current
+            if used + amount > limit:
+                return False
+            window = self._windows.get((key, start))
+            if window is not None and used + amount <= limit * self.exact_above:
+                window.pending += amount
+                return True
+
+        # First sight of this window, or near the limit: flush, then ask the storage.
+        self.sync(now)
+        accepted, previous, current = self.backend.acquire(key, start, expiry, amount, limit, weight)
+        with self.lock:
+            for window_start, hits in ((start - expiry, previous), (start, current)):
+                window = self._windows.setdefault((key, window_start), _Window(expiry))
+                window.synced = hits
+        return accepted
+
+    def get_moving_window(self, key, limit, expiry):
+        with self.lock:
+            start, weight, previous, current = self._estimate(key, expiry, time.time())
+        return start, int(previous * weight + current)
+
+    def sync(self, now=None):
+        """Flush pending hits in one batch and refresh the mirror for those keys."""
+        now = time.time() if now is None else now
+        if not self._syncing.acquire(blocking=False):
+            return  # another thread is already syncing
+        try:
+            with self.lock:
+                self._last_sync = now
+                batch = {}
+                for slot, window in list(self._windows.items()):
+                    if slot[1] + 2 * window.expiry <= now:
+                        del self._windows[slot]
+                    elif window.pending:
+                        batch[slot] = (window.pending, window.expiry)
+                        window.synced += window.pending
+                        window.pending = 0
+            if not batch:
+                return
+            try:
+                counts = self.backend.flush(batch)
+            except SQLAlchemyError as e:
+                current_app.logger.warning(f"Rate limit sync failed: {str(e)}")
+                with self.lock:  # keep the hits and retry on the next sync
+                    for slot, (amount, expiry) in batch.items():
+                        window = self._windows.setdefault(slot, _Window(expiry))
+                        window.synced -= amount
+                        window.pending += amount
+                return
+            expiries = {key: expiry for (key, _), (_, expiry) in batch.items()}
+            with self.lock:
+                for slot, hits in counts.items():
+                    window = self._windows.get(slot)
+                    if window is None:
+                        window = self._windows[slot] = _Window(expiries[slot[0]])
+                    window.synced = hits
+            if now - self._last_purge >= PURGE_INTERVAL_SECONDS:
+                self._last_purge = now
+                self.backend.purge(now)
+        finally:
+            self._syncing.release()
+
+    # -- fixed-window strategies ------------------------------------------
+    # Only the current window counts; hits are batched the same way.
+
+    def incr(self, key, expiry, elastic_expiry=False, amount=1):
+        now = time.time()
+        if now - self._last_sync >= self.sync_seconds:
+            self.sync(now)
+        start = int(now // expiry) * expiry
+        with self.lock:
+            self._expiries[key] = expiry
+            window = self._windows.get((key, start))
+            if window is None:
+                window = self._windows[(key, start)] = _Window(expiry)
+            window.pending += amount
+            return window.hits
+
+    def get(self, key):
+        expiry = self._expiries.get(key)
+        if expiry is None:
+            return 0
+        window = self._windows.get((key, int(time.time() // expiry) * expiry))
+        return window.hits if window else 0
+
+    def get_expiry(self, key):
+        expiry = self._expiries.get(key, 0)
+        now = time.time()
+        return int(now // expiry) * expiry + expiry if expiry else int(now)
+
+    def check(self):
+        return self.backend.check()
+
+    def reset(self):
+        with self.lock:
+            self._windows.clear()
+        return self.backend.clear()
+
+    def clear(self, key):
+        with self.lock:
+            for slot in [s for s in self._windows if s[0] == key]:
+                del self._windows[slot]
+        self.backend.clear(key)
@@ -0,0 +1,143 @@
+"""Shared JWT revocation store for Deliveroo app.
+
+Revoked ``jti`` values are written to a shared backend (the
+``revoked_tokens`` table by default) so a logout applies on every worker.
+Each process mirrors the unexpired revocations in a local dict that it
+refreshes from the backend at most once per ``JWT_REVOCATION_SYNC_SECONDS``,
+so the per-request check is a dict lookup with no network hop. Entries are
+dropped at the token's ``exp``, which keeps both the table and the mirror
+bounded by the number of tokens revoked within one token lifetime.
+"""
+import threading
+import time
+from datetime import datetime, timezone
+
+
+def _to_epoch(value):
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+def _from_epoch(value):
+    return datetime.fromtimestamp(value, tz=timezone.utc).replace(tzinfo=None)
+
+
+class MemoryRevocationBackend:
+    """Process-local backend for single-worker runs and tests."""
+
+    def __init__(self):
+        self._entries = {}
+
+    def add(self, jti, expires_at):
+        self._entries[jti] = (expires_at, time.time())
+
+    def changes_since(self, since):
+        return [(jti, exp) for jti, (exp, at) in self._entries.items() if at >= since]
+
+    def purge(self, now):
+        for jti in [j for j, (exp, _) in self._entries.items() if exp <= now]:
+            del self._entries[jti]
+
+
+class DatabaseRevocationBackend:
+    """Backend storing revocations in the ``revoked_tokens`` table."""
+
+    def add(self, jti, expires_at):
+        from server.config import db
+        from server.models import RevokedToken
+        db.session.merge(RevokedToken(jti=jti, expires_at=_from_epoch(expires_at)))
+        db.session.commit()
+
+    def changes_since(self, since):
+        from server.models import RevokedToken
+        rows = (
+            RevokedToken.query
+            .with_entities(RevokedToken.jti, RevokedToken.expires_at)
+            .filter(RevokedToken.revoked_at >= _from_epoch(since))
+            .filter(RevokedToken.expires_at > _from_epoch(time.time()))
+            .all()
+        )
+        return [(jti, _to_epoch(expires_at)) for jti, expires_at in rows]
+
+    def purge(self, now):
+        # Reached from the blocklist check of some request: never touch its db.session.
+        from server.config import db
+        from server.models import RevokedToken
+        table = RevokedToken.__table__
+        with db.engine.begin() as conn:
+            conn.execute(table.delete().where(table.c.expires_at <= _from_epoch(now)))
+
+
+BACKENDS = {
+    'database': DatabaseRevocationBackend,
+    'memory': MemoryRevocationBackend,
+}
+
+
+class TokenRevocationStore:
+    """Revocation list shared through a backend and mirrored in-process."""
+
+    # Re-read a little history on every sync so a revocation committed by
+    # another worker just before our previous sync is never skipped.
+    SYNC_OVERLAP_SECONDS = 30
+    PURGE_INTERVAL_SECONDS = 600
+
+    def __init__(self, app=None):
+        self.backend = None
+        self.sync_interval = 5
+        self._revoked = {}
+        self._lock = threading.Lock()
+        self._last_sync = None
+        self._last_purge = 0.0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        backend = app.config.setdefault('JWT_REVOCATION_BACKEND', 'database')
+        self.sync_interval = app.config.setdefault('JWT_REVOCATION_SYNC_SECONDS', 5)
+        self.backend = BACKENDS[backend]() if isinstance(backend, str) else backend
+        self._revoked = {}
+        self._last_sync = None
+
+    def revoke(self, jti, expires_at):
+        """Revoke ``jti`` until ``expires_at`` (epoch seconds, the token's ``exp``)."""
+        self.backend.add(jti, expires_at)
+        with self._lock:
+            self._revoked[jti] = expires_at
+
+    def is_revoked(self, jti):
+        """O(1) membership check against the local mirror, syncing when it is stale."""
+        now = time.time()
+        if self._last_sync is None or now - self._last_sync >= self.sync_interval:
+            self.sync(now)
+
+        expires_at = self._revoked.get(jti)
+        if expires_at is None:
+            return False
+        if expires_at <= now:
+            self._revoked.pop(jti, None)
+            return False
+        return True
+
+    def sync(self, now=None):
+        """Pull revocations made by other workers and drop expired entries."""
+        now = time.time() if now is None else now
+        since = 0.0 if self._last_sync is None else self._last_sync - self.SYNC_OVERLAP_SECONDS
+        changes = self.backend.changes_since(since)
+
+        with self._lock:
+            self._revoked.update(changes)
+            for jti in [j for j, exp in self._revoked.items() if exp <= now]:
+                del self._revoked[jti]
+            self._last_sync = now
+
+        if now - self._last_purge >= self.PURGE_INTERVAL_SECONDS:
+            self._last_purge = now
+            self.backend.purge(now)
+
+    def __contains__(self, jti):
+        return self.is_revoked(jti)
+
+    def __len__(self):
+        return len(self._revoked)
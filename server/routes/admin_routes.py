@@ -1,28 +1,56 @@
 """Admin routes for Deliveroo app."""
 
-from datetime import datetime, timezone
-from flask import request, jsonify
+import time
+from collections import Counter, defaultdict
+from datetime import date, datetime, timedelta, timezone
+from flask import current_app, request, jsonify
 from flask_restful import Resource
-from flask_jwt_extended import jwt_required, get_jwt_identity
 from flasgger import swag_from
-from server.config import db
-from server.models import Parcel, User, ParcelHistory
-
-# Utility to get current logged-in user
-def get_current_user():
-    user_id = get_jwt_identity()
-    return User.query.get(user_id)
-
-# Admin role enforcement
-def admin_required(func):
-    @jwt_required()
-    def wrapper(*args, **kwargs):
-        user = get_current_user()
-        if not user or not user.admin:
-            return {"error": "Admin access required"}, 403
-        return func(*args, **kwargs, current_user=user)
-    wrapper.__name__ = func.__name__
-    return wrapper
+from sqlalchemy import and_, bindparam, func, or_, select
+from server.authorization import admin_required
+from server.conditional import (
+    collection_etag, is_fresh, not_modified, parcel_etag, parcel_version, validator_headers
+)
+from server.config import db, parcel_events
+from server.events import history_event
+from server.models import (
+    Parcel, ParcelCount, ParcelStat, User, ParcelHistory, parcel_geohashes, utcnow
+)
+from server.services.email_service import (
+    notify_owner_digests, notify_parcel_owner, send_location_update_email, send_status_update_email
+)
+from server.pagination import InvalidCursor, keyset_page
+from server.quotas import charge_items, charge_rows
+from server.services.assignment import Courier, Job, assign_couriers
+from server.services.geo import bbox_around, geohash_cover, geohash_ranges, haversine_m
+from server.services.route_plan import (
+    PLAN_TTL, manifest_stops, plan_cache, plan_key, plan_route
+)
+from server.services.routing import get_router
+from server.streaming import requested_stream_format, stream_query
+
+HISTORY_FIELDS = ['id', 'parcel_id', 'updated_by', 'update_type', 'old_value', 'new_value', 'timestamp']
+HISTORY_PAGE_SIZE = 50
+MAX_HISTORY_PAGE_SIZE = 200
+# Parcel state a hub scan reads and rewrites.
+SCAN_COLUMNS = ('id', 'user_id', 'status', 'current_location',
+                'current_location_latitude', 'current_location_longitude',
+                'created_at', 'cost', 'weight')
+_STATUS_LENGTH = Parcel.__table__.c.status.type.length
+# (geohash, latitude, longitude) columns behind ?field= on the spatial queries.
+SPATIAL_FIELDS = {
+    'pickup': (Parcel.pickup_geohash, Parcel.pick_up_latitude, Parcel.pick_up_longitude),
+    'current': (Parcel.current_geohash, Parcel.current_location_latitude,
+                Parcel.current_location_longitude),
+}
+SPATIAL_LIMIT = 100
+MAX_SPATIAL_LIMIT = 1000
+MAX_RADIUS_M = 100_000
+MAX_ASSIGNMENT_WORKERS = 8
+CLOSED_STATUSES = ('delivered', 'cancelled')
+MAX_ROUTE_STOPS = 500
+STATS_DAYS = 30
+MAX_STATS_DAYS = 366
 
 class AdminParcelList(Resource):
     """Resource for listing all parcels (admin only)."""
@@ -30,20 +58,43 @@ class AdminParcelList(Resource):
     @swag_from({
         'tags': ['Admin'],
         'summary': 'List all parcels',
-        'description': 'Returns a list of all parcels. Admin access only.',
+        'description': 'Returns a list of all parcels. Admin access only. '
+                       'Send Accept: application/x-ndjson or ?format=csv to stream the listing.',
         'security': [{'BearerAuth': []}],
+        'parameters': [
+            {
+                'name': 'format',
+                'in': 'query',
+                'required': False,
+                'schema': {'type': 'string', 'enum': ['json', 'ndjson', 'csv']}
+            }
+        ],
         'responses': {
             200: {
                 'description': 'List of all parcels',
                 'content': {'application/json': {}}
             },
+            304: {'description': 'Unchanged since the If-None-Match ETag'},
             403: {'description': 'Unauthorized (non-admin)'}
         }
     })
     @admin_required
     def get(self, current_user):
-        parcels = Parcel.query.all()
-        return jsonify([p.to_dict() for p in parcels])
+        fmt = requested_stream_format()
+        etag = collection_etag(None, fmt)
+        if is_fresh(etag):
+            return not_modified(etag)
+        if fmt:
+            fields = [c.name for c in Parcel.__table__.c]
+            response = stream_query(
+                Parcel.query.order_by(Parcel.id), Parcel.to_dict, fields, fmt, 'parcels'
+            )
+        else:
+            parcels = Parcel.query.all()
+            charge_rows(len(parcels))
+            response = jsonify([p.to_dict() for p in parcels])
+        response.headers.update(validator_headers(etag))
+        return response
 
 class AdminParcelDetail(Resource):
     """Get a specific parcel by ID (admin only)."""
@@ -66,16 +117,27 @@ class AdminParcelDetail(Resource):
                 'description': 'Parcel details',
                 'content': {'application/json': {}}
             },
+            304: {'description': 'Unchanged since the If-None-Match ETag'},
             404: {'description': 'Parcel not found'},
             403: {'description': 'Unauthorized'}
         }
     })
     @admin_required
     def get(self, current_user, parcel_id):
+        if request.if_none_match:
+            found = parcel_version(parcel_id)
+            if found is None:
+                return {'message': 'Parcel not found'}, 404
+            if is_fresh(found[1]):
+                return not_modified(found[1])
         parcel = Parcel.query.get(parcel_id)
         if not parcel:
             return {'message': 'Parcel not found'}, 404
-        return jsonify(parcel.to_dict())
+        response = jsonify(parcel.to_dict())
+        response.headers.update(
+            validator_headers(parcel_etag(parcel.id, parcel.version, parcel.updated_at))
+        )
+        return response
 
 class UpdateParcelStatus(Resource):
     """Resource for updating parcel status (admin only)."""
@@ -138,7 +200,11 @@ class UpdateParcelStatus(Resource):
             new_value=new_status
         )
         db.session.add(history)
+        notify_parcel_owner(parcel, send_status_update_email, old_status, new_status)
+        db.session.flush()
+        event = history_event(history, parcel.user_id)
         db.session.commit()
+        parcel_events.publish([event])
 
         return {"message": "Parcel status updated", "parcel": parcel.to_dict()}, 200
 
@@ -203,27 +269,363 @@ class UpdateParcelLocation(Resource):
             new_value=new_location
         )
         db.session.add(history)
+        notify_parcel_owner(parcel, send_location_update_email, new_location)
+        db.session.flush()
+        event = history_event(history, parcel.user_id)
         db.session.commit()
+        parcel_events.publish([event])
 
         return {"message": "Parcel location updated", "parcel": parcel.to_dict()}, 200
 
+def _read_scan_items(max_items):
+    """Return the list of scans from a JSON array or ``{"scans": [...]}`` body."""
+    body = request.get_json(silent=True)
+    if isinstance(body, dict):
+        body = body.get('scans')
+    if not isinstance(body, list):
+        raise ValueError("Expected a JSON array of scans")
+    if len(body) > max_items:
+        raise ValueError(f"At most {max_items} scans per request")
+    return body
+
+
+def _validate_scan(item):
+    """Normalize one scan to ``(parcel_id, status, location, lat, lng)``.
+
+    Raises ValueError with the message the single-item endpoints would give.
+    """
+    if not isinstance(item, dict):
+        raise ValueError("Each scan must be a JSON object")
+    parcel_id = item.get('parcel_id')
+    if isinstance(parcel_id, bool) or not isinstance(parcel_id, int):
+        raise ValueError("parcel_id must be an integer")
+
+    status = item.get('status')
+    location = item.get('location', item.get('current_location'))
+    for name, value in (('status', status), ('location', location)):
+        if value is not None and not isinstance(value, str):
+            raise ValueError(f"{name} must be a string")
+    status = (status or '').strip() or None
+    location = (location or '').strip() or None
+    if status and len(status) > _STATUS_LENGTH:
+        raise ValueError(f"status too long (max {_STATUS_LENGTH} characters)")
+
+    lat, lng = item.get('lat'), item.get('lng')
+    if (lat is None) != (lng is None):
+        raise ValueError("lat and lng must be given together")
+    if lat is not None:
+        if not all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in (lat, lng)):
+            raise ValueError("lat and lng must be numbers")
+        lat, lng = float(lat), float(lng)
+
+    if not status and not location and lat is None:
+        raise ValueError("status, location or lat/lng is required")
+    return parcel_id, status, location, lat, lng
+
+
+class AdminParcelScan(Resource):
+    """Apply a batch of hub scans (status and/or location updates) in one transaction."""
+
+    @swag_from({
+        'tags': ['Admin'],
+        'summary': 'Bulk hub scan',
+        'description': 'Updates status and/or current location for many parcels at once. '
+                       'Each scan is reported by index with the error and status code the '
+                       'single-parcel endpoints would have returned. 200 when every scan was '
+                       'applied, 207 when some were, 400 when none.',
+        'security': [{'BearerAuth': []}],
+        'requestBody': {
+            'required': True,
+            'content': {
+                'application/json': {
+                    'schema': {
+                        'type': 'array',
+                        'items': {
+                            'type': 'object',
+                            'properties': {
+                                'parcel_id': {'type': 'integer', 'example': 42},
+                                'status': {'type': 'string', 'example': 'in transit'},
+                                'location': {'type': 'string', 'example': 'Nairobi Hub'},
+                                'lat': {'type': 'number', 'example': -1.2921},
+                                'lng': {'type': 'number', 'example': 36.8219}
+                            },
+                            'required': ['parcel_id']
+                        }
+                    }
+                }
+            }
+        },
+        'responses': {
+            200: {'description': 'All scans applied'},
+            207: {'description': 'Some scans applied; see results'},
+            400: {'description': 'No scan could be applied, or the body is unusable'},
+            403: {'description': 'Unauthorized (non-admin)'}
+        }
+    })
+    @admin_required
+    def post(self, current_user):
+        """Apply scans with one SELECT, one executemany UPDATE and one history INSERT.
+
+        Scans are applied in request order, so several scans of the same
+        parcel chain their history rows exactly as repeated PATCHes would.
+        """
+        try:
+            items = _read_scan_items(current_app.config.get('PARCEL_SCAN_MAX_ITEMS', 5000))
+        except ValueError as e:
+            return {"error": str(e)}, 400
+        if not items:
+            return {"error": "No scans supplied"}, 400
+        charge_items(len(items))
+
+        errors, scans = {}, {}
+        for i, item in enumerate(items):
+            try:
+                scans[i] = _validate_scan(item)
+            except ValueError as e:
+                errors[i] = (str(e), 400)
+
+        applied = {}
+        if scans:
+            try:
+                table = Parcel.__table__
+                rows = db.session.execute(
+                    select(*(table.c[name] for name in SCAN_COLUMNS))
+                    .where(table.c.id.in_({scan[0] for scan in scans.values()}))
+                    .with_for_update()
+                ).mappings()
+                parcels = {row['id']: dict(row) for row in rows}
+                original_status = {pid: p['status'] for pid, p in parcels.items()}
+
+                now = utcnow()
+                history, touched = [], {}
+                for i, (parcel_id, status, location, lat, lng) in scans.items():
+                    parcel = parcels.get(parcel_id)
+                    if parcel is None:
+                        errors[i] = ("Parcel not found", 404)
+                        continue
+                    if status:
+                        history.append(dict(
+                            parcel_id=parcel_id, updated_by=current_user.id, update_type="status",
+                            old_value=parcel['status'], new_value=status, timestamp=now
+                        ))
+                        parcel['status'] = status
+                    if location:
+                        history.append(dict(
+                            parcel_id=parcel_id, updated_by=current_user.id, update_type="location",
+                            old_value=parcel['current_location'], new_value=location, timestamp=now
+                        ))
+                        parcel['current_location'] = location
+                    if lat is not None:
+                        parcel['current_location_latitude'] = lat
+                        parcel['current_location_longitude'] = lng
+                    touched[parcel_id] = parcel
+                    applied[i] = parcel_id
+
+                if touched:
+                    db.session.execute(
+                        table.update().where(table.c.id == bindparam('b_id')).values(
+                            status=bindparam('b_status'),
+                            current_location=bindparam('b_location'),
+                            current_location_latitude=bindparam('b_lat'),
+                            current_location_longitude=bindparam('b_lng'),
+                            current_geohash=bindparam('b_cell'),
+                            updated_at=now,
+                            version=table.c.version + 1,
+                        ),
+                        [{'b_id': p['id'], 'b_status': p['status'],
+                          'b_location': p['current_location'],
+                          'b_lat': p['current_location_latitude'],
+                          'b_lng': p['current_location_longitude'],
+                          'b_cell': parcel_geohashes(p)['current_geohash']}
+                         for p in touched.values()]
+                    )
+                events = []
+                if history:
+                    history_table = ParcelHistory.__table__
+                    ids = db.session.execute(
+                        history_table.insert().returning(
+                            history_table.c.id, sort_by_parameter_order=True
+                        ),
+                        history
+                    ).scalars().all()
+                    events = [
+                        history_event(dict(row, id=history_id), parcels[row['parcel_id']]['user_id'])
+                        for row, history_id in zip(history, ids)
+                    ]
+
+                deltas = Counter()
+                stats = ParcelStat.deltas()
+                by_owner = defaultdict(list)
+                for parcel_id, parcel in touched.items():
+                    old, new = original_status[parcel_id] or 'pending', parcel['status'] or 'pending'
+                    if old != new:
+                        deltas[(parcel['user_id'], old)] -= 1
+                        deltas[(parcel['user_id'], new)] += 1
+                        ParcelStat.add(stats, dict(parcel, status=old), -1)
+                        ParcelStat.add(stats, parcel)
+                    by_owner[parcel['user_id']].append(
+                        {key: parcel[key] for key in ('id', 'status', 'current_location')}
+                    )
+                ParcelCount.apply_deltas(deltas)
+                ParcelStat.apply_deltas(stats)
+                notify_owner_digests(by_owner)
+                db.session.commit()
+                parcel_events.publish(events)
+            except Exception as e:
+                db.session.rollback()
+                current_app.logger.exception("Bulk hub scan failed: %s", e)
+                return {"error": "Scan failed", "detail": str(e)}, 500
+
+        results = []
+        for i in range(len(items)):
+            if i in applied:
+                parcel = parcels[applied[i]]
+                results.append({"index": i, "parcel_id": parcel['id'], "status": parcel['status'],
+                                "current_location": parcel['current_location']})
+            else:
+                message, code = errors[i]
+                results.append({"index": i, "error": message, "code": code})
+        status = 200 if not errors else 207 if applied else 400
+        return {"updated": len(applied), "failed": len(errors), "results": results}, status
+
+_HISTORY_COLUMNS = tuple(ParcelHistory.__table__.c[name] for name in HISTORY_FIELDS)
+_HISTORY_FILTER_PARAMS = [
+    {'name': 'update_type', 'in': 'query', 'required': False,
+     'schema': {'type': 'string', 'enum': ['status', 'location']}},
+    {'name': 'since', 'in': 'query', 'required': False,
+     'description': 'ISO timestamp, inclusive', 'schema': {'type': 'string', 'format': 'date-time'}},
+    {'name': 'until', 'in': 'query', 'required': False,
+     'description': 'ISO timestamp, exclusive', 'schema': {'type': 'string', 'format': 'date-time'}},
+    {'name': 'cursor', 'in': 'query', 'required': False, 'schema': {'type': 'string'}},
+    {'name': 'per_page', 'in': 'query', 'required': False, 'schema': {'type': 'integer'}},
+    {'name': 'order', 'in': 'query', 'required': False,
+     'schema': {'type': 'string', 'enum': ['asc', 'desc']}},
+]
+
+
+def history_row_to_dict(row):
+    """Serialize a ``_HISTORY_COLUMNS`` projection like ``ParcelHistory.to_dict``."""
+    data = row._asdict()
+    timestamp = data['timestamp']
+    data['timestamp'] = timestamp.strftime("%Y-%m-%d %H:%M:%S") if timestamp else None
+    return data
+
+
+def _int_arg(name):
+    value = request.args.get(name)
+    if value in (None, ''):
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f"{name} must be an integer") from None
+
+
+def _time_arg(name):
+    """Parse an ISO timestamp argument to the naive UTC the columns store."""
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        raise ValueError(f"{name} must be an ISO 8601 timestamp") from None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def _history_query(parcel_id=None):
+    """Projection query over parcel_histories narrowed by the request's filters.
+
+    Raises ValueError for a malformed filter.
+    """
+    query = db.session.query(*_HISTORY_COLUMNS)
+    if parcel_id is None:
+        parcel_id = _int_arg('parcel_id')
+    updated_by = _int_arg('updated_by')
+    update_type = request.args.get('update_type')
+    since, until = _time_arg('since'), _time_arg('until')
+
+    if parcel_id is not None:
+        query = query.filter(ParcelHistory.parcel_id == parcel_id)
+    if updated_by is not None:
+        query = query.filter(ParcelHistory.updated_by == updated_by)
+    if update_type:
+        query = query.filter(ParcelHistory.update_type == update_type)
+    if since is not None:
+        query = query.filter(ParcelHistory.timestamp >= since)
+    if until is not None:
+        query = query.filter(ParcelHistory.timestamp < until)
+    return query
+
+
+def _history_page(query, default_order):
+    """One keyset page of ``query`` on (timestamp, id) as a response body."""
+    order = request.args.get('order', default_order)
+    if order not in ('asc', 'desc'):
+        raise ValueError("order must be 'asc' or 'desc'")
+    per_page = _int_arg('per_page') or HISTORY_PAGE_SIZE
+    per_page = max(1, min(per_page, MAX_HISTORY_PAGE_SIZE))
+    rows, next_cursor = keyset_page(
+        query, ParcelHistory.timestamp, ParcelHistory.id,
+        request.args.get('cursor'), per_page, descending=order == 'desc'
+    )
+    charge_rows(len(rows))
+    return {
+        "histories": [history_row_to_dict(row) for row in rows],
+        "per_page": per_page,
+        "order": order,
+        "next_cursor": next_cursor,
+    }
+
+
 class ParcelHistoryList(Resource):
-    """Resource for listing all parcel histories (admin only)."""
+    """Resource for listing parcel histories (admin only)."""
 
     @swag_from({
         'tags': ['Admin'],
-        'summary': 'List all parcel histories',
-        'description': 'Returns a list of all parcel update history records.',
+        'summary': 'List parcel histories',
+        'description': 'Returns parcel update history records, optionally filtered by parcel, '
+                       'updater, update type and time range. Pass ?cursor= (empty for the first '
+                       'page) for keyset pages on (timestamp, id); without it every matching '
+                       'record is returned. Send Accept: application/x-ndjson or ?format=csv '
+                       'to stream the listing.',
         'security': [{'BearerAuth': []}],
+        'parameters': [
+            {
+                'name': 'format',
+                'in': 'query',
+                'required': False,
+                'schema': {'type': 'string', 'enum': ['json', 'ndjson', 'csv']}
+            },
+            {'name': 'parcel_id', 'in': 'query', 'required': False, 'schema': {'type': 'integer'}},
+            {'name': 'updated_by', 'in': 'query', 'required': False, 'schema': {'type': 'integer'}},
+        ] + _HISTORY_FILTER_PARAMS,
         'responses': {
-            200: {'description': 'List of parcel history records'},
+            200: {'description': 'List or page of parcel history records'},
+            400: {'description': 'Malformed filter or cursor'},
             403: {'description': 'Unauthorized (non-admin)'}
         }
     })
     @admin_required
     def get(self, current_user):
-        histories = ParcelHistory.query.all()
-        return jsonify([h.to_dict() for h in histories])
+        try:
+            query = _history_query()
+            if 'cursor' in request.args:
+                return _history_page(query, default_order='asc'), 200
+        except InvalidCursor:
+            return {"error": "Invalid cursor"}, 400
+        except ValueError as e:
+            return {"error": str(e)}, 400
+
+        query = query.order_by(ParcelHistory.timestamp, ParcelHistory.id)
+        fmt = requested_stream_format()
+        if fmt:
+            return stream_query(query, history_row_to_dict, HISTORY_FIELDS, fmt, 'parcel_histories')
+        rows = query.all()
+        charge_rows(len(rows))
+        return jsonify([history_row_to_dict(row) for row in rows])
 
 class ParcelHistoryDetail(Resource):
     """Resource for getting a specific parcel history (admin only)."""
@@ -236,7 +638,7 @@ class ParcelHistoryDetail(Resource):
         'parameters': [
             {
                 'in': 'path',
-                'name': 'history_id',
+                'name': 'id',
                 'required': True,
                 'schema': {'type': 'integer'}
             }
@@ -248,9 +650,518 @@ class ParcelHistoryDetail(Resource):
         }
     })
     @admin_required
-    def get(self, history_id, current_user):
-        history = ParcelHistory.query.get(history_id)
-        if not history:
+    def get(self, id, current_user):
+        row = db.session.query(*_HISTORY_COLUMNS).filter(ParcelHistory.id == id).first()
+        if row is None:
             return {"error": "History not found"}, 404
-        return jsonify(history.to_dict())
+        return jsonify(history_row_to_dict(row))
+
+class ParcelTimeline(Resource):
+    """Resource for one parcel's history, newest first (admin only)."""
+
+    @swag_from({
+        'tags': ['Admin'],
+        'summary': 'Parcel timeline',
+        'description': 'Keyset-paged history of one parcel, newest first by default. '
+                       'Follow next_cursor for older entries.',
+        'security': [{'BearerAuth': []}],
+        'parameters': [
+            {
+                'in': 'path',
+                'name': 'parcel_id',
+                'required': True,
+                'schema': {'type': 'integer'}
+            }
+        ] + _HISTORY_FILTER_PARAMS,
+        'responses': {
+            200: {'description': 'One page of the parcel timeline'},
+            400: {'description': 'Malformed filter or cursor'},
+            403: {'description': 'Unauthorized (non-admin)'},
+            404: {'description': 'Parcel not found'}
+        }
+    })
+    @admin_required
+    def get(self, parcel_id, current_user):
+        if db.session.query(Parcel.id).filter(Parcel.id == parcel_id).first() is None:
+            return {"error": "Parcel not found"}, 404
+        try:
+            page = _history_page(_history_query(parcel_id), default_order='desc')
+        except InvalidCursor:
+            return {"error": "Invalid cursor"}, 400
+        except ValueError as e:
+            return {"error": str(e)}, 400
+        return dict(page, parcel_id=parcel_id), 200
+
+
+def _float_arg(name, default=None):
+    value = request.args.get(name)
+    if value in (None, ''):
+        if default is None:
+            raise ValueError(f"{name} is required")
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        raise ValueError(f"{name} must be a number") from None
+
+
+def _spatial_query(field, south, west, north, east):
+    """Parcels whose ``field`` point lies in the box, pruned by geohash cell first.
+
+    The cover's prefix ranges are answered from the geohash index; the exact
+    latitude/longitude comparison then only sees rows from those cells.
+    Returns ``(query, lat_col, lng_col)``.
+    """
+    cell_col, lat_col, lng_col = SPATIAL_FIELDS[field]
+    status = request.args.get('status')
+    # The status test sits inside every range term so each one is a single
+    # (status, geohash) index range rather than a filter over all of a status.
+    terms = []
+    for low, high in geohash_ranges(geohash_cover(south, west, north, east)):
+        term = and_(cell_col >= low, cell_col < high)
+        terms.append(and_(Parcel.status == status, term) if status else term)
+    query = Parcel.query.filter(or_(*terms))
+    query = query.filter(lat_col.between(south, north))
+    if west <= east:
+        query = query.filter(lng_col.between(west, east))
+    else:
+        query = query.filter(or_(lng_col >= west, lng_col <= east))
+    return query, lat_col, lng_col
+
+
+def _spatial_args(default_field):
+    field = request.args.get('field', default_field)
+    if field not in SPATIAL_FIELDS:
+        raise ValueError(f"field must be one of {', '.join(SPATIAL_FIELDS)}")
+    limit = _int_arg('limit') or SPATIAL_LIMIT
+    return field, max(1, min(limit, MAX_SPATIAL_LIMIT))
+
+
+_SPATIAL_PARAMS = [
+    {'name': 'field', 'in': 'query', 'required': False,
+     'schema': {'type': 'string', 'enum': ['pickup', 'current']}},
+    {'name': 'status', 'in': 'query', 'required': False, 'schema': {'type': 'string'}},
+    {'name': 'limit', 'in': 'query', 'required': False, 'schema': {'type': 'integer'}},
+]
+
+
+class AdminParcelsNearby(Resource):
+    """Parcels within a radius of a point, nearest first (admin only)."""
+
+    @swag_from({
+        'tags': ['Admin'],
+        'summary': 'Parcels near a point',
+        'description': 'Parcels whose pickup (default) or current coordinates lie within '
+                       'radius_m metres of lat/lng, nearest first, e.g. pending pickups '
+                       'around a courier: ?lat=..&lng=..&radius_m=3000&status=pending.',
+        'security': [{'BearerAuth': []}],
+        'parameters': [
+            {'name': 'lat', 'in': 'query', 'required': True, 'schema': {'type': 'number'}},
+            {'name': 'lng', 'in': 'query', 'required': True, 'schema': {'type': 'number'}},
+            {'name': 'radius_m', 'in': 'query', 'required': False,
+             'schema': {'type': 'number', 'default': 3000}},
+        ] + _SPATIAL_PARAMS,
+        'responses': {
+            200: {'description': 'Matching parcels with distance_m'},
+            400: {'description': 'Missing or malformed coordinates'},
+            403: {'description': 'Unauthorized (non-admin)'}
+        }
+    })
+    @admin_required
+    def get(self, current_user):
+        try:
+            lat, lng = _float_arg('lat'), _float_arg('lng')
+            radius = _float_arg('radius_m', 3000.0)
+            field, limit = _spatial_args('pickup')
+        except ValueError as e:
+            return {"error": str(e)}, 400
+        if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+            return {"error": "lat/lng out of range"}, 400
+        if not 0 < radius <= MAX_RADIUS_M:
+            return {"error": f"radius_m must be between 0 and {MAX_RADIUS_M}"}, 400
+
+        query, lat_col, lng_col = _spatial_query(field, *bbox_around(lat, lng, radius))
+        # Rank on a narrow projection, then load full rows for the page only.
+        candidates = query.with_entities(Parcel.id, lat_col, lng_col)
+        origin = (lat, lng)
+        ranked = sorted(
+            (distance, parcel_id) for parcel_id, distance in (
+                (row[0], haversine_m(origin, (row[1], row[2]))) for row in candidates
+            ) if distance <= radius
+        )
+        page = ranked[:limit]
+        charge_rows(len(page))
+        parcels = {p.id: p for p in Parcel.query.filter(Parcel.id.in_([pid for _, pid in page]))}
+        return {
+            "parcels": [dict(parcels[pid].to_dict(), distance_m=round(d, 1)) for d, pid in page],
+            "total": len(ranked),
+        }, 200
+
+
+class AdminParcelsWithin(Resource):
+    """Parcels inside a bounding box (admin only)."""
+
+    @swag_from({
+        'tags': ['Admin'],
+        'summary': 'Parcels in a bounding box',
+        'description': 'Parcels whose current (default) or pickup coordinates lie inside '
+                       'south/west/north/east. west > east crosses the antimeridian.',
+        'security': [{'BearerAuth': []}],
+        'parameters': [
+            {'name': edge, 'in': 'query', 'required': True, 'schema': {'type': 'number'}}
+            for edge in ('south', 'west', 'north', 'east')
+        ] + _SPATIAL_PARAMS,
+        'responses': {
+            200: {'description': 'Matching parcels'},
+            400: {'description': 'Missing or malformed box'},
+            403: {'description': 'Unauthorized (non-admin)'}
+        }
+    })
+    @admin_required
+    def get(self, current_user):
+        try:
+            south, west, north, east = (_float_arg(edge) for edge in ('south', 'west', 'north', 'east'))
+            field, limit = _spatial_args('current')
+        except ValueError as e:
+            return {"error": str(e)}, 400
+        if not (-90 <= south <= north <= 90 and -180 <= west <= 180 and -180 <= east <= 180):
+            return {"error": "Invalid bounding box"}, 400
+
+        query, _, _ = _spatial_query(field, south, west, north, east)
+        parcels = query.order_by(Parcel.id).limit(limit + 1).all()
+        charge_rows(min(len(parcels), limit))
+        return {
+            "parcels": [p.to_dict() for p in parcels[:limit]],
+            "truncated": len(parcels) > limit,
+        }, 200
+
+
+def _read_couriers(raw):
+    """Validate the request's courier list into ``Courier`` tuples; raises ValueError."""
+    if not isinstance(raw, list) or not raw:
+        raise ValueError("couriers must be a non-empty list")
+    couriers, seen = [], set()
+    for i, item in enumerate(raw):
+        if not isinstance(item, dict):
+            raise ValueError(f"couriers[{i}] must be an object")
+        courier_id, capacity = item.get('id'), item.get('capacity_kg')
+        if isinstance(courier_id, bool) or not isinstance(courier_id, int):
+            raise ValueError(f"couriers[{i}].id must be an integer")
+        if courier_id in seen:
+            raise ValueError(f"Duplicate courier id {courier_id}")
+        seen.add(courier_id)
+        try:
+            lat, lng = float(item['lat']), float(item['lng'])
+            capacity = None if capacity is None else float(capacity)
+        except (KeyError, TypeError, ValueError):
+            raise ValueError(f"couriers[{i}] needs numeric lat, lng and capacity_kg") from None
+        if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+            raise ValueError(f"couriers[{i}] lat/lng out of range")
+        couriers.append(Courier(courier_id, lat, lng, capacity))
+    return couriers
+
+
+class AdminParcelAssign(Resource):
+    """Assign pending parcels to couriers in one batch (admin only)."""
+
+    @swag_from({
+        'tags': ['Admin'],
+        'summary': 'Batch courier assignment',
+        'description': 'Assigns every pending, unassigned parcel with pickup coordinates (or '
+                       'only parcel_ids) to the given couriers, keeping each courier within '
+                       'capacity_kg and the total courier-to-pickup distance low. dry_run '
+                       'returns the plan without writing it.',
+        'security': [{'BearerAuth': []}],
+        'requestBody': {
+            'required': True,
+            'content': {
+                'application/json': {
+                    'schema': {
+                        'type': 'object',
+                        'properties': {
+                            'couriers': {
+                                'type': 'array',
+                                'items': {
+                                    'type': 'object',
+                                    'properties': {
+                                        'id': {'type': 'integer', 'example': 7},
+                                        'lat': {'type': 'number', 'example': -1.2864},
+                                        'lng': {'type': 'number', 'example': 36.8172},
+                                        'capacity_kg': {'type': 'number', 'example': 120}
+                                    },
+                                    'required': ['id', 'lat', 'lng']
+                                }
+                            },
+                            'parcel_ids': {'type': 'array', 'items': {'type': 'integer'}},
+                            'max_distance_m': {'type': 'number', 'example': 15000},
+                            'workers': {'type': 'integer', 'example': 4},
+                            'dry_run': {'type': 'boolean'}
+                        },
+                        'required': ['couriers']
+                    }
+                }
+            }
+        },
+        'responses': {
+            200: {'description': 'Assignment plan (written unless dry_run)'},
+            400: {'description': 'Malformed couriers or options'},
+            403: {'description': 'Unauthorized (non-admin)'}
+        }
+    })
+    @admin_required
+    def post(self, current_user):
+        """Solve the assignment, then write it with one UPDATE and one history INSERT."""
+        data = request.get_json(silent=True) or {}
+        parcel_ids = data.get('parcel_ids')
+        max_distance = data.get('max_distance_m')
+        workers = data.get('workers', 1)
+        dry_run = bool(data.get('dry_run'))
+        try:
+            couriers = _read_couriers(data.get('couriers'))
+            if parcel_ids is not None and not (
+                isinstance(parcel_ids, list)
+                and all(isinstance(i, int) and not isinstance(i, bool) for i in parcel_ids)
+            ):
+                raise ValueError("parcel_ids must be a list of integers")
+            if max_distance is not None:
+                max_distance = float(max_distance)
+            workers = max(1, min(int(workers), MAX_ASSIGNMENT_WORKERS))
+        except (TypeError, ValueError) as e:
+            return {"error": str(e)}, 400
+
+        table = Parcel.__table__
+        query = select(
+            table.c.id, table.c.user_id, table.c.pick_up_latitude,
+            table.c.pick_up_longitude, table.c.weight
+        ).where(
+            table.c.status == 'pending', table.c.courier_id.is_(None),
+            table.c.pick_up_latitude.is_not(None), table.c.pick_up_longitude.is_not(None)
+        ).order_by(table.c.id)
+        if parcel_ids is not None:
+            query = query.where(table.c.id.in_(parcel_ids))
+        if not dry_run:
+            query = query.with_for_update()
+        rows = db.session.execute(query).all()
+        charge_rows(len(rows))
+        owners = {row.id: row.user_id for row in rows}
+
+        result = assign_couriers(
+            (Job(row.id, row.pick_up_latitude, row.pick_up_longitude, row.weight) for row in rows),
+            couriers, max_distance_m=max_distance, workers=workers,
+            improve_seconds=current_app.config.get('ASSIGNMENT_IMPROVE_SECONDS', 2.0),
+        )
+
+        events = []
+        if not dry_run and result.assignments:
+            try:
+                now = utcnow()
+                db.session.execute(
+                    table.update().where(table.c.id == bindparam('b_id'))
+                    .values(courier_id=bindparam('b_courier'), updated_at=now,
+                            version=table.c.version + 1),
+                    [{'b_id': pid, 'b_courier': cid} for pid, (cid, _) in result.assignments.items()]
+                )
+                history = [
+                    dict(parcel_id=pid, updated_by=current_user.id, update_type="courier",
+                         old_value=None, new_value=str(cid), timestamp=now)
+                    for pid, (cid, _) in result.assignments.items()
+                ]
+                history_table = ParcelHistory.__table__
+                ids = db.session.execute(
+                    history_table.insert().returning(history_table.c.id, sort_by_parameter_order=True),
+                    history
+                ).scalars().all()
+                events = [
+                    history_event(dict(row, id=history_id), owners[row['parcel_id']])
+                    for row, history_id in zip(history, ids)
+                ]
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                current_app.logger.exception("Courier assignment failed: %s", e)
+                return {"error": "Assignment failed", "detail": str(e)}, 500
+            parcel_events.publish(events)
+        else:
+            db.session.rollback()
+
+        return {
+            "dry_run": dry_run,
+            "assigned": len(result.assignments),
+            "unassigned": result.unassigned,
+            "total_distance_m": round(result.total_distance_m, 1),
+            "assignments": [
+                {"parcel_id": pid, "courier_id": cid, "distance_m": round(d, 1)}
+                for pid, (cid, d) in result.assignments.items()
+            ],
+        }, 200
+
+
+class CourierRoute(Resource):
+    """Ordered stop list for one courier's open parcels (admin only)."""
 
+    @swag_from({
+        'tags': ['Admin'],
+        'summary': 'Courier route plan',
+        'description': 'Orders the pickups and deliveries of every open parcel assigned to '
+                       'the courier, each pickup before its delivery, starting from lat/lng '
+                       'when given. Plans are cached until one of the parcels changes.',
+        'security': [{'BearerAuth': []}],
+        'parameters': [
+            {'name': 'courier_id', 'in': 'path', 'required': True, 'schema': {'type': 'integer'}},
+            {'name': 'lat', 'in': 'query', 'required': False, 'schema': {'type': 'number'}},
+            {'name': 'lng', 'in': 'query', 'required': False, 'schema': {'type': 'number'}},
+        ],
+        'responses': {
+            200: {'description': 'Stops in driving order with leg and total metrics'},
+            400: {'description': 'Malformed start point or too many stops'},
+            403: {'description': 'Unauthorized (non-admin)'}
+        }
+    })
+    @admin_required
+    def get(self, courier_id, current_user):
+        start = None
+        try:
+            if request.args.get('lat') or request.args.get('lng'):
+                start = (_float_arg('lat'), _float_arg('lng'))
+        except ValueError as e:
+            return {"error": str(e)}, 400
+        if start is not None and not (-90 <= start[0] <= 90 and -180 <= start[1] <= 180):
+            return {"error": "lat/lng out of range"}, 400
+
+        table = Parcel.__table__
+        rows = db.session.execute(
+            select(
+                table.c.id, table.c.status, table.c.updated_at,
+                table.c.pick_up_latitude, table.c.pick_up_longitude,
+                table.c.destination_latitude, table.c.destination_longitude,
+            ).where(table.c.courier_id == courier_id, table.c.status.not_in(CLOSED_STATUSES))
+        ).all()
+        stops, skipped = manifest_stops(rows)
+        max_stops = current_app.config.get('ROUTE_MAX_STOPS', MAX_ROUTE_STOPS)
+        if len(stops) > max_stops:
+            return {"error": f"Manifest has {len(stops)} stops; the limit is {max_stops}"}, 400
+
+        key = plan_key(courier_id, start, rows)
+        plan = plan_cache.get(key)
+        cached = plan is not None
+        if not cached:
+            plan = plan_route(
+                stops, start, router=get_router(),
+                improve_seconds=current_app.config.get('ROUTE_IMPROVE_SECONDS', 0.5),
+            )
+            plan_cache.set(key, plan, time.time() + current_app.config.get('ROUTE_PLAN_TTL', PLAN_TTL))
+
+        return {
+            "courier_id": courier_id,
+            "cached": cached,
+            "skipped": skipped,
+            "total_distance_m": round(plan.distance_m),
+            "total_duration_s": round(plan.duration_s),
+            "stops": [
+                {
+                    "sequence": n, "parcel_id": stop.parcel_id, "kind": stop.kind,
+                    "lat": stop.lat, "lng": stop.lng,
+                    "leg_distance_m": round(distance), "leg_duration_s": round(duration),
+                }
+                for n, (stop, (distance, duration)) in enumerate(zip(plan.stops, plan.legs), 1)
+            ],
+        }, 200
+
+
+def _date_arg(name, default):
+    value = request.args.get(name)
+    if not value:
+        return default
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"{name} must be a YYYY-MM-DD date") from None
+
+
+def _stat_dict(count, cost, weight):
+    return {"count": int(count), "revenue": round(cost or 0.0, 2), "weight_kg": round(weight or 0.0, 3)}
+
+
+def _stat_totals(rows):
+    """Fold ``(status, count, cost, weight)`` rows into overall and per-status totals."""
+    count = cost = weight = 0
+    by_status = {}
+    for status, n, status_cost, status_weight in rows:
+        if not n:
+            continue
+        by_status[status] = _stat_dict(n, status_cost, status_weight)
+        count += n
+        cost += status_cost or 0.0
+        weight += status_weight or 0.0
+    return dict(_stat_dict(count, cost, weight), by_status=by_status)
+
+
+class AdminStats(Resource):
+    """Dashboard aggregates from the parcel_stats rollup (admin only)."""
+
+    @swag_from({
+        'tags': ['Admin'],
+        'summary': 'Dashboard statistics',
+        'description': 'Parcel count, revenue and weight overall and per status, plus a per-day '
+                       'breakdown by creation date for since..until (default: the last 30 days). '
+                       'Read from a rollup table, so the cost does not grow with parcel volume.',
+        'security': [{'BearerAuth': []}],
+        'parameters': [
+            {'name': 'since', 'in': 'query', 'required': False,
+             'schema': {'type': 'string', 'format': 'date'}},
+            {'name': 'until', 'in': 'query', 'required': False,
+             'schema': {'type': 'string', 'format': 'date'}},
+        ],
+        'responses': {
+            200: {'description': 'Totals, per-status and per-day breakdowns'},
+            400: {'description': 'Malformed or too wide date range'},
+            403: {'description': 'Unauthorized (non-admin)'}
+        }
+    })
+    @admin_required
+    def get(self, current_user):
+        try:
+            until = _date_arg('until', utcnow().date())
+            since = _date_arg('since', until - timedelta(days=STATS_DAYS - 1))
+        except ValueError as e:
+            return {"error": str(e)}, 400
+        if not timedelta(0) <= until - since < timedelta(days=MAX_STATS_DAYS):
+            return {"error": f"since..until must span 1 to {MAX_STATS_DAYS} days"}, 400
+
+        columns = (ParcelStat.status, func.sum(ParcelStat.count),
+                   func.sum(ParcelStat.cost_total), func.sum(ParcelStat.weight_total))
+        overall = db.session.query(*columns).group_by(ParcelStat.status).all()
+
+        days = defaultdict(list)
+        for row in (db.session.query(ParcelStat.day, *columns[1:], ParcelStat.status)
+                    .filter(ParcelStat.day.between(since, until))
+                    .group_by(ParcelStat.day, ParcelStat.status)):
+            days[row[0]].append((row[4], row[1], row[2], row[3]))
+
+        return {
+            "since": since.isoformat(),
+            "until": until.isoformat(),
+            "totals": _stat_totals(overall),
+            "by_day": [
+                dict(_stat_totals(days[day]), day=day.isoformat()) for day in sorted(days)
+            ],
+        }, 200
+
+
+class MapsCacheStats(Resource):
+    """Resource exposing MapsService cache hit rates (admin only)."""
+
+    @swag_from({
+        'tags': ['Admin'],
+        'summary': 'Maps cache statistics',
+        'description': 'Hit/miss counters for the geocode and route-metrics cache of this worker.',
+        'security': [{'BearerAuth': []}],
+        'responses': {
+            200: {'description': 'Cache counters and hit rate'},
+            403: {'description': 'Unauthorized (non-admin)'}
+        }
+    })
+    @admin_required
+    def get(self, current_user):
+        from server.services.maps_service import maps_cache
+        return maps_cache.stats(), 200
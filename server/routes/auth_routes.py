@@ -3,12 +3,19 @@
 from flask import request, jsonify
 from flask_restful import Resource
 from flask_jwt_extended import create_access_token
+from sqlalchemy import or_
+from server.authorization import token_claims
+from server.config import db
 from server.models import User
+from server.ratelimit import route_limit
+from server.services.passwords import HasherBusy
 from flasgger import swag_from
 
 class Login(Resource):
     """Login resource for user authentication."""
 
+    decorators = [route_limit('login')]
+
     @swag_from({
         'tags': ['Auth'],
         'summary': 'User login',
@@ -44,7 +51,8 @@ class Login(Resource):
                 }
             },
             400: {'description': 'Missing credentials'},
-            401: {'description': 'Unauthorized'}
+            401: {'description': 'Unauthorized'},
+            503: {'description': 'Password hashing queue full; retry after Retry-After'}
         }
     })
     def post(self):
@@ -56,12 +64,19 @@ class Login(Resource):
         if not identifier  or not password:
             return {'error': 'Missing credentials'}, 400
 
-        user = User.query.filter_by(username=identifier ).first()
-        if not user:
-            user = User.query.filter_by(email=identifier).first()
+        # One lookup on the unique username/email indexes; a username match wins.
+        matches = User.query.filter(or_(User.username == identifier, User.email == identifier)).all()
+        user = next((u for u in matches if u.username == identifier), matches[0] if matches else None)
+
+        try:
+            authenticated = user is not None and user.authenticate(password)
+        except HasherBusy:
+            return {'error': 'Too many logins in progress, retry shortly'}, 503, {'Retry-After': '1'}
 
-        if user and user.authenticate(password):
-            access_token = create_access_token(identity=user.id)
+        if authenticated:
+            if db.session.is_modified(user):
+                db.session.commit()  # the password was re-hashed at the current work factor
+            access_token = create_access_token(identity=user.id, additional_claims=token_claims(user))
             return {
                 "user": user.to_dict(),
                 "access_token": access_token
@@ -7,6 +7,10 @@ from flask_limiter import Limiter
 from flasgger import swag_from
 from server.models import User, Parcel
 from server.services.sendgrid_service import SendGridService
+from server.services.email_service import (
+    send_location_update_email, send_parcel_cancelled_email,
+    send_password_reset_email, send_welcome_email
+)
 
 # Initialize SendGrid service
 sendgrid_service = SendGridService()
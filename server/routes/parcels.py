@@ -1,57 +1,140 @@
 """Parcel routes for Deliveroo app."""
 import traceback
+from collections import Counter
 from flask import request, current_app
 from flask_restful import Resource
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from server.models import Parcel, User
-from server.config import db
+from sqlalchemy import or_
+from sqlalchemy.exc import SQLAlchemyError
+from server.authorization import is_admin
+from server.events import history_event, history_events
+from server.models import Parcel, ParcelCount, ParcelHistory, ParcelStat, parcel_geohashes, utcnow
+from server.conditional import (
+    collection_etag, is_fresh, not_modified, parcel_etag, parcel_version, validator_headers
+)
+from server.config import db, parcel_events
+from server.pagination import InvalidCursor, keyset_page
+from server.quotas import charge_items, charge_rows
+from server.ratelimit import route_limit
+from server.serializers import loads
+from server.services.email_service import (
+    notify_owner_digest, notify_parcel_owner, send_parcel_cancelled_email, send_parcel_created_email
+)
+from server.services.routing import get_router
+from server.streaming import NDJSON_MIMETYPE, sse_response
+
+MAX_CURSOR_PAGE_SIZE = 100
+# Missed events sent on one SSE reconnect; the client comes back for the rest.
+SSE_REPLAY_LIMIT = 1000
+# EventSource cannot set headers, so the tracking streams also take ?jwt=<token>.
+SSE_TOKEN_LOCATIONS = ['headers', 'query_string']
+
+REQUIRED_FIELDS = ('pickup_location_text', 'destination_location_text')
+NDJSON_MIMETYPES = (NDJSON_MIMETYPE, 'application/jsonl')
+# Fields a bulk item may set; id, owner, timestamps, version and geohashes are assigned here.
+BULK_COLUMNS = tuple(
+    c.name for c in Parcel.__table__.columns
+    if c.name not in ('id', 'user_id', 'created_at', 'updated_at', 'version',
+                      'pickup_geohash', 'current_geohash')
+)
+_BULK_COLUMN_SET = frozenset(BULK_COLUMNS)
+_TEXT_LIMITS = {
+    c.name: c.type.length for c in Parcel.__table__.columns
+    if c.name in _BULK_COLUMN_SET and getattr(c.type, 'length', None)
+}
+
+
+_PAYLOAD_ALIASES = {
+    "pickup_longitude": "pick_up_longitude",
+    "pickup_latitude": "pick_up_latitude",
+    "pickupLocationText": "pickup_location_text",
+    "destinationLocationText": "destination_location_text",
+    "receiver_name": "recipient_name",
+    "receiverPhone": "recipient_phone_number",
+    "receiver_phone": "recipient_phone_number",
+    "senderPhone": "sender_phone_number",
+    "sender_phone": "sender_phone_number",
+}
+_FLOAT_FIELDS = frozenset([
+    "weight", "pick_up_longitude", "pick_up_latitude",
+    "destination_longitude", "destination_latitude",
+    "current_location_longitude", "current_location_latitude",
+    "distance", "cost",
+])
+_TEXT_FIELDS = frozenset([
+    "pickup_location_text", "destination_location_text",
+    "sender_name", "sender_phone_number",
+    "recipient_name", "recipient_phone_number",
+    "description", "current_location", "status",
+])
+_ALIAS_KEYS = frozenset(_PAYLOAD_ALIASES)
+
+
+def _to_float(x):
+    try:
+        return float(x) if x is not None and x != "" else None
+    except Exception:
+        return None
 
 
 def _normalize_parcel_payload(raw: dict) -> dict:
     """Map frontend keys to Parcel model fields, coerce types."""
-    data = dict(raw or {})
-
-    aliases = {
-        "pickup_longitude": "pick_up_longitude",
-        "pickup_latitude": "pick_up_latitude",
-        "pickupLocationText": "pickup_location_text",
-        "destinationLocationText": "destination_location_text",
-        "receiver_name": "recipient_name",
-        "receiverPhone": "recipient_phone_number",
-        "receiver_phone": "recipient_phone_number",
-        "senderPhone": "sender_phone_number",
-        "sender_phone": "sender_phone_number",
-    }
-
-    for k_src, k_dst in aliases.items():
-        if k_src in data and k_dst not in data:
-            data[k_dst] = data.pop(k_src)
-
-    def _to_float(x):
-        try:
-            return float(x) if x is not None and x != "" else None
-        except Exception:
-            return None
-
-    for key in [
-        "weight", "pick_up_longitude", "pick_up_latitude",
-        "destination_longitude", "destination_latitude",
-        "current_location_longitude", "current_location_latitude",
-        "distance", "cost",
-    ]:
-        if key in data:
+    return _normalize_parcel_payloads([raw])[0]
+
+
+def _normalize_parcel_payloads(raws) -> list:
+    """Batch form of ``_normalize_parcel_payload``.
+
+    The alias and type tables are module constants, and each row only
+    visits the keys it actually has (set intersections instead of probing
+    every known field), so a large batch costs little more than copying it.
+    """
+    aliases, floats, texts = _PAYLOAD_ALIASES, _FLOAT_FIELDS, _TEXT_FIELDS
+    rows = []
+    for raw in raws:
+        data = dict(raw or {})
+        keys = data.keys()
+
+        if not keys.isdisjoint(_ALIAS_KEYS):
+            for k_src, k_dst in aliases.items():
+                if k_src in data and k_dst not in data:
+                    data[k_dst] = data.pop(k_src)
+
+        for key in keys & floats:
             data[key] = _to_float(data[key])
 
-    for key in [
-        "pickup_location_text", "destination_location_text",
-        "sender_name", "sender_phone_number",
-        "recipient_name", "recipient_phone_number",
-        "description", "current_location", "status",
-    ]:
-        if key in data and isinstance(data[key], str):
-            data[key] = data[key].strip()
+        for key in keys & texts:
+            value = data[key]
+            if isinstance(value, str):
+                data[key] = value.strip()
+
+        rows.append(data)
+    return rows
 
-    return data
+
+def _route_endpoints(data):
+    """Origin/destination for routing: coordinates when present, else the address text."""
+    def point(lat_key, lng_key, text_key):
+        if data.get(lat_key) is not None and data.get(lng_key) is not None:
+            return data[lat_key], data[lng_key]
+        return data.get(text_key)
+
+    return (
+        point("pick_up_latitude", "pick_up_longitude", "pickup_location_text"),
+        point("destination_latitude", "destination_longitude", "destination_location_text"),
+    )
+
+
+def _estimate_route(data):
+    """RouteEstimate for a normalized payload, or None if nothing can answer.
+
+    Goes through the shared Router, so a slow or failing Maps upstream costs
+    at most one deadline before the offline estimate is used.
+    """
+    origin, destination = _route_endpoints(data)
+    if not origin or not destination:
+        return None
+    return get_router().route(origin, destination)
 
 
 class ParcelList(Resource):
@@ -59,38 +142,99 @@ class ParcelList(Resource):
 
     @jwt_required()
     def get(self):
-        user_id = get_jwt_identity()
-        user = User.query.get(user_id)
-        page = int(request.args.get('page', 1))
-        per_page = int(request.args.get('per_page', 10))
+        """List parcels.
 
-        query = Parcel.query if user and user.admin else Parcel.query.filter_by(user_id=user_id)
+        Two paging modes are supported:
 
-        parcels = query.offset((page - 1) * per_page).limit(per_page).all()
-        total = query.count()
+        * ``?cursor=<token>&per_page=N`` -- keyset pagination ordered by
+          ``(created_at, id)``. Pass an empty ``cursor`` for the first page and
+          the returned ``next_cursor`` for the following ones. Cost per page is
+          constant no matter how deep the client pages.
+        * ``?page=N&per_page=N`` -- legacy offset pagination.
 
-        return {
-            "parcels": [p.to_dict() for p in parcels],
-            "page": page,
-            "per_page": per_page,
-            "total": total
-        }, 200
+        ``total`` comes from the cached per-user/per-status counters; send
+        ``include_total=false`` to skip it entirely. ``status`` narrows both the
+        listing and the total.
+
+        Responses carry a collection ETag; polling with ``If-None-Match``
+        gets an empty 304 until one of the caller's parcels changes.
+        """
+        user_id = get_jwt_identity()
+        admin = is_admin()
+        status = request.args.get('status')
+        include_total = request.args.get('include_total', 'true').lower() != 'false'
+
+        try:
+            per_page = int(request.args.get('per_page', 10))
+        except ValueError:
+            return {"error": "per_page must be an integer"}, 400
+
+        etag = collection_etag(None if admin else user_id)
+        if is_fresh(etag):
+            return not_modified(etag)
+
+        query = Parcel.query if admin else Parcel.query.filter_by(user_id=user_id)
+        if status == 'pending':  # the cached totals count NULL statuses as pending
+            query = query.filter(or_(Parcel.status == status, Parcel.status.is_(None)))
+        elif status:
+            query = query.filter_by(status=status)
+
+        if 'cursor' in request.args:
+            per_page = max(1, min(per_page, MAX_CURSOR_PAGE_SIZE))
+            try:
+                parcels, next_cursor = keyset_page(
+                    query, Parcel.created_at, Parcel.id,
+                    request.args.get('cursor'), per_page
+                )
+            except InvalidCursor:
+                return {"error": "Invalid cursor"}, 400
+            result = {
+                "parcels": [p.to_dict() for p in parcels],
+                "per_page": per_page,
+                "next_cursor": next_cursor,
+            }
+        else:
+            try:
+                page = int(request.args.get('page', 1))
+            except ValueError:
+                return {"error": "page must be an integer"}, 400
+            parcels = (
+                query.order_by(Parcel.created_at, Parcel.id)
+                .offset((page - 1) * per_page).limit(per_page).all()
+            )
+            result = {
+                "parcels": [p.to_dict() for p in parcels],
+                "page": page,
+                "per_page": per_page,
+            }
+
+        charge_rows(len(parcels))
+        if include_total:
+            result["total"] = ParcelCount.total(
+                user_id=None if admin else user_id, status=status or None
+            )
+        return result, 200, validator_headers(etag)
 
     @jwt_required()
     def post(self):
         current_user_id = get_jwt_identity()
         raw = request.get_json(silent=True) or {}
 
-        required_fields = ['pickup_location_text', 'destination_location_text']
         data = _normalize_parcel_payload(raw)
 
         # Remove any user-supplied user_id to prevent spoofing
         data.pop("user_id", None)
 
-        for field in required_fields:
+        for field in REQUIRED_FIELDS:
             if not data.get(field):
                 return {"error": f"Missing required field: {field}"}, 400
 
+        if data.get("distance") is None:
+            estimate = _estimate_route(data)
+            if estimate is not None:
+                # Parcel.distance is stored in kilometres.
+                data["distance"] = round(estimate.distance_m / 1000, 2)
+
         try:
             if data.get("cost") is None:
                 weight = data.get("weight")
@@ -99,6 +243,8 @@ class ParcelList(Resource):
 
             parcel = Parcel(**data, user_id=current_user_id)
             db.session.add(parcel)
+            db.session.flush()
+            notify_parcel_owner(parcel, send_parcel_created_email)
             db.session.commit()
 
             return parcel.to_dict(), 201
@@ -112,11 +258,229 @@ class ParcelList(Resource):
             return {"error": "Parcel creation failed", "detail": str(e)}, 500
 
 
+def _read_bulk_items(max_items):
+    """Parse the bulk body into ``(items, errors)``.
+
+    Accepts a JSON array, ``{"parcels": [...]}`` or NDJSON (one object per
+    line, read from the request stream). A line that is not valid JSON
+    becomes an ``errors[index]`` entry instead of failing the request.
+    Raises ValueError for an unusable body.
+    """
+    items, errors = [], {}
+    if request.mimetype in NDJSON_MIMETYPES:
+        for line in request.stream:
+            if not line.strip():
+                continue
+            if len(items) >= max_items:
+                raise ValueError(f"At most {max_items} parcels per request")
+            try:
+                items.append(loads(line))
+            except ValueError as e:
+                errors[len(items)] = f"Invalid JSON: {e}"
+                items.append(None)
+        return items, errors
+
+    try:
+        body = loads(request.get_data() or b'null')
+    except ValueError as e:
+        raise ValueError(f"Invalid JSON: {e}") from e
+    if isinstance(body, dict):
+        body = body.get('parcels')
+    if not isinstance(body, list):
+        raise ValueError("Expected a JSON array of parcels or NDJSON")
+    if len(body) > max_items:
+        raise ValueError(f"At most {max_items} parcels per request")
+    return body, errors
+
+
+def _validate_bulk_items(items, errors):
+    """Normalize and validate items; returns ``(rows, indexes)`` of the valid ones."""
+    objects = []
+    for i, item in enumerate(items):
+        if i in errors:
+            continue
+        if isinstance(item, dict):
+            objects.append(i)
+        else:
+            errors[i] = "Each parcel must be a JSON object"
+
+    rows, indexes = [], []
+    normalized = _normalize_parcel_payloads(items[i] for i in objects)
+    for i, data in zip(objects, normalized):
+        data.pop("user_id", None)
+
+        missing = [f for f in REQUIRED_FIELDS if not data.get(f)]
+        if missing:
+            errors[i] = f"Missing required field: {missing[0]}"
+            continue
+        unknown = data.keys() - _BULK_COLUMN_SET
+        if unknown:
+            errors[i] = f"Unknown field(s): {', '.join(sorted(unknown))}"
+            continue
+        bad_text = [k for k in data.keys() & _TEXT_FIELDS
+                    if data[k] is not None and not isinstance(data[k], str)]
+        if bad_text:
+            errors[i] = f"Field must be a string: {sorted(bad_text)[0]}"
+            continue
+        too_long = [k for k in data.keys() & _TEXT_LIMITS.keys()
+                    if data[k] is not None and len(data[k]) > _TEXT_LIMITS[k]]
+        if too_long:
+            key = sorted(too_long)[0]
+            errors[i] = f"Field too long: {key} (max {_TEXT_LIMITS[key]} characters)"
+            continue
+
+        rows.append(data)
+        indexes.append(i)
+    return rows, indexes
+
+
+def _price_bulk_rows(rows):
+    """Fill distance (one batched routing call) and cost, as ``POST /parcels`` does."""
+    unrouted = [row for row in rows if row.get("distance") is None]
+    endpoints = [_route_endpoints(row) for row in unrouted]
+    routable = [(row, pair) for row, pair in zip(unrouted, endpoints) if pair[0] and pair[1]]
+    if routable:
+        estimates = get_router().route_many(pair for _, pair in routable)
+        for (row, _), estimate in zip(routable, estimates):
+            if estimate is not None:
+                row["distance"] = round(estimate.distance_m / 1000, 2)
+
+    for row in rows:
+        if row.get("cost") is None:
+            weight = row.get("weight")
+            if isinstance(weight, (int, float)):
+                row["cost"] = weight * 150
+
+
+def _insert_parcel_rows(rows, chunk_size):
+    """Insert ``rows`` with multi-row INSERT ... RETURNING, ``chunk_size`` at a time.
+
+    Returns ids aligned with ``rows``. Each chunk runs in a savepoint; if the
+    database rejects one, its rows are retried one by one so only the bad
+    ones fail (they come back as the exception instead of an id).
+    """
+    table = Parcel.__table__
+    stmt = table.insert().returning(table.c.id, sort_by_parameter_order=True)
+    ids = []
+    for start in range(0, len(rows), chunk_size):
+        chunk = rows[start:start + chunk_size]
+        try:
+            with db.session.begin_nested():
+                ids.extend(db.session.execute(stmt, chunk).scalars().all())
+        except SQLAlchemyError:
+            for row in chunk:
+                try:
+                    with db.session.begin_nested():
+                        ids.append(db.session.execute(stmt, row).scalar_one())
+                except SQLAlchemyError as e:
+                    ids.append(e)
+    return ids
+
+
+class ParcelBulk(Resource):
+    """Create many parcels in one request and one transaction."""
+
+    decorators = [route_limit('parcelbulk')]
+
+    @jwt_required()
+    def post(self):
+        """Create parcels from a JSON array or an NDJSON body.
+
+        Items are normalized, validated and priced like ``POST /parcels``,
+        inserted in chunked multi-row statements and committed together.
+        Invalid items are reported by index without stopping the rest:
+        201 when every item was created, 207 when some were, 400 when none.
+        """
+        user_id = get_jwt_identity()
+        config = current_app.config
+
+        try:
+            items, errors = _read_bulk_items(config.get('PARCEL_BULK_MAX_ITEMS', 5000))
+        except ValueError as e:
+            return {"error": str(e)}, 400
+        if not items:
+            return {"error": "No parcels supplied"}, 400
+        charge_items(len(items))
+
+        rows, indexes = _validate_bulk_items(items, errors)
+        ids = {}
+        if rows:
+            try:
+                _price_bulk_rows(rows)
+                now = utcnow()
+                template = dict.fromkeys(BULK_COLUMNS)
+                records = [
+                    {**template, **row, **parcel_geohashes(row), "status": row.get("status") or "pending",
+                     "user_id": user_id, "created_at": now, "updated_at": now}
+                    for row in rows
+                ]
+                inserted = _insert_parcel_rows(records, config.get('PARCEL_BULK_CHUNK_SIZE', 500))
+
+                created = []
+                for i, record, result in zip(indexes, records, inserted):
+                    if isinstance(result, Exception):
+                        errors[i] = f"Database rejected parcel: {getattr(result, 'orig', result)}"
+                    else:
+                        ids[i] = result
+                        created.append(dict(record, id=result))
+
+                ParcelCount.apply_deltas(Counter((user_id, r["status"]) for r in created))
+                stats = ParcelStat.deltas()
+                for record in created:
+                    ParcelStat.add(stats, record)
+                ParcelStat.apply_deltas(stats)
+                notify_owner_digest(user_id, created)
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                current_app.logger.error("Bulk parcel creation failed: %s", e)
+                current_app.logger.error("Traceback:\n%s", traceback.format_exc())
+                return {"error": "Parcel creation failed", "detail": str(e)}, 500
+
+        results = [
+            {"index": i, "id": ids[i]} if i in ids else {"index": i, "error": errors[i]}
+            for i in range(len(items))
+        ]
+        status = 201 if not errors else 207 if ids else 400
+        return {"created": len(ids), "failed": len(errors), "results": results}, status
+
+
+class ParcelQuote(Resource):
+    """Quote distance, duration and cost for a prospective parcel."""
+    decorators = [route_limit('parcelquote')]
+
+    @jwt_required()
+    def post(self):
+        data = _normalize_parcel_payload(request.get_json(silent=True) or {})
+        estimate = _estimate_route(data)
+        if estimate is None:
+            return {"error": "Pickup and destination coordinates or addresses are required"}, 400
+
+        weight = data.get("weight")
+        return {
+            "distance": round(estimate.distance_m / 1000, 2),
+            "duration_seconds": estimate.duration_s,
+            "cost": weight * 150 if isinstance(weight, (int, float)) else None,
+            "source": estimate.source,
+        }, 200
+
+
 class ParcelResource(Resource):
     """Get parcel by ID."""
     @jwt_required()
     def get(self, parcel_id):
         current_user_id = get_jwt_identity()
+        if request.if_none_match:
+            # Revalidation: answer from (owner, version, updated_at) without loading the row.
+            found = parcel_version(parcel_id)
+            if found is None:
+                return {"error": "Parcel not found"}, 404
+            owner, etag = found
+            if owner != current_user_id:
+                return {"error": "Unauthorized access to this parcel"}, 403
+            if is_fresh(etag):
+                return not_modified(etag)
+
         parcel = Parcel.query.get(parcel_id)
 
         if not parcel:
@@ -125,7 +489,8 @@ class ParcelResource(Resource):
         if parcel.user_id != current_user_id:
             return {"error": "Unauthorized access to this parcel"}, 403
 
-        return parcel.to_dict(), 200
+        etag = parcel_etag(parcel.id, parcel.version, parcel.updated_at)
+        return parcel.to_dict(), 200, validator_headers(etag)
 
 
 class ParcelCancel(Resource):
@@ -141,11 +506,64 @@ class ParcelCancel(Resource):
         if parcel.status == 'delivered':
             return {"error": "Cannot cancel delivered parcel"}, 400
 
+        old_status = parcel.status
         parcel.status = 'cancelled'
+        history = ParcelHistory(
+            parcel_id=parcel.id,
+            updated_by=user_id,
+            update_type="status",
+            old_value=old_status,
+            new_value='cancelled'
+        )
+        db.session.add(history)
+        notify_parcel_owner(parcel, send_parcel_cancelled_email)
+        db.session.flush()
+        event = history_event(history, parcel.user_id)
         db.session.commit()
+        parcel_events.publish([event])
         return parcel.to_dict(), 200
 
 
+def _event_stream(parcel_id=None, user_id=None):
+    """SSE response for one parcel's or one owner's events, resuming after Last-Event-ID."""
+    last_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    try:
+        last_id = int(last_id) if last_id else None
+    except ValueError:
+        return {"error": "Last-Event-ID must be an integer"}, 400
+
+    # Subscribe before reading the backlog so nothing committed in between is lost.
+    subscription = parcel_events.subscribe(parcel_id=parcel_id, user_id=user_id)
+    try:
+        replay = [] if last_id is None else history_events(
+            last_id, parcel_id=parcel_id, user_id=user_id, limit=SSE_REPLAY_LIMIT
+        )
+    except Exception:
+        subscription.close()
+        raise
+    return sse_response(subscription, replay, parcel_events.heartbeat,
+                        resume=len(replay) < SSE_REPLAY_LIMIT)
+
+
+class ParcelEvents(Resource):
+    """Live status/location events for one parcel (Server-Sent Events)."""
+    @jwt_required(locations=SSE_TOKEN_LOCATIONS)
+    def get(self, parcel_id):
+        owner = db.session.query(Parcel.user_id).filter(Parcel.id == parcel_id).scalar()
+        if owner is None:
+            return {"error": "Parcel not found"}, 404
+        if owner != get_jwt_identity() and not is_admin():
+            return {"error": "Unauthorized access to this parcel"}, 403
+        return _event_stream(parcel_id=parcel_id)
+
+
+class UserParcelEvents(Resource):
+    """Live status/location events for every parcel the caller owns (Server-Sent Events)."""
+    @jwt_required(locations=SSE_TOKEN_LOCATIONS)
+    def get(self):
+        return _event_stream(user_id=get_jwt_identity())
+
+
 class ParcelDestination(Resource):
     """Update parcel destination."""
     @jwt_required()
@@ -180,10 +598,7 @@ class ParcelStatus(Resource):
     """Update parcel status (admin only)."""
     @jwt_required()
     def patch(self, parcel_id):
-        current_user_id = get_jwt_identity()
-        user = User.query.get(current_user_id)
-
-        if not user or not user.admin:
+        if not is_admin():
             return {"error": "Admin privileges required"}, 403
 
         parcel = Parcel.query.get(parcel_id)
@@ -7,14 +7,18 @@ from flask_jwt_extended import (
     get_jwt,
     get_jwt_identity
 )
+from server.authorization import token_claims
 from server.models import User
-from server.config import blacklist, db
+from server.config import db, revocation_store
+from server.ratelimit import route_limit
 from sqlalchemy.exc import IntegrityError
 
 
 class Signup(Resource):
     """Resource for user signup."""
 
+    decorators = [route_limit('signup')]
+
     def post(self):
         """
         Register a new user.
@@ -82,7 +86,7 @@ class Signup(Resource):
             db.session.add(user)
             db.session.commit()
 
-            access_token = create_access_token(identity=user.id)
+            access_token = create_access_token(identity=user.id, additional_claims=token_claims(user))
             return {
                 "user": user.to_dict(),
                 "access_token": access_token
@@ -96,6 +100,8 @@ class Signup(Resource):
 class Register(Resource):
     """Resource for user registration (alias for signup)."""
 
+    decorators = [route_limit('register')]
+
     def post(self):
         """
         Register a new user (alias for signup).
@@ -163,7 +169,7 @@ class Register(Resource):
             db.session.add(user)
             db.session.commit()
 
-            access_token = create_access_token(identity=user.id)
+            access_token = create_access_token(identity=user.id, additional_claims=token_claims(user))
             return {
                 "user": user.to_dict(),
                 "access_token": access_token
@@ -238,8 +244,8 @@ class Logout(Resource):
                       type: string
                       example: Successfully logged out
         """
-        jti = get_jwt()["jti"]
-        blacklist.add(jti)
+        claims = get_jwt()
+        revocation_store.revoke(claims["jti"], claims["exp"])
         return {"message": "Successfully logged out"}, 200
       
 class Home(Resource):
@@ -0,0 +1,109 @@
+"""Precompiled model serializers and the fast JSON encoder used for responses."""
+import json
+from flask import make_response
+from flask.json.provider import DefaultJSONProvider
+from sqlalchemy import Date, DateTime, Time
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - stdlib fallback
+    orjson = None
+
+_serializers = {}
+
+
+def build_serializer(model, columns=None):
+    """Generate a ``row -> dict`` function specialised for ``model``.
+
+    The column list, attribute names and which values need ``isoformat()``
+    are worked out once here. The generated function reads straight from the
+    instance ``__dict__`` (one dict literal, no descriptor calls) and only
+    falls back to attribute access when a column is expired or deferred, so
+    SQLAlchemy can load it.
+    """
+    mapper = model.__mapper__
+    wanted = set(columns) if columns is not None else None
+
+    if wanted is not None:
+        unknown = wanted - {c.name for c in mapper.c}
+        if unknown:
+            raise ValueError(f"Unknown {model.__name__} columns: {sorted(unknown)}")
+
+    fast, slow = [], []
+    for column in mapper.c:
+        if wanted is not None and column.name not in wanted:
+            continue
+        attr = mapper.get_property_by_column(column).key
+        is_temporal = isinstance(column.type, (DateTime, Date, Time))
+        for target, value in ((fast, f"d[{attr!r}]"), (slow, f"obj.{attr}")):
+            expr = f"_iso({value})" if is_temporal else value
+            target.append(f"{column.name!r}: {expr}")
+
+    source = (
+        "def serialize(obj):\n"
+        "    d = obj.__dict__\n"
+        "    try:\n"
+        "        return {" + ", ".join(fast) + "}\n"
+        "    except KeyError:\n"
+        "        return {" + ", ".join(slow) + "}\n"
+    )
+    namespace = {"_iso": _iso}
+    exec(compile(source, f"<serializer {model.__name__}>", "exec"), namespace)  # pylint: disable=exec-used
+    return namespace["serialize"]
+
+
+def _iso(value):
+    return value.isoformat() if value is not None else None
+
+
+def serializer_for(model, columns=None):
+    """Return the cached serializer for ``model`` (optionally a column subset)."""
+    key = (model, tuple(columns) if columns is not None else None)
+    serializer = _serializers.get(key)
+    if serializer is None:
+        serializer = _serializers[key] = build_serializer(model, columns)
+    return serializer
+
+
+def warm_serializers(*models):
+    """Build the full-row serializers up front so no request pays for it."""
+    for model in models:
+        serializer_for(model)
+
+
+def dumps(obj):
+    """Encode ``obj`` to a JSON string, using orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(
+            obj, default=DefaultJSONProvider.default, option=orjson.OPT_NON_STR_KEYS
+        ).decode('utf-8')
+    return json.dumps(obj, default=DefaultJSONProvider.default, separators=(',', ':'))
+
+
+def loads(data):
+    """Decode JSON from ``str`` or ``bytes``, using orjson when it is installed."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider that routes ``jsonify`` through :func:`dumps`."""
+
+    sort_keys = False
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+        return dumps(obj)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumps(obj) + "\n", mimetype=self.mimetype)
+
+
+def output_json(data, code, headers=None):
+    """Flask-RESTful representation for application/json using :func:`dumps`."""
+    response = make_response(dumps(data) + "\n", code)
+    response.headers.extend(headers or {})
+    return response
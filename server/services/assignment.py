@@ -0,0 +1,221 @@
+"""Batch courier assignment for pending parcels.
+
+Each parcel goes to one courier so that the total courier-to-pickup
+distance is small and no courier carries more than its weight capacity (a
+capacitated generalized assignment problem). The solver works in three
+steps:
+
+1. Nearest couriers: one haversine distance matrix per block of parcels,
+   vectorized with numpy when it is installed, keeping only each parcel's
+   ``candidates`` nearest couriers. Blocks can run on a thread pool
+   (numpy releases the GIL), which is the ``workers`` option.
+2. Greedy: parcels are placed in order of regret (how much worse their
+   second-best courier is), heaviest first on ties, each with the nearest
+   courier that still has room. This is first-fit-decreasing bin packing
+   steered by distance.
+3. Improve: relocate and swap moves between candidate couriers, repeated
+   until nothing improves or the time budget runs out. Parcels left over
+   are retried whenever capacity frees up.
+"""
+import heapq
+import math
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from server.services.geo import EARTH_RADIUS_M, haversine_m
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - pure-Python fallback
+    np = None
+
+Courier = namedtuple('Courier', ['id', 'lat', 'lng', 'capacity'])
+Job = namedtuple('Job', ['id', 'lat', 'lng', 'weight'])
+# ``assignments`` maps job id -> (courier id, distance_m).
+AssignmentResult = namedtuple('AssignmentResult', ['assignments', 'unassigned', 'total_distance_m'])
+
+CANDIDATES = 16
+IMPROVE_SECONDS = 2.0
+# Parcels per distance-matrix block: 1024 x 500 couriers is ~4 MB of float64.
+BLOCK_ROWS = 1024
+
+
+def _nearest_block_numpy(jobs, clat, clng, cos_clat, k):
+    jlat = np.radians(np.fromiter((j.lat for j in jobs), float, len(jobs)))[:, None]
+    jlng = np.radians(np.fromiter((j.lng for j in jobs), float, len(jobs)))[:, None]
+    h = (np.sin((clat - jlat) / 2) ** 2
+         + np.cos(jlat) * cos_clat * np.sin((clng - jlng) / 2) ** 2)
+    dist = 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.minimum(h, 1.0)))
+
+    if k < dist.shape[1]:
+        idx = np.argpartition(dist, k - 1, axis=1)[:, :k]
+        dist = np.take_along_axis(dist, idx, axis=1)
+    else:
+        idx = np.broadcast_to(np.arange(dist.shape[1]), dist.shape)
+    order = np.argsort(dist, axis=1, kind='stable')
+    idx = np.take_along_axis(idx, order, axis=1)
+    dist = np.take_along_axis(dist, order, axis=1)
+    return [list(zip(d, i)) for d, i in zip(dist.tolist(), idx.tolist())]
+
+
+def _nearest_block_python(jobs, couriers, k):
+    points = [(c.lat, c.lng) for c in couriers]
+    return [
+        heapq.nsmallest(k, ((haversine_m((j.lat, j.lng), p), ci) for ci, p in enumerate(points)))
+        for j in jobs
+    ]
+
+
+def nearest_couriers(jobs, couriers, k, workers=1):
+    """For each job, its ``k`` nearest couriers as ``[(distance_m, courier_index), ...]``."""
+    if not jobs or not couriers:
+        return [[] for _ in jobs]
+    k = min(k, len(couriers))
+    blocks = [jobs[i:i + BLOCK_ROWS] for i in range(0, len(jobs), BLOCK_ROWS)]
+
+    if np is not None:
+        clat = np.radians(np.array([c.lat for c in couriers], dtype=float))[None, :]
+        clng = np.radians(np.array([c.lng for c in couriers], dtype=float))[None, :]
+        cos_clat = np.cos(clat)
+
+        def solve(block):
+            return _nearest_block_numpy(block, clat, clng, cos_clat, k)
+    else:
+        def solve(block):
+            return _nearest_block_python(block, couriers, k)
+
+    if workers > 1 and len(blocks) > 1:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(solve, blocks))
+    else:
+        results = [solve(block) for block in blocks]
+    return [row for block in results for row in block]
+
+
+class _Solver:
+    """Mutable state for one assignment run (indexes, not ids, throughout)."""
+
+    def __init__(self, jobs, couriers, near, max_distance_m):
+        self.weights = [max(j.weight or 0.0, 0.0) for j in jobs]
+        self.remaining = [math.inf if c.capacity is None else float(c.capacity) for c in couriers]
+        self.limit = math.inf if max_distance_m is None else max_distance_m
+        self.near = [[(d, c) for d, c in row if d <= self.limit] for row in near]
+        self.lookup = [dict((c, d) for d, c in row) for row in self.near]
+        self.owner = [None] * len(jobs)
+        self.cost = [0.0] * len(jobs)
+        self.members = [set() for _ in couriers]
+
+    def place(self, i, c, d):
+        self.owner[i], self.cost[i] = c, d
+        self.remaining[c] -= self.weights[i]
+        self.members[c].add(i)
+
+    def remove(self, i):
+        c = self.owner[i]
+        self.remaining[c] += self.weights[i]
+        self.members[c].discard(i)
+        self.owner[i] = None
+
+    def try_place(self, i):
+        for d, c in self.near[i]:
+            if self.weights[i] <= self.remaining[c]:
+                self.place(i, c, d)
+                return True
+        return False
+
+    def greedy(self):
+        def regret(i):
+            row = self.near[i]
+            return row[1][0] - row[0][0] if len(row) > 1 else math.inf
+        order = sorted((i for i, row in enumerate(self.near) if row),
+                       key=lambda i: (-regret(i), -self.weights[i]))
+        return [i for i in order if not self.try_place(i)]
+
+    def relocate(self):
+        moved = False
+        for i, x in enumerate(self.owner):
+            if x is None:
+                continue
+            for d, y in self.near[i]:
+                if d >= self.cost[i]:
+                    break
+                if self.weights[i] <= self.remaining[y]:
+                    self.remove(i)
+                    self.place(i, y, d)
+                    moved = True
+                    break
+        return moved
+
+    def swap(self, deadline):
+        swapped = False
+        for i, x in enumerate(self.owner):
+            if x is None:
+                continue
+            if time.monotonic() > deadline:
+                break
+            done = False
+            for d_iy, y in self.near[i]:
+                if d_iy >= self.cost[i]:
+                    break
+                for j in list(self.members[y]):
+                    d_jx = self.lookup[j].get(x)
+                    if d_jx is None:
+                        continue
+                    gain = self.cost[i] + self.cost[j] - d_iy - d_jx
+                    wi, wj = self.weights[i], self.weights[j]
+                    if (gain > 1e-6 and self.remaining[x] + wi - wj >= 0
+                            and self.remaining[y] + wj - wi >= 0):
+                        self.remove(i)
+                        self.remove(j)
+                        self.place(i, y, d_iy)
+                        self.place(j, x, d_jx)
+                        swapped = done = True
+                        break
+                if done or self.owner[i] != x:
+                    break
+        return swapped
+
+    def improve(self, leftovers, seconds):
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            changed = self.relocate()
+            changed = self.swap(deadline) or changed
+            placed = [i for i in leftovers if self.try_place(i)]
+            if placed:
+                leftovers = [i for i in leftovers if self.owner[i] is None]
+            if not (changed or placed):
+                break
+        return leftovers
+
+
+def assign_couriers(jobs, couriers, max_distance_m=None, candidates=CANDIDATES,
+                    workers=1, improve_seconds=IMPROVE_SECONDS):
+    """Assign ``jobs`` (pickups) to ``couriers`` within their weight capacity.
+
+    ``capacity=None`` means unlimited and ``weight=None`` counts as zero.
+    Parcels with no courier within ``max_distance_m``, or none with room
+    left, come back in ``unassigned``. ``workers > 1`` computes the distance
+    blocks on that many threads.
+    """
+    jobs, couriers = list(jobs), list(couriers)
+    near = nearest_couriers(jobs, couriers, candidates, workers)
+    solver = _Solver(jobs, couriers, near, max_distance_m)
+    leftovers = solver.greedy()
+
+    if leftovers and candidates < len(couriers):
+        # Their nearest couriers filled up; widen the search to every courier.
+        wide = nearest_couriers([jobs[i] for i in leftovers], couriers, len(couriers), workers)
+        for i, row in zip(leftovers, wide):
+            solver.near[i] = [(d, c) for d, c in row if d <= solver.limit]
+            solver.lookup[i] = dict((c, d) for d, c in solver.near[i])
+        leftovers = [i for i in leftovers if not solver.try_place(i)]
+
+    leftovers = solver.improve(leftovers, improve_seconds)
+
+    assignments = {
+        jobs[i].id: (couriers[c].id, solver.cost[i])
+        for i, c in enumerate(solver.owner) if c is not None
+    }
+    unassigned = [job.id for i, job in enumerate(jobs) if solver.owner[i] is None]
+    total = sum(d for _, d in assignments.values())
+    return AssignmentResult(assignments, unassigned, total)
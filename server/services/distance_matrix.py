@@ -0,0 +1,210 @@
+"""Batched distance-matrix lookups for many origin/destination pairs.
+
+Pairs are deduplicated, packed into the largest tiles the provider accepts
+(Google: 25 origins, 25 destinations, 100 elements per request), and the
+tiles are fetched concurrently behind a token bucket that tracks the
+provider's elements-per-second quota. Results are mapped back to every
+input pair.
+"""
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from server.services.geo import as_point, haversine_m
+from server.services.maps_cache import normalize_location
+from server.services.throttle import TokenBucket
+
+MatrixLimits = namedtuple('MatrixLimits', ['max_origins', 'max_destinations', 'max_elements'])
+GOOGLE_LIMITS = MatrixLimits(max_origins=25, max_destinations=25, max_elements=100)
+
+Tile = namedtuple('Tile', ['origins', 'destinations'])
+
+
+def _chunks(items, size):
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def plan_tiles(pairs, limits=GOOGLE_LIMITS, max_waste_ratio=1.0):
+    """Pack unique (origin, destination) pairs into provider-sized tiles.
+
+    Origins that need exactly the same destinations share a tile. Small
+    tiles are then merged while the merged tile still fits the limits and
+    the elements nobody asked for stay within ``max_waste_ratio`` of the
+    requested ones (elements are billed, requests cost latency).
+    """
+    by_origin = OrderedDict()
+    for origin, destination in pairs:
+        by_origin.setdefault(origin, OrderedDict())[destination] = None
+
+    groups = OrderedDict()
+    for origin, destinations in by_origin.items():
+        groups.setdefault(tuple(destinations), []).append(origin)
+
+    per_request = min(limits.max_destinations, limits.max_elements)
+    tiles = []
+    for destinations, origins in groups.items():
+        for dest_chunk in _chunks(list(destinations), per_request):
+            rows = max(1, min(limits.max_origins, limits.max_elements // len(dest_chunk)))
+            for origin_chunk in _chunks(origins, rows):
+                tiles.append(Tile(origin_chunk, dest_chunk))
+
+    return _merge_tiles(tiles, limits, max_waste_ratio)
+
+
+def _merge_tiles(tiles, limits, max_waste_ratio):
+    tiles = [(list(t.origins), list(t.destinations), len(t.origins) * len(t.destinations))
+             for t in tiles]
+    tiles.sort(key=lambda t: t[2])
+
+    merged = []
+    for origins, destinations, needed in tiles:
+        for i, (m_origins, m_dests, m_needed) in enumerate(merged):
+            all_origins = m_origins + [o for o in origins if o not in m_origins]
+            all_dests = m_dests + [d for d in destinations if d not in m_dests]
+            size = len(all_origins) * len(all_dests)
+            if (len(all_origins) <= limits.max_origins
+                    and len(all_dests) <= limits.max_destinations
+                    and size <= limits.max_elements
+                    and size - (m_needed + needed) <= max_waste_ratio * (m_needed + needed)):
+                merged[i] = (all_origins, all_dests, m_needed + needed)
+                break
+        else:
+            merged.append((origins, destinations, needed))
+
+    return [Tile(origins, destinations) for origins, destinations, _ in merged]
+
+
+class DistanceMatrixBatcher:
+    """Resolve many pairs through a matrix provider with bounded concurrency."""
+
+    def __init__(self, provider, limits=None, max_workers=4, bucket=None, elements_per_second=1000):
+        self.provider = provider
+        self.limits = limits or getattr(provider, 'limits', GOOGLE_LIMITS)
+        self.max_workers = max_workers
+        # Pass a shared bucket so the quota holds across batches, not per call.
+        self.bucket = bucket or TokenBucket(elements_per_second)
+
+    def _fetch(self, tile):
+        self.bucket.acquire(len(tile.origins) * len(tile.destinations))
+        return self.provider.distance_matrix(tile.origins, tile.destinations)
+
+    def resolve(self, pairs):
+        """Return ``{(origin_key, destination_key): (distance_m, duration_s) or None}``.
+
+        Keys are the normalized forms from ``normalize_location``; the first
+        spelling seen for each location is what gets sent to the provider.
+        """
+        spelling = {}
+        unique = OrderedDict()
+        for origin, destination in pairs:
+            o_key, d_key = normalize_location(origin), normalize_location(destination)
+            spelling.setdefault(o_key, origin)
+            spelling.setdefault(d_key, destination)
+            unique[(o_key, d_key)] = None
+
+        tiles = plan_tiles(list(unique), self.limits)
+        if not tiles:
+            return {}
+
+        workers = max(1, min(self.max_workers, len(tiles)))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = [
+                (tile, pool.submit(self._fetch, Tile(
+                    [spelling[o] for o in tile.origins],
+                    [spelling[d] for d in tile.destinations],
+                )))
+                for tile in tiles
+            ]
+
+        results = {}
+        for tile, future in futures:
+            try:
+                rows = future.result()
+            except Exception:  # one failed tile must not sink the batch
+                rows = None
+            for i, origin in enumerate(tile.origins):
+                for j, destination in enumerate(tile.destinations):
+                    if (origin, destination) not in unique:
+                        continue
+                    results[(origin, destination)] = _element_metrics(rows, i, j)
+        return results
+
+
+def _element_metrics(rows, i, j):
+    if rows is None:
+        return None
+    element = rows[i]['elements'][j]
+    if element.get('status') != 'OK':
+        return None
+    return element['distance']['value'], element['duration']['value']
+
+
+class GoogleMatrixProvider:
+    """Distance Matrix API adapter over a shared googlemaps.Client."""
+
+    limits = GOOGLE_LIMITS
+
+    def __init__(self, client, mode="driving", departure_time=None):
+        self.client = client
+        self.mode = mode
+        self.departure_time = departure_time
+
+    def distance_matrix(self, origins, destinations):
+        matrix = self.client.distance_matrix(
+            origins=origins,
+            destinations=destinations,
+            mode=self.mode,
+            departure_time=self.departure_time,
+        )
+        return matrix['rows']
+
+
+class FakeMatrixProvider:
+    """Offline provider: great-circle distances at a fixed speed.
+
+    Enforces the same tile limits as Google, records every call and can
+    sleep to simulate network latency, so batching and concurrency can be
+    tested without the network.
+    """
+
+    limits = GOOGLE_LIMITS
+
+    def __init__(self, latency=0.0, speed_mps=11.0):
+        self.latency = latency
+        self.speed_mps = speed_mps
+        self.calls = []
+        self._lock = threading.Lock()
+        self.max_in_flight = 0
+        self._in_flight = 0
+
+    def distance_matrix(self, origins, destinations):
+        if (len(origins) > self.limits.max_origins
+                or len(destinations) > self.limits.max_destinations
+                or len(origins) * len(destinations) > self.limits.max_elements):
+            raise ValueError("Tile exceeds provider limits")
+
+        with self._lock:
+            self.calls.append((list(origins), list(destinations)))
+            self._in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self._in_flight)
+        try:
+            if self.latency:
+                time.sleep(self.latency)
+            return [
+                {'elements': [self._element(o, d) for d in destinations]}
+                for o in origins
+            ]
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+    def _element(self, origin, destination):
+        try:
+            meters = haversine_m(as_point(origin), as_point(destination))
+        except (TypeError, ValueError):
+            return {'status': 'NOT_FOUND'}
+        return {
+            'status': 'OK',
+            'distance': {'value': int(round(meters))},
+            'duration': {'value': int(round(meters / self.speed_mps))},
+        }
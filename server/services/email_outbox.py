@@ -0,0 +1,199 @@
+"""Transactional email outbox and the worker that drains it.
+
+Request handlers only insert ``EmailOutbox`` rows, in the same database
+transaction as the change that triggered the email, so nothing is sent for
+a rolled-back change and nothing queued is lost on restart. A separate
+``flask email-worker`` process claims due rows in batches, delivers them on
+a bounded thread pool, retries failures with exponential backoff and moves
+messages that keep failing to the ``dead`` status.
+"""
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from flask import current_app
+from server.config import db
+from server.models import EmailOutbox
+
+PENDING, SENDING, SENT, DEAD = 'pending', 'sending', 'sent', 'dead'
+
+
+def _now():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def enqueue_email(subject, recipients, html_body, text_body=None, transport='smtp', commit=False):
+    """Queue one outbox row per recipient on the current session.
+
+    With ``commit=False`` (the default) the rows are committed together with
+    whatever else the caller has pending, which is the point of the outbox.
+    """
+    rows = [
+        EmailOutbox(
+            transport=transport,
+            recipient=recipient,
+            subject=subject,
+            html_body=html_body,
+            text_body=text_body,
+            next_attempt_at=_now(),
+        )
+        for recipient in recipients
+    ]
+    db.session.add_all(rows)
+    if commit:
+        db.session.commit()
+    return rows
+
+
+def _deliver_smtp(messages):
+    """Send messages over a single SMTP connection."""
+    from flask_mail import Message
+    from server.config import mail
+
+    sender = current_app.config.get('MAIL_DEFAULT_SENDER') or current_app.config.get('MAIL_USERNAME')
+    results = {}
+    with mail.connect() as conn:
+        for message in messages:
+            try:
+                msg = Message(message['subject'], recipients=[message['recipient']], sender=sender)
+                msg.html = message['html_body']
+                if message['text_body']:
+                    msg.body = message['text_body']
+                conn.send(msg)
+                results[message['id']] = None
+            except Exception as e:
+                results[message['id']] = str(e)
+    return results
+
+
+def _deliver_sendgrid(messages):
+    """Send messages with identical content as one multi-personalization request."""
+    from server.services.sendgrid_service import SendGridService
+
+    service = SendGridService()
+    groups = {}
+    for message in messages:
+        key = (message['subject'], message['html_body'], message['text_body'])
+        groups.setdefault(key, []).append(message)
+
+    results = {}
+    for (subject, html_body, text_body), group in groups.items():
+        sent = service.send_bulk(subject, html_body, [m['recipient'] for m in group], text_body)
+        for message, ok in zip(group, sent):
+            results[message['id']] = None if ok else "SendGrid rejected the message"
+    return results
+
+
+TRANSPORTS = {
+    'smtp': _deliver_smtp,
+    'sendgrid': _deliver_sendgrid,
+}
+
+
+class OutboxWorker:
+    """Claims due outbox rows and delivers them with bounded concurrency."""
+
+    def __init__(self, app, concurrency=4, batch_size=50, max_attempts=8,
+                 base_backoff=30, max_backoff=3600, lease_seconds=300, transports=None):
+        self.app = app
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.lease_seconds = lease_seconds
+        self.transports = transports or TRANSPORTS
+        self.pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='email')
+
+    def claim(self):
+        """Lease up to ``batch_size`` due rows to this worker.
+
+        Rows left in ``sending`` by a crashed worker become due again once
+        their lease runs out. On PostgreSQL, SKIP LOCKED lets several worker
+        processes claim concurrently without handing out the same row.
+        """
+        now = _now()
+        rows = (
+            EmailOutbox.query
+            .filter(EmailOutbox.status.in_((PENDING, SENDING)))
+            .filter(EmailOutbox.next_attempt_at <= now)
+            .order_by(EmailOutbox.next_attempt_at, EmailOutbox.id)
+            .limit(self.batch_size)
+            .with_for_update(skip_locked=True)
+            .all()
+        )
+        lease = now + timedelta(seconds=self.lease_seconds)
+        for row in rows:
+            row.status = SENDING
+            row.next_attempt_at = lease
+        claimed = [
+            {
+                'id': row.id, 'transport': row.transport, 'recipient': row.recipient,
+                'subject': row.subject, 'html_body': row.html_body, 'text_body': row.text_body,
+            }
+            for row in rows
+        ]
+        db.session.commit()
+        return claimed
+
+    def _deliver_chunk(self, transport, messages):
+        with self.app.app_context():
+            deliver = self.transports.get(transport)
+            if deliver is None:
+                return {m['id']: f"Unknown transport {transport!r}" for m in messages}
+            try:
+                return deliver(messages)
+            except Exception as e:
+                return {m['id']: str(e) for m in messages}
+
+    def deliver(self, messages):
+        """Deliver claimed messages; returns ``{id: error or None}``."""
+        by_transport = {}
+        for message in messages:
+            by_transport.setdefault(message['transport'], []).append(message)
+
+        futures = []
+        for transport, group in by_transport.items():
+            size = max(1, -(-len(group) // self.concurrency))
+            for i in range(0, len(group), size):
+                futures.append(self.pool.submit(self._deliver_chunk, transport, group[i:i + size]))
+
+        results = {}
+        for future in futures:
+            results.update(future.result())
+        return results
+
+    def _backoff(self, attempts):
+        delay = min(self.max_backoff, self.base_backoff * 2 ** (attempts - 1))
+        return delay * random.uniform(0.8, 1.2)
+
+    def record(self, results):
+        now = _now()
+        rows = EmailOutbox.query.filter(EmailOutbox.id.in_(list(results))).all()
+        for row in rows:
+            error = results[row.id]
+            row.attempts += 1
+            if error is None:
+                row.status = SENT
+                row.sent_at = now
+                row.last_error = None
+            elif row.attempts >= self.max_attempts:
+                row.status = DEAD
+                row.last_error = error
+            else:
+                row.status = PENDING
+                row.last_error = error
+                row.next_attempt_at = now + timedelta(seconds=self._backoff(row.attempts))
+        db.session.commit()
+
+    def run_once(self):
+        """Claim, deliver and record one batch; returns how many were handled."""
+        messages = self.claim()
+        if messages:
+            self.record(self.deliver(messages))
+        return len(messages)
+
+    def run_forever(self, poll_interval=2.0):
+        while True:
+            if self.run_once() < self.batch_size:
+                time.sleep(poll_interval)
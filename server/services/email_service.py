@@ -1,147 +1,96 @@
 """Email service for Deliveroo app."""
-import os
 from flask import current_app
-from flask_mail import Mail, Message
-from threading import Thread
-
-mail = Mail()
-
-def send_async_email(app, msg):
-    """Send email asynchronously."""
-    with app.app_context():
-        mail.send(msg)
-
-def send_email(subject, recipients, html_body, text_body=None):
-    """Send email using Flask-Mail."""
-    app = current_app._get_current_object()
-    msg = Message(subject, recipients=recipients, sender=app.config['MAIL_USERNAME'])
-    msg.html = html_body
-    if text_body:
-        msg.body = text_body
-    
-    # Send email asynchronously
-    Thread(target=send_async_email, args=(app, msg)).start()
-
-def send_parcel_created_email(user_email, parcel_data):
-    """Send email when parcel is created."""
-    subject = f"Parcel #{parcel_data['id']} Created Successfully"
-    html_body = f"""
-    <html>
-        <body>
-            <h2>Your parcel has been created!</h2>
-            <p><strong>Parcel ID:</strong> {parcel_data['id']}</p>
-            <p><strong>Pickup Location:</strong> {parcel_data.get('pickup_location_text', 'N/A')}</p>
-            <p><strong>Destination:</strong> {parcel_data.get('destination_location_text', 'N/A')}</p>
-            <p><strong>Status:</strong> {parcel_data.get('status', 'pending')}</p>
-            <p><strong>Created:</strong> {parcel_data.get('created_at', 'N/A')}</p>
-            <br>
-            <p>Track your parcel at: <a href="https://your-frontend-url.com/track/{parcel_data['id']}">Track Parcel</a></p>
-        </body>
-    </html>
+from server.config import db
+from server.models import User
+from server.services.email_outbox import enqueue_email
+from server.services.email_templates import email_templates
+
+def send_email(subject, recipients, html_body, text_body=None, commit=True):
+    """Queue an email in the outbox for the ``flask email-worker`` process.
+
+    Pass ``commit=False`` to have the email committed atomically with the
+    caller's own pending changes.
     """
-    send_email(subject, [user_email], html_body)
+    enqueue_email(subject, recipients, html_body, text_body, transport='smtp', commit=commit)
 
-def send_status_update_email(user_email, parcel_data, old_status, new_status):
-    """Send email when parcel status is updated."""
-    subject = f"Parcel #{parcel_data['id']} Status Updated"
-    html_body = f"""
-    <html>
-        <body>
-            <h2>Your parcel status has been updated!</h2>
-            <p><strong>Parcel ID:</strong> {parcel_data['id']}</p>
-            <p><strong>Previous Status:</strong> {old_status}</p>
-            <p><strong>New Status:</strong> {new_status}</p>
-            <p><strong>Updated:</strong> {parcel_data.get('updated_at', 'N/A')}</p>
-            <br>
-            <p>Track your parcel at: <a href="https://your-frontend-url.com/track/{parcel_data['id']}">Track Parcel</a></p>
-        </body>
-    </html>
+def send_templated_email(template, recipients, commit=True, **context):
+    """Render ``template`` (subject, HTML and text in one pass) and queue it."""
+    email = email_templates.render(template, **context)
+    send_email(email.subject, recipients, email.html, email.text, commit=commit)
+
+def notify_parcel_owner(parcel, send_fn, *args):
+    """Queue a parcel email to its owner inside the caller's transaction.
+
+    Off unless PARCEL_EMAIL_NOTIFICATIONS is set, since the frontend still
+    triggers the /email/* endpoints itself.
     """
-    send_email(subject, [user_email], html_body)
+    if not current_app.config.get('PARCEL_EMAIL_NOTIFICATIONS') or parcel.user is None:
+        return
+    send_fn(parcel.user.email, parcel.to_dict(), *args, commit=False)
 
-def send_location_update_email(user_email, parcel_data, new_location):
-    """Send email when parcel location is updated."""
-    subject = f"Parcel #{parcel_data['id']} Location Updated"
-    html_body = f"""
-    <html>
-        <body>
-            <h2>Your parcel location has been updated!</h2>
-            <p><strong>Parcel ID:</strong> {parcel_data['id']}</p>
-            <p><strong>New Location:</strong> {new_location}</p>
-            <p><strong>Updated:</strong> {parcel_data.get('updated_at', 'N/A')}</p>
-            <br>
-            <p>Track your parcel at: <a href="https://your-frontend-url.com/track/{parcel_data['id']}">Track Parcel</a></p>
-        </body>
-    </html>
+def notify_owner_digest(user_id, parcel_data):
+    """Like ``notify_parcel_owner`` for a batch: one digest instead of an email per parcel."""
+    notify_owner_digests({user_id: parcel_data})
+
+def notify_owner_digests(parcels_by_user):
+    """``notify_owner_digest`` for many owners: ``{user_id: [parcel_dict, ...]}``.
+
+    Owners are loaded in one query and each gets a single digest.
     """
-    send_email(subject, [user_email], html_body)
+    if not current_app.config.get('PARCEL_EMAIL_NOTIFICATIONS'):
+        return
+    parcels_by_user = {uid: data for uid, data in parcels_by_user.items() if data}
+    if not parcels_by_user:
+        return
+    users = db.session.query(User.id, User.email, User.username).filter(
+        User.id.in_(parcels_by_user)
+    )
+    send_parcel_digests(
+        ((email, username, parcels_by_user[uid]) for uid, email, username in users),
+        commit=False,
+    )
+
+def send_parcel_created_email(user_email, parcel_data, commit=True):
+    """Send email when parcel is created."""
+    send_templated_email('parcel_created', [user_email], commit=commit, parcel=parcel_data)
+
+def send_status_update_email(user_email, parcel_data, old_status, new_status, commit=True):
+    """Send email when parcel status is updated."""
+    send_templated_email('status_update', [user_email], commit=commit, parcel=parcel_data,
+                         old_status=old_status, new_status=new_status)
+
+def send_location_update_email(user_email, parcel_data, new_location, commit=True):
+    """Send email when parcel location is updated."""
+    send_templated_email('location_update', [user_email], commit=commit, parcel=parcel_data,
+                         new_location=new_location)
 
-def send_parcel_cancelled_email(user_email, parcel_data):
+def send_parcel_cancelled_email(user_email, parcel_data, commit=True):
     """Send email when parcel is cancelled."""
-    subject = f"Parcel #{parcel_data['id']} Cancelled"
-    html_body = f"""
-    <html>
-        <body>
-            <h2>Your parcel has been cancelled!</h2>
-            <p><strong>Parcel ID:</strong> {parcel_data['id']}</p>
-            <p><strong>Status:</strong> Cancelled</p>
-            <p><strong>Cancelled:</strong> {parcel_data.get('updated_at', 'N/A')}</p>
-            <br>
-            <p>If this was a mistake, please contact support.</p>
-        </body>
-    </html>
+    send_templated_email('parcel_cancelled', [user_email], commit=commit, parcel=parcel_data)
+
+def send_parcel_digests(digests, commit=True):
+    """Queue one digest email per user.
+
+    ``digests`` is an iterable of ``(user_email, username, [parcel_dict, ...])``;
+    the digest template is rendered for all of them in one batch.
     """
-    send_email(subject, [user_email], html_body)
+    digests = list(digests)
+    emails = email_templates.render_many('parcel_digest', (
+        {'username': username, 'parcels': parcels} for _, username, parcels in digests
+    ))
+    for (user_email, _, _), email in zip(digests, emails):
+        send_email(email.subject, [user_email], email.html, email.text, commit=False)
+    if commit:
+        db.session.commit()
 
 def send_welcome_email(user_email, username):
     """Send welcome email to new users."""
-    subject = "Welcome to Deliveroo!"
-    html_body = f"""
-    <html>
-        <body>
-            <h2>Welcome to Deliveroo, {username}!</h2>
-            <p>Thank you for joining our parcel delivery platform.</p>
-            <p>You can now:</p>
-            <ul>
-                <li>Create new parcels</li>
-                <li>Track your deliveries</li>
-                <li>Manage your account</li>
-            </ul>
-            <br>
-            <p>Start by creating your first parcel!</p>
-        </body>
-    </html>
-    """
-    send_email(subject, [user_email], html_body)
+    send_templated_email('welcome', [user_email], username=username)
 
 def send_password_reset_email(user_email, reset_token):
     """Send password reset email."""
-    subject = "Password Reset Request"
-    html_body = f"""
-    <html>
-        <body>
-            <h2>Password Reset Request</h2>
-            <p>You requested a password reset for your Deliveroo account.</p>
-            <p>Click the link below to reset your password:</p>
-            <br>
-            <a href="https://your-frontend-url.com/reset-password?token={reset_token}">Reset Password</a>
-            <br>
-            <p>If you didn't request this, please ignore this email.</p>
-        </body>
-    </html>
-    """
-    send_email(subject, [user_email], html_body)
+    send_templated_email('password_reset', [user_email], reset_token=reset_token)
 
 def send_test_email(user_email):
     """Send test email."""
-    subject = "Test Email from Deliveroo"
-    html_body = f"""
-    <html>
-        <body>
-            <h2>Test Email</h2>
-            <p>This is a test email from your Deliveroo application.</p>
-            <p>If you received this, your email configuration is working correctly!</p>
-        </body>
-    </html>
-    """
-    send_email(subject, [user_email], html_body) 
\ No newline at end of file
+    send_templated_email('test', [user_email])
@@ -0,0 +1,96 @@
+"""Precompiled email templates.
+
+Templates live in ``server/templates/email``. Each one sets ``subject``,
+``html`` and ``text`` with ``{% set %}`` blocks, so a single pass over the
+compiled template produces all three variants. Templates are compiled once
+(at ``init_app`` or on first use) and never reloaded; HTML is autoescaped,
+the subject and text parts are not. Partials under ``_static/`` take no
+per-email data and are rendered once into the ``static`` global.
+"""
+import os
+import threading
+from collections import namedtuple
+from jinja2 import Environment, FileSystemLoader
+from markupsafe import Markup
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'templates', 'email')
+DEFAULT_FRONTEND_URL = 'http://localhost:3000'
+
+RenderedEmail = namedtuple('RenderedEmail', ['subject', 'html', 'text'])
+
+
+class EmailTemplates:
+    """Compiled-once registry rendering subject, HTML and text together."""
+
+    def __init__(self, directory=TEMPLATE_DIR, frontend_url=None):
+        self.env = Environment(
+            loader=FileSystemLoader(directory),
+            autoescape=True,
+            auto_reload=False,
+            cache_size=-1,
+            trim_blocks=True,
+            lstrip_blocks=True,
+        )
+        self.frontend_url = frontend_url
+        self._templates = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.frontend_url = app.config.get('FRONTEND_URL') or DEFAULT_FRONTEND_URL
+        self.load()
+
+    def load(self):
+        """Compile every template and render the static partials."""
+        with self._lock:
+            env = self.env
+            env.globals['frontend_url'] = (self.frontend_url
+                                           or os.getenv('FRONTEND_URL', DEFAULT_FRONTEND_URL)).rstrip('/')
+            names = env.list_templates(extensions=['jinja'])
+
+            static = {}
+            env.globals['static'] = static
+            for name in names:
+                if name.startswith('_static/'):
+                    key = name[len('_static/'):].rsplit('.', 1)[0]
+                    static[key] = Markup(env.get_template(name).render())
+
+            self._templates = {
+                name.rsplit('.', 1)[0]: env.get_template(name)
+                for name in names if not name.startswith('_')
+            }
+        return self
+
+    def get(self, name):
+        if self._templates is None:
+            self.load()
+        try:
+            return self._templates[name]
+        except KeyError:
+            raise ValueError(f"Unknown email template: {name}") from None
+
+    @staticmethod
+    def _render(template, context):
+        module = template.make_module(context)
+        return RenderedEmail(
+            str(module.subject).strip(),
+            str(module.html).strip(),
+            str(module.text).strip(),
+        )
+
+    def render(self, name, **context):
+        """Render ``name`` once, returning ``RenderedEmail(subject, html, text)``."""
+        return self._render(self.get(name), context)
+
+    def render_many(self, name, contexts):
+        """Render one template for many recipients (digests, bulk sends)."""
+        template = self.get(name)
+        return [self._render(template, context) for context in contexts]
+
+    def names(self):
+        if self._templates is None:
+            self.load()
+        return sorted(self._templates)
+
+
+# Shared by every sender in the process.
+email_templates = EmailTemplates()
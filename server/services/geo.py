@@ -0,0 +1,140 @@
+"""Plain-Python geodesy helpers shared by the maps, routing and dispatch code."""
+import math
+
+EARTH_RADIUS_M = 6371008.8
+
+
+def haversine_m(a, b):
+    """Great-circle distance in metres between two (lat, lng) points."""
+    lat1, lng1 = map(math.radians, a)
+    lat2, lng2 = map(math.radians, b)
+    h = (math.sin((lat2 - lat1) / 2) ** 2
+         + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(h))
+
+
+def as_point(location):
+    """Coerce ``(lat, lng)``, ``{'lat', 'lng'}`` or ``"lat,lng"`` to a float pair.
+
+    Raises ValueError/TypeError for anything else (e.g. a street address).
+    """
+    if isinstance(location, dict):
+        return float(location['lat']), float(location['lng'])
+    if isinstance(location, str):
+        lat, lng = location.split(',')
+        return float(lat), float(lng)
+    lat, lng = location
+    return float(lat), float(lng)
+
+
+# Geohash: interleaved lng/lat bisection bits, 5 per base32 character.
+# Cells sharing a prefix are contiguous, so "inside this cell" is a plain
+# string range that an ordinary B-tree index can answer.
+GEOHASH_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+GEOHASH_PRECISION = 9
+# Sorts after every base32 character: prefix <= cell < prefix + GEOHASH_END.
+GEOHASH_END = '{'
+METRES_PER_DEGREE_LAT = math.pi * EARTH_RADIUS_M / 180
+
+
+def geohash_encode(lat, lng, precision=GEOHASH_PRECISION):
+    """Geohash of ``(lat, lng)`` with ``precision`` characters."""
+    lat_lo, lat_hi, lng_lo, lng_hi = -90.0, 90.0, -180.0, 180.0
+    chars, value, bits, even = [], 0, 0, True
+    while len(chars) < precision:
+        if even:
+            mid = (lng_lo + lng_hi) / 2
+            if lng >= mid:
+                value, lng_lo = value * 2 + 1, mid
+            else:
+                value, lng_hi = value * 2, mid
+        else:
+            mid = (lat_lo + lat_hi) / 2
+            if lat >= mid:
+                value, lat_lo = value * 2 + 1, mid
+            else:
+                value, lat_hi = value * 2, mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(GEOHASH_BASE32[value])
+            value, bits = 0, 0
+    return ''.join(chars)
+
+
+def point_geohash(lat, lng):
+    """Stored geohash for a coordinate pair, or None if either half is missing."""
+    if lat is None or lng is None:
+        return None
+    return geohash_encode(lat, lng)
+
+
+def geohash_cell_size(precision):
+    """``(lat_degrees, lng_degrees)`` spanned by one cell of ``precision`` characters."""
+    bits = 5 * precision
+    return 180.0 / 2 ** (bits // 2), 360.0 / 2 ** ((bits + 1) // 2)
+
+
+def _split_antimeridian(south, west, north, east):
+    if west <= east:
+        return [(south, west, north, east)]
+    return [(south, west, north, 180.0), (south, -180.0, north, east)]
+
+
+def geohash_cover(south, west, north, east, max_cells=64):
+    """Geohash prefixes whose cells together cover the box.
+
+    Picks the finest precision whose cover has at most ``max_cells`` cells,
+    so a small box is pruned tightly and a large one still costs a bounded
+    number of index ranges. ``west > east`` means the box crosses the
+    antimeridian.
+    """
+    boxes = _split_antimeridian(max(south, -90.0), west, min(north, 90.0), east)
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        dlat, dlng = geohash_cell_size(precision)
+        spans = []
+        for s, w, n, e in boxes:
+            rows = range(int((s + 90) // dlat), min(int((n + 90) // dlat), int(180 / dlat) - 1) + 1)
+            cols = range(int((w + 180) // dlng), min(int((e + 180) // dlng), int(360 / dlng) - 1) + 1)
+            spans.append((rows, cols))
+        if precision > 1 and sum(len(r) * len(c) for r, c in spans) > max_cells:
+            continue
+        return sorted({
+            geohash_encode(-90 + (i + 0.5) * dlat, -180 + (j + 0.5) * dlng, precision)
+            for rows, cols in spans for i in rows for j in cols
+        })
+
+
+def bbox_around(lat, lng, radius_m):
+    """``(south, west, north, east)`` enclosing the circle of ``radius_m`` around a point."""
+    dlat = radius_m / METRES_PER_DEGREE_LAT
+    south, north = lat - dlat, lat + dlat
+    if south <= -90 or north >= 90:
+        return max(south, -90.0), -180.0, min(north, 90.0), 180.0
+    dlng = dlat / max(math.cos(math.radians(abs(lat) + dlat)), 1e-12)
+    if dlng >= 180:
+        return south, -180.0, north, 180.0
+    west, east = lng - dlng, lng + dlng
+    if west < -180:
+        west += 360
+    if east > 180:
+        east -= 360
+    return south, west, north, east
+
+
+def geohash_ranges(cells):
+    """Merge sorted same-precision cells into ``[(low, high), ...]`` string ranges.
+
+    Neighbouring cells in base32 order collapse into one range, so a cover
+    of a few dozen cells usually becomes a handful of index range scans.
+    """
+    ranges = []
+    for cell in cells:
+        if ranges:
+            low, last = ranges[-1]
+            if (last[:-1] == cell[:-1]
+                    and GEOHASH_BASE32.index(cell[-1]) == GEOHASH_BASE32.index(last[-1]) + 1):
+                ranges[-1] = (low, cell)
+                continue
+        ranges.append((cell, cell))
+    return [(low, last + GEOHASH_END) for low, last in ranges]
@@ -0,0 +1,189 @@
+"""Two-tier cache (in-process LRU + database table) for MapsService lookups."""
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from flask import current_app
+
+GEOCODE_TTL = 30 * 24 * 3600
+ROUTE_TTL = 7 * 24 * 3600
+# Durations depend on traffic, so route entries are keyed by the hour-of-day
+# bucket of the departure time: a 08:00 quote never answers a 14:00 lookup.
+ROUTE_BUCKET_HOURS = 3
+COORD_PRECISION = 4  # ~11 m
+
+_WHITESPACE = re.compile(r'\s+')
+_SEPARATORS = re.compile(r'\s*,\s*')
+
+
+def normalize_address(address):
+    """Canonical cache form of a free-text address."""
+    text = _WHITESPACE.sub(' ', str(address).strip().lower())
+    return _SEPARATORS.sub(', ', text).strip(' ,.')
+
+
+def normalize_location(location):
+    """Round (lat, lng) pairs, or normalize an address string."""
+    if isinstance(location, (tuple, list)) and len(location) == 2:
+        lat, lng = location
+        return f"{round(float(lat), COORD_PRECISION)},{round(float(lng), COORD_PRECISION)}"
+    if isinstance(location, dict) and 'lat' in location and 'lng' in location:
+        return normalize_location((location['lat'], location['lng']))
+    return normalize_address(location)
+
+
+def time_bucket(when=None):
+    """Hour-of-day bucket used in route keys."""
+    when = when or datetime.now(timezone.utc)
+    return when.hour // ROUTE_BUCKET_HOURS
+
+
+def geocode_key(address):
+    return f"geo:{normalize_address(address)}"
+
+
+def route_key(origin, destination, when=None):
+    return f"route:{time_bucket(when)}:{normalize_location(origin)}|{normalize_location(destination)}"
+
+
+class LRUCache:
+    """Thread-safe LRU with per-entry expiry."""
+
+    def __init__(self, maxsize=10000):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, now=None):
+        now = time.time() if now is None else now
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= now:
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, expires_at):
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class MapsCache:
+    """LRU in front of the ``maps_cache`` table, with hit-rate counters."""
+
+    def __init__(self, maxsize=10000, persistent=True):
+        self.memory = LRUCache(maxsize)
+        self.persistent = persistent
+        self._lock = threading.Lock()
+        self.reset_stats()
+
+    def reset_stats(self):
+        with self._lock:
+            self.memory_hits = 0
+            self.db_hits = 0
+            self.misses = 0
+
+    def _count(self, attr):
+        with self._lock:
+            setattr(self, attr, getattr(self, attr) + 1)
+
+    def get(self, key):
+        value = self.memory.get(key)
+        if value is not None:
+            self._count('memory_hits')
+            return value
+
+        if self.persistent:
+            row = self._db_get(key)
+            if row is not None:
+                value, expires_at = row
+                self.memory.set(key, value, expires_at)
+                self._count('db_hits')
+                return value
+
+        self._count('misses')
+        return None
+
+    def set(self, key, value, ttl):
+        expires_at = time.time() + ttl
+        self.memory.set(key, value, expires_at)
+        if self.persistent:
+            self._db_set(key, value, expires_at)
+
+    def stats(self):
+        lookups = self.memory_hits + self.db_hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "db_hits": self.db_hits,
+            "misses": self.misses,
+            "lookups": lookups,
+            "hit_rate": (self.memory_hits + self.db_hits) / lookups if lookups else 0.0,
+            "memory_entries": len(self.memory),
+        }
+
+    # -- persistent tier -------------------------------------------------
+    # Runs on its own connection so caching never commits (or rolls back)
+    # whatever the request has pending in db.session.
+
+    def _db_get(self, key):
+        from server.config import db
+        from server.models import MapsCacheEntry
+        table = MapsCacheEntry.__table__
+        try:
+            with db.engine.connect() as conn:
+                row = conn.execute(
+                    table.select().where(
+                        table.c.key == key,
+                        table.c.expires_at > _naive_utc(time.time()),
+                    )
+                ).first()
+        except Exception as e:
+            current_app.logger.warning(f"Maps cache read failed: {str(e)}")
+            return None
+        if row is None:
+            return None
+        return json.loads(row.value), _epoch(row.expires_at)
+
+    def _db_set(self, key, value, expires_at):
+        from server.config import db
+        from server.models import MapsCacheEntry
+        table = MapsCacheEntry.__table__
+        params = {"value": json.dumps(value), "expires_at": _naive_utc(expires_at)}
+        try:
+            with db.engine.begin() as conn:
+                updated = conn.execute(table.update().where(table.c.key == key).values(**params))
+                if updated.rowcount == 0:
+                    conn.execute(table.insert().values(key=key, **params))
+        except Exception as e:
+            current_app.logger.warning(f"Maps cache write failed: {str(e)}")
+
+    def purge_expired(self):
+        from server.config import db
+        from server.models import MapsCacheEntry
+        table = MapsCacheEntry.__table__
+        with db.engine.begin() as conn:
+            conn.execute(table.delete().where(table.c.expires_at <= _naive_utc(time.time())))
+
+
+def _naive_utc(epoch):
+    return datetime.fromtimestamp(epoch, tz=timezone.utc).replace(tzinfo=None)
+
+
+def _epoch(value):
+    return value.replace(tzinfo=timezone.utc).timestamp()
@@ -1,38 +1,160 @@
+import threading
 import googlemaps
 from datetime import datetime
 from flask import current_app
+from server.services.distance_matrix import DistanceMatrixBatcher, GoogleMatrixProvider
+from server.services.maps_cache import (
+    GEOCODE_TTL, ROUTE_TTL, MapsCache, geocode_key, normalize_location, route_key
+)
+from server.services.throttle import TokenBucket
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+# Shared by every MapsService in the process.
+maps_cache = MapsCache()
+_matrix_bucket = None
+
+
+def get_matrix_bucket():
+    """Process-wide elements-per-second budget for Distance Matrix calls."""
+    global _matrix_bucket
+    if _matrix_bucket is None:
+        with _clients_lock:
+            if _matrix_bucket is None:
+                _matrix_bucket = TokenBucket(
+                    current_app.config.get('MAPS_MATRIX_ELEMENTS_PER_SECOND', 1000)
+                )
+    return _matrix_bucket
+
+
+def get_client(api_key, timeout=5, retry_timeout=10):
+    """Return the process-wide googlemaps.Client for ``api_key``.
+
+    googlemaps.Client holds a requests.Session, so reusing it keeps the
+    connection pool warm instead of paying a TLS handshake per service.
+    ``timeout`` bounds each HTTP call and ``retry_timeout`` the client's own
+    retry loop, so a hung upstream cannot pin a worker thread forever.
+    """
+    client = _clients.get(api_key)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(api_key)
+            if client is None:
+                client = _clients[api_key] = googlemaps.Client(
+                    key=api_key, timeout=timeout, retry_timeout=retry_timeout
+                )
+    return client
+
 
 class MapsService:
-    def __init__(self):
-        self.client = googlemaps.Client(key=current_app.config['GOOGLE_MAPS_API_KEY'])
-    
+    def __init__(self, client=None, cache=None, matrix_provider=None):
+        self.client = client or get_client(
+            current_app.config['GOOGLE_MAPS_API_KEY'],
+            timeout=current_app.config.get('MAPS_HTTP_TIMEOUT_SECONDS', 5),
+        )
+        self.cache = cache or maps_cache
+        self.matrix_provider = matrix_provider
+
+    def lookup_geocode(self, address):
+        """Geocode ``address``; upstream errors propagate to the caller."""
+        key = geocode_key(address)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return tuple(cached)
+
+        result = self.client.geocode(address)
+        if result:
+            location = result[0]['geometry']['location']
+            self.cache.set(key, [location['lat'], location['lng']], GEOCODE_TTL)
+            return location['lat'], location['lng']
+        return None, None
+
+    def lookup_route_metrics(self, origin, destination):
+        """(distance_m, duration_s) for one pair; upstream errors propagate."""
+        departure_time = datetime.now()
+        key = route_key(origin, destination, departure_time)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return tuple(cached)
+
+        matrix = self.client.distance_matrix(
+            origins=[origin],
+            destinations=[destination],
+            mode="driving",
+            departure_time=departure_time
+        )
+        if matrix['rows'][0]['elements'][0]['status'] == 'OK':
+            element = matrix['rows'][0]['elements'][0]
+            metrics = element['distance']['value'], element['duration']['value']
+            self.cache.set(key, list(metrics), ROUTE_TTL)
+            return metrics
+        return None, None
+
     def geocode(self, address):
         try:
-            result = self.client.geocode(address)
-            if result:
-                location = result[0]['geometry']['location']
-                return location['lat'], location['lng']
-            return None, None
+            return self.lookup_geocode(address)
         except Exception as e:
             current_app.logger.error(f"Geocoding failed: {str(e)}")
             return None, None
 
     def get_route_metrics(self, origin, destination):
         try:
-            matrix = self.client.distance_matrix(
-                origins=[origin],
-                destinations=[destination],
-                mode="driving",
-                departure_time=datetime.now()
-            )
-            if matrix['rows'][0]['elements'][0]['status'] == 'OK':
-                element = matrix['rows'][0]['elements'][0]
-                return element['distance']['value'], element['duration']['value']
-            return None, None
+            return self.lookup_route_metrics(origin, destination)
         except Exception as e:
             current_app.logger.error(f"Route metrics failed: {str(e)}")
             return None, None
-    
+
+    def get_route_metrics_batch(self, pairs):
+        """Route metrics for many (origin, destination) pairs at once.
+
+        Returns a list aligned with ``pairs`` of ``(distance_m, duration_s)``
+        or ``(None, None)``. Cached pairs are answered locally; the rest are
+        deduplicated and fetched as concurrent, rate-limited matrix tiles.
+        """
+        departure_time = datetime.now()
+        pairs = list(pairs)
+        keys = [route_key(o, d, departure_time) for o, d in pairs]
+
+        results = {}
+        missing = []
+        for pair, key in zip(pairs, keys):
+            if key in results:
+                continue
+            cached = self.cache.get(key)
+            if cached is not None:
+                results[key] = tuple(cached)
+            else:
+                results[key] = (None, None)
+                missing.append(pair)
+
+        if missing:
+            provider = self.matrix_provider or GoogleMatrixProvider(
+                self.client, departure_time=departure_time
+            )
+            batcher = DistanceMatrixBatcher(
+                provider,
+                max_workers=current_app.config.get('MAPS_MATRIX_WORKERS', 4),
+                bucket=get_matrix_bucket(),
+            )
+            try:
+                resolved = batcher.resolve(missing)
+            except Exception as e:
+                current_app.logger.error(f"Batch route metrics failed: {str(e)}")
+                resolved = {}
+
+            for origin, destination in missing:
+                metrics = resolved.get((normalize_location(origin), normalize_location(destination)))
+                if metrics is not None:
+                    key = route_key(origin, destination, departure_time)
+                    results[key] = metrics
+                    self.cache.set(key, list(metrics), ROUTE_TTL)
+
+        return [results[key] for key in keys]
+
+    def cache_stats(self):
+        return self.cache.stats()
+
     def calculate_delivery_cost(self, distance_meters, weight_category):
         weight_pricing = {
             'light': 5.00,
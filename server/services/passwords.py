@@ -0,0 +1,136 @@
+"""bcrypt password hashing with a calibrated work factor and optional offloading.
+
+The cost factor (log2 rounds) is picked per process: one hash is timed at
+``PASSWORD_HASH_MIN_ROUNDS``. The factor whose time is closest to
+``PASSWORD_HASH_TARGET_SECONDS`` is used, clamped to the min/max rounds.
+``BCRYPT_LOG_ROUNDS`` pins it instead. A stored hash with a different
+factor still verifies; ``needs_rehash`` tells the caller to re-hash it
+with the current factor after a successful login. Workers calibrating
+near a doubling boundary can disagree by one round, so a hash within
+``REHASH_SLACK`` rounds of the current factor is kept as it is.
+
+``PASSWORD_HASH_WORKERS > 0`` runs hashing in a process pool of that size.
+Login bursts then use at most that many cores, and request threads only
+wait, so the other endpoints keep running. At most
+``PASSWORD_HASH_MAX_PENDING`` calls may queue; past that, ``HasherBusy``
+is raised and the route answers 503 instead of piling up.
+"""
+import math
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+import bcrypt
+
+TARGET_SECONDS = 0.1
+MIN_ROUNDS = 10
+MAX_ROUNDS = 15
+MAX_PENDING = 64
+REHASH_SLACK = 1
+
+
+class HasherBusy(Exception):
+    """Too many password hashes are already queued."""
+
+
+def _hashpw(password, rounds):
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds=rounds)).decode('utf-8')
+
+
+def _checkpw(password, hashed):
+    try:
+        return bcrypt.checkpw(password, hashed)
+    except ValueError:  # not a bcrypt hash
+        return False
+
+
+def hash_rounds(hashed):
+    """Cost factor stored in a ``$2b$NN$...`` hash, or None if it is not bcrypt."""
+    try:
+        return int(hashed.split('$')[2])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+
+def calibrate(target_seconds, min_rounds=MIN_ROUNDS, max_rounds=MAX_ROUNDS):
+    """Cost factor whose hash time is closest to ``target_seconds`` on this machine."""
+    began = time.perf_counter()
+    _hashpw(b'calibration', min_rounds)
+    elapsed = max(time.perf_counter() - began, 1e-6)
+    # Each extra round doubles the work.
+    rounds = min_rounds + round(math.log2(max(target_seconds, 1e-6) / elapsed))
+    return max(min_rounds, min(max_rounds, rounds))
+
+
+class PasswordHasher:
+    """Process-wide bcrypt front end configured from the app config."""
+
+    def __init__(self, app=None):
+        self.target_seconds = TARGET_SECONDS
+        self.min_rounds, self.max_rounds = MIN_ROUNDS, MAX_ROUNDS
+        self.workers = 0
+        self._rounds = None
+        self._pool = None
+        self._slots = threading.BoundedSemaphore(MAX_PENDING)
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        config = app.config
+        self.target_seconds = config.setdefault('PASSWORD_HASH_TARGET_SECONDS', TARGET_SECONDS)
+        self.min_rounds = config.setdefault('PASSWORD_HASH_MIN_ROUNDS', MIN_ROUNDS)
+        self.max_rounds = config.setdefault('PASSWORD_HASH_MAX_ROUNDS', MAX_ROUNDS)
+        self.workers = config.setdefault('PASSWORD_HASH_WORKERS', 0)
+        self._slots = threading.BoundedSemaphore(
+            config.setdefault('PASSWORD_HASH_MAX_PENDING', MAX_PENDING)
+        )
+        self._rounds = config.get('BCRYPT_LOG_ROUNDS')
+        self.shutdown()
+
+    @property
+    def rounds(self):
+        """Cost factor for new hashes (calibrated on first use)."""
+        if self._rounds is None:
+            with self._lock:
+                if self._rounds is None:
+                    self._rounds = calibrate(self.target_seconds, self.min_rounds, self.max_rounds)
+        return self._rounds
+
+    def _executor(self):
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    # Not fork: the parent has threads (and a DB pool) that must not be copied.
+                    self._pool = ProcessPoolExecutor(
+                        max_workers=self.workers, mp_context=multiprocessing.get_context('spawn')
+                    )
+        return self._pool
+
+    def _run(self, fn, *args):
+        if not self.workers:
+            return fn(*args)
+        if not self._slots.acquire(blocking=False):
+            raise HasherBusy("Password hashing queue is full")
+        try:
+            return self._executor().submit(fn, *args).result()
+        finally:
+            self._slots.release()
+
+    def hash(self, password):
+        """bcrypt hash (str) of ``password`` at the current cost factor."""
+        return self._run(_hashpw, password.encode('utf-8'), self.rounds)
+
+    def verify(self, hashed, password):
+        return self._run(_checkpw, password.encode('utf-8'), hashed.encode('utf-8'))
+
+    def needs_rehash(self, hashed):
+        """Whether ``hashed`` is not bcrypt or its cost factor is off by more than ``REHASH_SLACK``."""
+        rounds = hash_rounds(hashed)
+        return rounds is None or abs(rounds - self.rounds) > REHASH_SLACK
+
+    def shutdown(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,265 @@
+"""Stop ordering for one courier's manifest.
+
+A manifest is the courier's open parcels: a pending parcel is a pickup that
+must come before its delivery, and a parcel already on board is a delivery
+only. Ordering the stops is an open travelling-salesman path with
+precedence constraints, solved in three steps:
+
+1. Matrix: travel times between every pair of distinct stop locations via
+   ``Router.route_many``, i.e. one batched Distance Matrix lookup through
+   MapsService and its cache, with the offline estimator for anything the
+   provider cannot answer. Road times are asymmetric and so is all below.
+2. Nearest neighbour: from the courier's position, always drive to the
+   closest stop whose pickup (if any) is already done.
+3. Improve: 2-opt segment reversals and or-opt moves of one to three
+   consecutive stops, keeping only orders in which every pickup still
+   precedes its delivery, until nothing improves or the time budget is spent.
+
+Plans are cached in ``plan_cache`` under a key that covers every field the
+plan depends on, so any change to one of the parcels misses the cache.
+"""
+import hashlib
+import time
+from collections import namedtuple
+from server.services.maps_cache import LRUCache, normalize_location
+from server.services.routing import HaversineRoutingProvider, Router
+
+Stop = namedtuple('Stop', ['parcel_id', 'kind', 'lat', 'lng'])
+# ``legs`` holds (distance_m, duration_s) from the previous stop (or the start) to each stop.
+RoutePlan = namedtuple('RoutePlan', ['stops', 'legs', 'distance_m', 'duration_s'])
+
+PICKUP, DELIVERY = 'pickup', 'delivery'
+IMPROVE_SECONDS = 0.5
+OR_OPT_LENGTHS = (1, 2, 3)
+PLAN_TTL = 3600
+EPSILON = 1e-6
+
+plan_cache = LRUCache(maxsize=1024)
+_estimator = HaversineRoutingProvider()
+
+
+def manifest_stops(parcels):
+    """Stops for parcel rows, plus the ids skipped for missing coordinates.
+
+    Rows need ``id``, ``status`` and the pickup/destination coordinates.
+    Pending parcels get a pickup and a delivery; any other open status means
+    the parcel is on board and only needs delivering.
+    """
+    stops, skipped = [], []
+    for row in parcels:
+        dest = (row.destination_latitude, row.destination_longitude)
+        pickup = (row.pick_up_latitude, row.pick_up_longitude)
+        needs_pickup = (row.status or 'pending') == 'pending'
+        if None in dest or (needs_pickup and None in pickup):
+            skipped.append(row.id)
+            continue
+        if needs_pickup:
+            stops.append(Stop(row.id, PICKUP, *pickup))
+        stops.append(Stop(row.id, DELIVERY, *dest))
+    return stops, skipped
+
+
+def plan_key(courier_id, start, parcels):
+    """Cache key for a manifest: the courier, the start and every planned field."""
+    digest = hashlib.sha1()
+    for row in sorted(parcels, key=lambda r: r.id):
+        digest.update(repr((
+            row.id, row.status, row.updated_at,
+            row.pick_up_latitude, row.pick_up_longitude,
+            row.destination_latitude, row.destination_longitude,
+        )).encode())
+    origin = normalize_location(start) if start is not None else '-'
+    return f"route_plan:{courier_id}:{origin}:{digest.hexdigest()}"
+
+
+def travel_matrix(points, router=None):
+    """``(distance, duration)`` matrices between ``points``, indexed like ``points``.
+
+    Points sharing a normalized location are looked up once, and only the
+    pairs between distinct locations go to the router.
+    """
+    router = router or Router()
+    index, unique = {}, []
+    slots = []
+    for point in points:
+        key = normalize_location(point)
+        if key not in index:
+            index[key] = len(unique)
+            unique.append(point)
+        slots.append(index[key])
+
+    size = len(unique)
+    pairs = [(unique[a], unique[b]) for a in range(size) for b in range(size) if a != b]
+    estimates = iter(router.route_many(pairs))
+    dist = [[0.0] * size for _ in range(size)]
+    dur = [[0.0] * size for _ in range(size)]
+    for a in range(size):
+        for b in range(size):
+            if a == b:
+                continue
+            estimate = next(estimates) or _estimator.route(unique[a], unique[b])
+            dist[a][b], dur[a][b] = estimate.distance_m, estimate.duration_s
+
+    return ([[dist[a][b] for b in slots] for a in slots],
+            [[dur[a][b] for b in slots] for a in slots])
+
+
+class _Tour:
+    """Open path over node indices; node 0 is the fixed start."""
+
+    def __init__(self, cost, pickup_of, delivery_of):
+        self.cost = cost
+        self.pickup_of = pickup_of
+        self.delivery_of = delivery_of
+        self.order = [0]
+        self.pos = [0] * len(cost)
+
+    def _reindex(self, lo=0, hi=None):
+        order, pos = self.order, self.pos
+        for k in range(lo, len(order) if hi is None else hi):
+            pos[order[k]] = k
+
+    def nearest_neighbour(self):
+        cost, pickup_of = self.cost, self.pickup_of
+        visited = [False] * len(cost)
+        visited[0] = True
+        current = 0
+        for _ in range(len(cost) - 1):
+            row = cost[current]
+            best = None
+            for v in range(1, len(cost)):
+                if visited[v] or (pickup_of[v] is not None and not visited[pickup_of[v]]):
+                    continue
+                if best is None or row[v] < row[best]:
+                    best = v
+            visited[best] = True
+            self.order.append(best)
+            current = best
+        self._reindex()
+
+    def two_opt(self, deadline):
+        """Reverse segments ``order[i..j]`` that shorten the path; True if any did."""
+        order, pos, cost, pickup_of = self.order, self.pos, self.cost, self.pickup_of
+        n = len(order)
+        improved = False
+        for i in range(1, n - 1):
+            if time.monotonic() > deadline:
+                break
+            a, first = order[i - 1], order[i]
+            forward = backward = 0.0
+            for j in range(i + 1, n):
+                u, v = order[j - 1], order[j]
+                pickup = pickup_of[v]
+                if pickup is not None and pos[pickup] >= i:
+                    break  # the reversal would put this delivery before its pickup
+                forward += cost[u][v]
+                backward += cost[v][u]
+                old = cost[a][first] + forward
+                new = cost[a][v] + backward
+                if j + 1 < n:
+                    b = order[j + 1]
+                    old += cost[v][b]
+                    new += cost[first][b]
+                if new < old - EPSILON:
+                    order[i:j + 1] = order[i:j + 1][::-1]
+                    self._reindex(i, j + 1)
+                    improved = True
+                    break
+        return improved
+
+    def or_opt(self, deadline):
+        """Move runs of 1-3 stops to a cheaper feasible place; True if any moved."""
+        order, pos, cost = self.order, self.pos, self.cost
+        n = len(order)
+        improved = False
+        for length in OR_OPT_LENGTHS:
+            i = 1
+            while i + length <= n:
+                if time.monotonic() > deadline:
+                    return improved
+                segment = order[i:i + length]
+                head, tail = segment[0], segment[-1]
+                prev = order[i - 1]
+                after = order[i + length] if i + length < n else None
+                saved = cost[prev][head]
+                if after is not None:
+                    saved += cost[tail][after] - cost[prev][after]
+
+                # Insert after order[k]; stay after outside pickups, before outside deliveries.
+                lo, hi = 0, n - 1
+                for s in segment:
+                    pickup, delivery = self.pickup_of[s], self.delivery_of[s]
+                    if pickup is not None and pos[pickup] < i:
+                        lo = max(lo, pos[pickup])
+                    if delivery is not None and pos[delivery] >= i + length:
+                        hi = min(hi, pos[delivery] - 1)
+
+                best, best_k = saved - EPSILON, None
+                for k in range(lo, hi + 1):
+                    if i - 1 <= k < i + length:
+                        continue
+                    a = order[k]
+                    added = cost[a][head]
+                    if k + 1 < n:
+                        b = order[k + 1]
+                        added += cost[tail][b] - cost[a][b]
+                    if added < best:
+                        best, best_k = added, k
+
+                if best_k is None:
+                    i += 1
+                    continue
+                rest = order[:i] + order[i + length:]
+                at = best_k + 1 if best_k < i else best_k + 1 - length
+                order[:] = rest[:at] + segment + rest[at:]
+                self._reindex()
+                improved = True
+        return improved
+
+    def improve(self, seconds):
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            changed = self.two_opt(deadline)
+            changed = self.or_opt(deadline) or changed
+            if not changed:
+                break
+
+
+def plan_route(stops, start=None, router=None, improve_seconds=IMPROVE_SECONDS):
+    """Order ``stops`` into a RoutePlan that keeps each pickup before its delivery.
+
+    ``start`` is the courier's ``(lat, lng)``; without it the route may begin
+    at any stop. Travel time is what gets minimised; the plan reports the
+    distance of the chosen order alongside it.
+    """
+    stops = list(stops)
+    if not stops:
+        return RoutePlan([], [], 0, 0)
+    points = [(s.lat, s.lng) for s in stops]
+    if start is not None:
+        points.insert(0, tuple(start))
+    dist, dur = travel_matrix(points, router)
+    if start is None:
+        # A free start: node 0 is a zero-cost depot in front of every stop.
+        dist = [[0.0] * (len(stops) + 1)] + [[0.0] + row for row in dist]
+        dur = [[0.0] * (len(stops) + 1)] + [[0.0] + row for row in dur]
+
+    size = len(stops) + 1
+    pickup_of, delivery_of = [None] * size, [None] * size
+    pickups = {s.parcel_id: node for node, s in enumerate(stops, 1) if s.kind == PICKUP}
+    for node, s in enumerate(stops, 1):
+        if s.kind == DELIVERY and s.parcel_id in pickups:
+            pickup_of[node] = pickups[s.parcel_id]
+            delivery_of[pickups[s.parcel_id]] = node
+
+    tour = _Tour(dur, pickup_of, delivery_of)
+    tour.nearest_neighbour()
+    tour.improve(improve_seconds)
+
+    legs = [(dist[a][b], dur[a][b]) for a, b in zip(tour.order, tour.order[1:])]
+    return RoutePlan(
+        [stops[node - 1] for node in tour.order[1:]],
+        legs,
+        sum(d for d, _ in legs),
+        sum(t for _, t in legs),
+    )
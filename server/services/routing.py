@@ -0,0 +1,240 @@
+"""Routing providers with deadlines, a circuit breaker and an offline fallback.
+
+``Router.route`` asks the primary provider (Google, through MapsService and
+its cache) under a per-call deadline. Failures and timeouts are counted by
+a circuit breaker; once it opens, calls go straight to the offline
+great-circle estimator until a trial call succeeds again. The caller gets
+an answer within roughly one deadline whatever the upstream does.
+"""
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from flask import current_app
+from server.quotas import charge_upstream
+from server.services.geo import as_point, haversine_m
+
+RouteEstimate = namedtuple('RouteEstimate', ['distance_m', 'duration_s', 'source'])
+
+
+class RoutingError(Exception):
+    """The provider could not answer (network error, timeout, no result)."""
+
+
+class HaversineRoutingProvider:
+    """Offline estimator: great-circle distance times a road detour factor.
+
+    Only coordinates can be estimated; street addresses raise RoutingError.
+    """
+
+    name = 'estimate'
+
+    def __init__(self, detour_factor=1.3, speed_kmh=30.0):
+        self.detour_factor = detour_factor
+        self.speed_mps = speed_kmh * 1000 / 3600
+
+    def route(self, origin, destination):
+        try:
+            meters = haversine_m(as_point(origin), as_point(destination)) * self.detour_factor
+        except (TypeError, ValueError, KeyError) as e:
+            raise RoutingError(f"Cannot estimate route without coordinates: {e}") from e
+        return RouteEstimate(int(round(meters)), int(round(meters / self.speed_mps)), self.name)
+
+
+class GoogleRoutingProvider:
+    """Google Distance Matrix through MapsService (shared client + cache)."""
+
+    name = 'google'
+
+    def __init__(self, maps_service_factory):
+        self.maps_service_factory = maps_service_factory
+
+    def route(self, origin, destination):
+        distance, duration = self.maps_service_factory().lookup_route_metrics(origin, destination)
+        if distance is None:
+            raise RoutingError("No route found")
+        return RouteEstimate(distance, duration, self.name)
+
+    def route_many(self, pairs):
+        """One batched Distance Matrix lookup; unanswered pairs come back as None."""
+        metrics = self.maps_service_factory().get_route_metrics_batch(pairs)
+        return [
+            RouteEstimate(distance, duration, self.name) if distance is not None else None
+            for distance, duration in metrics
+        ]
+
+
+class FakeRoutingProvider:
+    """Test double with scriptable latency and failures."""
+
+    name = 'fake'
+
+    def __init__(self, latency=0.0, fail=False, distance_m=1000, duration_s=120):
+        self.latency = latency
+        self.fail = fail
+        self.distance_m = distance_m
+        self.duration_s = duration_s
+        self.calls = 0
+
+    def route(self, origin, destination):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if self.fail:
+            raise RoutingError("fake provider failure")
+        return RouteEstimate(self.distance_m, self.duration_s, self.name)
+
+    def route_many(self, pairs):
+        return [self.route(origin, destination) for origin, destination in pairs]
+
+
+class CircuitBreaker:
+    """Closed -> open after N consecutive failures -> half-open after a cool-down."""
+
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self._opened_at is None:
+            return self.CLOSED
+        if time.monotonic() - self._opened_at >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def allow(self):
+        """Whether the next call may go to the protected provider."""
+        with self._lock:
+            state = self.state
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial_in_flight or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+            self._trial_in_flight = False
+
+
+# Upstream calls run here so a request thread can stop waiting at the deadline.
+_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix='routing')
+
+
+class Router:
+    """Primary provider guarded by a deadline and breaker, with a fallback."""
+
+    def __init__(self, primary=None, fallback=None, breaker=None, deadline=2.0, batch_deadline=10.0):
+        self.primary = primary
+        self.fallback = fallback or HaversineRoutingProvider()
+        self.breaker = breaker or CircuitBreaker()
+        self.deadline = deadline
+        self.batch_deadline = batch_deadline
+
+    def _call_primary(self, origin, destination):
+        return self._with_deadline(self.primary.route, (origin, destination), self.deadline)
+
+    def _with_deadline(self, fn, args, deadline):
+        app = current_app._get_current_object()
+
+        def task():
+            with app.app_context():
+                return fn(*args)
+
+        future = _executor.submit(task)
+        try:
+            return future.result(timeout=deadline)
+        except FutureTimeout as e:
+            future.cancel()
+            raise RoutingError(f"{self.primary.name} exceeded {deadline}s deadline") from e
+
+    def route(self, origin, destination):
+        """Best available RouteEstimate, or None when nobody can answer."""
+        if self.primary is not None and self.breaker.allow():
+            try:
+                estimate = self._call_primary(origin, destination)
+                self.breaker.record_success()
+                charge_upstream()
+                return estimate
+            except Exception as e:
+                self.breaker.record_failure()
+                current_app.logger.warning(f"Routing via {self.primary.name} failed: {str(e)}")
+
+        try:
+            return self.fallback.route(origin, destination)
+        except RoutingError:
+            return None
+
+    def route_many(self, pairs):
+        """RouteEstimates (or None) aligned with ``pairs``.
+
+        The primary gets the whole batch as one call (batched and
+        concurrent when it supports ``route_many``) under ``batch_deadline``
+        and the same breaker; pairs it cannot answer use the fallback.
+        """
+        pairs = list(pairs)
+        results = [None] * len(pairs)
+        route_many = getattr(self.primary, 'route_many', None)
+        if pairs and route_many is not None and self.breaker.allow():
+            try:
+                results = list(self._with_deadline(route_many, (pairs,), self.batch_deadline))
+                self.breaker.record_success()
+                charge_upstream(sum(result is not None for result in results))
+            except Exception as e:
+                self.breaker.record_failure()
+                current_app.logger.warning(f"Batch routing via {self.primary.name} failed: {str(e)}")
+
+        for i, (origin, destination) in enumerate(pairs):
+            if results[i] is None:
+                try:
+                    results[i] = self.fallback.route(origin, destination)
+                except RoutingError:
+                    pass
+        return results
+
+
+_router = None
+_router_lock = threading.Lock()
+
+
+def get_router():
+    """Process-wide Router built from the app config.
+
+    Without GOOGLE_MAPS_API_KEY only the offline estimator is used.
+    """
+    global _router
+    if _router is None:
+        with _router_lock:
+            if _router is None:
+                config = current_app.config
+                primary = None
+                if config.get('GOOGLE_MAPS_API_KEY'):
+                    from server.services.maps_service import MapsService
+                    primary = GoogleRoutingProvider(MapsService)
+                _router = Router(
+                    primary=primary,
+                    breaker=CircuitBreaker(
+                        failure_threshold=config.get('MAPS_BREAKER_FAILURES', 5),
+                        reset_timeout=config.get('MAPS_BREAKER_RESET_SECONDS', 30),
+                    ),
+                    deadline=config.get('MAPS_DEADLINE_SECONDS', 2.0),
+                    batch_deadline=config.get('MAPS_BATCH_DEADLINE_SECONDS', 10.0),
+                )
+    return _router
@@ -1,44 +1,125 @@
 """SendGrid email service for secure backend email functionality."""
 import os
+import threading
 import requests
+from requests.adapters import HTTPAdapter
 from flask import current_app
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Union
+from server.services.email_templates import email_templates
+from server.services.throttle import TokenBucket
+
+DEFAULT_API_URL = 'https://api.sendgrid.com/v3/mail/send'
+# SendGrid accepts at most 1000 personalizations per /mail/send request.
+MAX_PERSONALIZATIONS = 1000
+
+_session = None
+_buckets = {}
+_lock = threading.Lock()
+
+
+def get_session(pool_size: int = 10) -> requests.Session:
+    """Process-wide keep-alive session, so each send skips the TCP+TLS handshake."""
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                _session = session
+    return _session
+
+
+def _get_bucket(rate: float) -> TokenBucket:
+    """Process-wide emails/sec budget shared by every SendGridService."""
+    with _lock:
+        bucket = _buckets.get(rate)
+        if bucket is None:
+            bucket = _buckets[rate] = TokenBucket(rate)
+        return bucket
+
 
 class SendGridService:
     """Secure SendGrid email service for backend."""
     
-    def __init__(self):
+    def __init__(self, base_url: str = None, timeout: float = None, max_emails_per_second: float = None):
         self.api_key = os.getenv('SENDGRID_API_KEY')
         self.from_email = os.getenv('SENDGRID_FROM_EMAIL', 'deliveroo.dispatch@gmail.com')
-        self.base_url = 'https://api.sendgrid.com/v3/mail/send'
+        self.base_url = base_url or os.getenv('SENDGRID_API_URL', DEFAULT_API_URL)
+        read_timeout = timeout or float(os.getenv('SENDGRID_TIMEOUT_SECONDS', 10))
+        self.timeout = (min(3.05, read_timeout), read_timeout)
+        self.session = get_session()
+        rate = max_emails_per_second or float(os.getenv('SENDGRID_MAX_EMAILS_PER_SECOND', 0))
+        self.bucket = _get_bucket(rate) if rate else None
         
         if not self.api_key:
             print("Warning: SENDGRID_API_KEY not found in environment variables")
     
     def send_email(self, to_email: str, subject: str, html_content: str, text_content: str = None) -> bool:
-        """Send email using SendGrid API."""
+        """Queue an email for delivery through SendGrid by the email worker."""
         if not self.api_key:
             print("Error: SendGrid API key not configured")
             return False
-        
+
+        from server.services.email_outbox import enqueue_email
+        enqueue_email(subject, [to_email], html_content, text_content, transport='sendgrid', commit=True)
+        return True
+
+    def deliver(self, to_email: str, subject: str, html_content: str, text_content: str = None) -> bool:
+        """Send email using SendGrid API (called from the email worker)."""
+        return self.send_bulk(subject, html_content, [to_email], text_content)[0]
+
+    def send_bulk(self, subject: str, html_content: str, recipients: List[Union[str, Dict]],
+                  text_content: str = None) -> List[bool]:
+        """Send one piece of content to many recipients in as few requests as possible.
+
+        Each recipient is an address or ``{'email': ..., 'substitutions': {...}}``;
+        substitution keys (e.g. ``-username-``) are replaced per recipient by
+        SendGrid. Recipients are packed 1000 to a request. Returns one
+        success flag per recipient, in order.
+        """
+        if not self.api_key:
+            print("Error: SendGrid API key not configured")
+            return [False] * len(recipients)
+
+        results = []
+        for i in range(0, len(recipients), MAX_PERSONALIZATIONS):
+            chunk = recipients[i:i + MAX_PERSONALIZATIONS]
+            personalizations = []
+            for recipient in chunk:
+                if isinstance(recipient, str):
+                    recipient = {'email': recipient}
+                personalization = {'to': [{'email': recipient['email']}]}
+                if recipient.get('substitutions'):
+                    personalization['substitutions'] = {
+                        k: str(v) for k, v in recipient['substitutions'].items()
+                    }
+                personalizations.append(personalization)
+
+            data = {
+                'personalizations': personalizations,
+                'from': {'email': self.from_email, 'name': 'Deliveroo Dispatch'},
+                'subject': subject,
+                'content': [{'type': 'text/html', 'value': html_content}]
+            }
+            # SendGrid expects text/plain before text/html.
+            if text_content:
+                data['content'].insert(0, {'type': 'text/plain', 'value': text_content})
+
+            results.extend([self._post(data, len(chunk))] * len(chunk))
+        return results
+
+    def _post(self, data: Dict, email_count: int) -> bool:
+        if self.bucket is not None:
+            self.bucket.acquire(email_count)
+
         headers = {
             'Authorization': f'Bearer {self.api_key}',
             'Content-Type': 'application/json'
         }
-        
-        data = {
-            'personalizations': [{'to': [{'email': to_email}]}],
-            'from': {'email': self.from_email, 'name': 'Deliveroo Dispatch'},
-            'subject': subject,
-            'content': [{'type': 'text/html', 'value': html_content}]
-        }
-        
-        # Add text content if provided
-        if text_content:
-            data['content'].append({'type': 'text/plain', 'value': text_content})
-        
         try:
-            response = requests.post(self.base_url, headers=headers, json=data)
+            response = self.session.post(self.base_url, headers=headers, json=data, timeout=self.timeout)
             success = response.status_code == 202
             
             if not success:
@@ -49,129 +130,20 @@ class SendGridService:
             print(f"SendGrid service error: {str(e)}")
             return False
     
+    def send_template(self, to_email: str, template: str, **context) -> bool:
+        """Render a precompiled template (HTML and text) and queue it."""
+        email = email_templates.render(template, **context)
+        return self.send_email(to_email, email.subject, email.html, email.text)
+
     def send_parcel_created_email(self, user_email: str, parcel_data: Dict, username: str) -> bool:
         """Send parcel created email."""
-        subject = f"Parcel #{parcel_data.get('id', 'N/A')} Created Successfully! 📦"
-        
-        html_content = f"""
-        <html>
-            <body style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto; padding: 20px;">
-                <div style="background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); color: white; padding: 20px; border-radius: 10px; text-align: center;">
-                    <h1 style="margin: 0;">🎉 Parcel Created!</h1>
-                    <p style="margin: 10px 0;">Hello {username}, your parcel has been successfully created!</p>
-                </div>
-                
-                <div style="background: #f8f9fa; padding: 20px; border-radius: 10px; margin-top: 20px;">
-                    <h2 style="color: #333; margin-top: 0;">📦 Parcel Details</h2>
-                    <table style="width: 100%; border-collapse: collapse;">
-                        <tr>
-                            <td style="padding: 8px; border-bottom: 1px solid #ddd;"><strong>Parcel ID:</strong></td>
-                            <td style="padding: 8px; border-bottom: 1px solid #ddd;">{parcel_data.get('id', 'N/A')}</td>
-                        </tr>
-                        <tr>
-                            <td style="padding: 8px; border-bottom: 1px solid #ddd;"><strong>Pickup Location:</strong></td>
-                            <td style="padding: 8px; border-bottom: 1px solid #ddd;">{parcel_data.get('pickup_location_text', 'N/A')}</td>
-                        </tr>
-                        <tr>
-                            <td style="padding: 8px; border-bottom: 1px solid #ddd;"><strong>Destination:</strong></td>
-                            <td style="padding: 8px; border-bottom: 1px solid #ddd;">{parcel_data.get('destination_location_text', 'N/A')}</td>
-                        </tr>
-                        <tr>
-                            <td style="padding: 8px; border-bottom: 1px solid #ddd;"><strong>Weight:</strong></td>
-                            <td style="padding: 8px; border-bottom: 1px solid #ddd;">{parcel_data.get('weight', 'N/A')} kg</td>
-                        </tr>
-                        <tr>
-                            <td style="padding: 8px; border-bottom: 1px solid #ddd;"><strong>Status:</strong></td>
-                            <td style="padding: 8px; border-bottom: 1px solid #ddd;">{parcel_data.get('status', 'pending')}</td>
-                        </tr>
-                    </table>
-                </div>
-                
-                <div style="text-align: center; margin-top: 20px;">
-                    <a href="{os.getenv('FRONTEND_URL', 'http://localhost:3000')}/track/{parcel_data.get('id', '')}" 
-                       style="background: #007bff; color: white; padding: 12px 24px; text-decoration: none; border-radius: 5px; display: inline-block;">
-                        🚚 Track Your Parcel
-                    </a>
-                </div>
-                
-                <div style="margin-top: 20px; padding: 15px; background: #e9ecef; border-radius: 5px; font-size: 14px; color: #666;">
-                    <p style="margin: 0;">Thank you for choosing Deliveroo! We'll keep you updated on your parcel's journey.</p>
-                </div>
-            </body>
-        </html>
-        """
-        
-        return self.send_email(user_email, subject, html_content)
+        return self.send_template(user_email, 'branded/parcel_created', parcel=parcel_data, username=username)
     
     def send_status_update_email(self, user_email: str, parcel_data: Dict, old_status: str, new_status: str) -> bool:
         """Send status update email."""
-        subject = f"Parcel #{parcel_data.get('id', 'N/A')} Status Updated! 📊"
-        
-        html_content = f"""
-        <html>
-            <body style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto; padding: 20px;">
-                <div style="background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); color: white; padding: 20px; border-radius: 10px; text-align: center;">
-                    <h1 style="margin: 0;">📊 Status Update!</h1>
-                    <p style="margin: 10px 0;">Your parcel status has been updated</p>
-                </div>
-                
-                <div style="background: #f8f9fa; padding: 20px; border-radius: 10px; margin-top: 20px;">
-                    <h2 style="color: #333; margin-top: 0;">📦 Parcel Details</h2>
-                    <table style="width: 100%; border-collapse: collapse;">
-                        <tr>
-                            <td style="padding: 8px; border-bottom: 1px solid #ddd;"><strong>Parcel ID:</strong></td>
-                            <td style="padding: 8px; border-bottom: 1px solid #ddd;">{parcel_data.get('id', 'N/A')}</td>
-                        </tr>
-                        <tr>
-                            <td style="padding: 8px; border-bottom: 1px solid #ddd;"><strong>Previous Status:</strong></td>
-                            <td style="padding: 8px; border-bottom: 1px solid #ddd;">{old_status}</td>
-                        </tr>
-                        <tr>
-                            <td style="padding: 8px; border-bottom: 1px solid #ddd;"><strong>New Status:</strong></td>
-                            <td style="padding: 8px; border-bottom: 1px solid #ddd; color: #28a745; font-weight: bold;">{new_status}</td>
-                        </tr>
-                    </table>
-                </div>
-                
-                <div style="text-align: center; margin-top: 20px;">
-                    <a href="{os.getenv('FRONTEND_URL', 'http://localhost:3000')}/track/{parcel_data.get('id', '')}" 
-                       style="background: #007bff; color: white; padding: 12px 24px; text-decoration: none; border-radius: 5px; display: inline-block;">
-                        🚚 Track Your Parcel
-                    </a>
-                </div>
-            </body>
-        </html>
-        """
-        
-        return self.send_email(user_email, subject, html_content)
+        return self.send_template(user_email, 'branded/status_update', parcel=parcel_data,
+                                  old_status=old_status, new_status=new_status)
     
     def send_test_email(self, user_email: str) -> bool:
         """Send test email."""
-        subject = "Test Email from Deliveroo 📧"
-        
-        html_content = f"""
-        <html>
-            <body style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto; padding: 20px;">
-                <div style="background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); color: white; padding: 20px; border-radius: 10px; text-align: center;">
-                    <h1 style="margin: 0;">✅ Test Email</h1>
-                    <p style="margin: 10px 0;">This is a test email from your Deliveroo application</p>
-                </div>
-                
-                <div style="background: #f8f9fa; padding: 20px; border-radius: 10px; margin-top: 20px;">
-                    <h2 style="color: #333; margin-top: 0;">🎉 Email Configuration Working!</h2>
-                    <p>If you received this email, your SendGrid configuration is working correctly!</p>
-                    <ul style="color: #666;">
-                        <li>✅ SendGrid API connected</li>
-                        <li>✅ Email templates working</li>
-                        <li>✅ Backend email service active</li>
-                    </ul>
-                </div>
-                
-                <div style="margin-top: 20px; padding: 15px; background: #e9ecef; border-radius: 5px; font-size: 14px; color: #666;">
-                    <p style="margin: 0;">This is a test email sent at {os.getenv('FRONTEND_URL', 'http://localhost:3000')}</p>
-                </div>
-            </body>
-        </html>
-        """
-        
-        return self.send_email(user_email, subject, html_content) 
\ No newline at end of file
+        return self.send_template(user_email, 'branded/test')
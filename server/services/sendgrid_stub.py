@@ -0,0 +1,70 @@
+"""Local stand-in for the SendGrid /v3/mail/send endpoint.
+
+Used by the tests and ``server.benchmarks.bench_sendgrid`` so email
+throughput can be measured without network access or an API key.
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class SendGridStub:
+    """Threaded HTTP server that accepts mail/send calls and records them."""
+
+    def __init__(self, latency=0.0, status=202):
+        self.latency = latency
+        self.status = status
+        self.requests = []
+        self.connections = set()
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address
+        return f"http://{host}:{port}/v3/mail/send"
+
+    @property
+    def emails(self):
+        with self._lock:
+            return sum(len(r['personalizations']) for r in self.requests)
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # keep-alive, like the real API
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                with stub._lock:
+                    stub.requests.append(json.loads(body))
+                    stub.connections.add(self.client_address)
+                if stub.latency:
+                    time.sleep(stub.latency)
+                self.send_response(stub.status)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,33 @@
+"""Client-side throttling for calls to rate-limited upstream APIs."""
+import threading
+import time
+
+
+class TokenBucket:
+    """Blocking token bucket (thread-safe); callers decide what one token means."""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity or rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens=1):
+        """Block until ``tokens`` have been taken; more than ``capacity`` are taken in slices."""
+        while tokens > 0:
+            step = min(tokens, self.capacity)
+            self._take(step)
+            tokens -= step
+
+    def _take(self, tokens):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / self.rate
+            time.sleep(wait)
@@ -8,6 +8,10 @@ def client():
         'TESTING': True,
         'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:',
         'JWT_SECRET_KEY': 'test-secret',
+        'PARCEL_EVENTS_BACKEND': 'memory',
+        'RATELIMIT_STORAGE_URI': 'memory://',
+        'RATELIMIT_ROUTES': {},
+        'QUOTA_BACKEND': 'memory',
     })
 
     with app.app_context():
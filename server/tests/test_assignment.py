@@ -0,0 +1,85 @@
+"""Tests for the batch courier-assignment engine and endpoint."""
+import random
+from server.models import db, Parcel, ParcelHistory
+from server.services import assignment
+from server.services.assignment import Courier, Job, assign_couriers
+from server.tests.test_parcels import create_admin_user, create_normal_user, create_parcel, get_token
+
+
+def loads(result, jobs):
+    weights = {job.id: job.weight for job in jobs}
+    totals = {}
+    for job_id, (courier_id, _) in result.assignments.items():
+        totals[courier_id] = totals.get(courier_id, 0) + weights[job_id]
+    return totals
+
+
+def test_nearest_courier_wins_until_capacity_runs_out():
+    couriers = [Courier("west", 0.0, 0.0, 10), Courier("east", 0.0, 1.0, None)]
+    jobs = [Job(i, 0.0, 0.01 * i, 4) for i in range(4)]
+
+    result = assign_couriers(jobs, couriers)
+    assert loads(result, jobs)["west"] <= 10
+    assert [result.assignments[i][0] for i in range(2)] == ["west", "west"]
+    assert result.assignments[3][0] == "east"
+    assert result.unassigned == []
+
+
+def test_unreachable_or_oversized_parcels_are_reported():
+    couriers = [Courier(1, 0.0, 0.0, 5)]
+    jobs = [Job("far", 10.0, 10.0, 1), Job("heavy", 0.0, 0.0, 6), Job("ok", 0.0, 0.001, 2)]
+
+    result = assign_couriers(jobs, couriers, max_distance_m=50_000)
+    assert set(result.unassigned) == {"far", "heavy"}
+    assert result.assignments["ok"][0] == 1
+
+
+def test_improvement_beats_greedy_and_respects_capacity():
+    rng = random.Random(5)
+    couriers = [Courier(c, rng.uniform(-0.2, 0.2), rng.uniform(-0.2, 0.2), 60) for c in range(30)]
+    jobs = [Job(i, rng.uniform(-0.2, 0.2), rng.uniform(-0.2, 0.2), rng.uniform(1, 5)) for i in range(500)]
+
+    greedy = assign_couriers(jobs, couriers, candidates=6, improve_seconds=0)
+    improved = assign_couriers(jobs, couriers, candidates=6, improve_seconds=5)
+    assert improved.total_distance_m <= greedy.total_distance_m
+    assert len(improved.assignments) >= len(greedy.assignments)
+    assert max(loads(improved, jobs).values()) <= 60 + 1e-9
+
+
+def test_pure_python_fallback_matches_numpy(monkeypatch):
+    rng = random.Random(9)
+    couriers = [Courier(c, rng.uniform(-1, 1), rng.uniform(-1, 1), None) for c in range(20)]
+    jobs = [Job(i, rng.uniform(-1, 1), rng.uniform(-1, 1), 1) for i in range(100)]
+
+    fast = assign_couriers(jobs, couriers, workers=2)
+    monkeypatch.setattr(assignment, "np", None)
+    slow = assign_couriers(jobs, couriers)
+    assert {k: v[0] for k, v in fast.assignments.items()} == {k: v[0] for k, v in slow.assignments.items()}
+
+
+def test_assign_endpoint_writes_couriers_and_history(client):
+    admin = create_admin_user()
+    parcel = create_parcel(create_normal_user())
+    headers = {"Authorization": f"Bearer {get_token(client, admin)}"}
+    couriers = [{"id": 501, "lat": -1.29, "lng": 36.82, "capacity_kg": 50},
+                {"id": 502, "lat": -4.04, "lng": 39.67, "capacity_kg": 50}]
+
+    plan = client.post('/admin/parcels/assign', headers=headers,
+                       json={"couriers": couriers, "parcel_ids": [parcel.id], "dry_run": True})
+    assert plan.status_code == 200
+    assert plan.get_json()["assignments"][0]["courier_id"] == 501
+    assert db.session.get(Parcel, parcel.id).courier_id is None
+
+    response = client.post('/admin/parcels/assign', headers=headers,
+                           json={"couriers": couriers, "parcel_ids": [parcel.id]})
+    assert response.get_json()["assigned"] == 1
+    db.session.expire_all()
+    assert db.session.get(Parcel, parcel.id).courier_id == 501
+    history = ParcelHistory.query.filter_by(parcel_id=parcel.id, update_type="courier").one()
+    assert history.new_value == "501"
+
+    again = client.post('/admin/parcels/assign', headers=headers,
+                        json={"couriers": couriers, "parcel_ids": [parcel.id]})
+    assert again.get_json()["assigned"] == 0
+    assert client.post('/admin/parcels/assign', headers=headers,
+                       json={"couriers": [{"id": 1}]}).status_code == 400
@@ -1,8 +1,12 @@
 """Tests for authentication endpoints in Deliveroo app."""
+import time
 import pytest
 from flask_jwt_extended import decode_token
 from flask import json
-from server.config import blacklist
+from server.config import db, password_hasher, revocation_store
+from server.models import RevokedToken, User
+from server.revocation import DatabaseRevocationBackend, TokenRevocationStore
+from server.services.passwords import HasherBusy, PasswordHasher, calibrate, hash_rounds
 
 # ---- Fixtures ---- #
 
@@ -104,7 +108,7 @@ def test_logout_blacklists_token(client, fresh_user_data):
     })
 
     assert res.status_code == 200
-    assert jti in blacklist
+    assert revocation_store.is_revoked(jti)
 
     # Try accessing protected route again
     res = client.get('/profile', headers={
@@ -112,3 +116,96 @@ def test_logout_blacklists_token(client, fresh_user_data):
     })
 
     assert res.status_code == 401  
+
+
+def test_logout_is_seen_by_other_workers(client, fresh_user_data):
+    # A second store over the same table stands in for another gunicorn worker.
+    other_worker = TokenRevocationStore(client.application)
+
+    res = client.post('/signup', json=fresh_user_data)
+    token = res.get_json()["access_token"]
+    jti = decode_token(token)["jti"]
+    assert not other_worker.is_revoked(jti)
+
+    client.post('/logout', headers={"Authorization": f"Bearer {token}"})
+
+    other_worker.sync()
+    assert other_worker.is_revoked(jti)
+
+
+def test_revocations_expire_with_the_token(client):
+    store = TokenRevocationStore(client.application)
+    store.revoke("expired-jti", 1.0)
+
+    store.sync()
+    assert not store.is_revoked("expired-jti")
+    assert "expired-jti" not in store._revoked
+
+
+def test_revocation_purge_leaves_the_callers_session_alone(client, fresh_user_data):
+    backend = DatabaseRevocationBackend()
+    backend.add("purged-jti", 1.0)
+    pending = User(username=fresh_user_data["username"], email=fresh_user_data["email"],
+                   phone_number=fresh_user_data["phone_number"])
+    db.session.add(pending)
+
+    backend.purge(time.time())
+    db.session.rollback()
+    assert db.session.get(RevokedToken, "purged-jti") is None
+    assert User.query.filter_by(username=fresh_user_data["username"]).first() is None
+
+
+def test_login_by_email_rehashes_to_the_current_work_factor(client, fresh_user_data, monkeypatch):
+    client.post('/signup', json=fresh_user_data)
+    user = User.query.filter_by(username=fresh_user_data["username"]).one()
+    original = user._password
+    assert hash_rounds(original) == password_hasher.rounds
+
+    monkeypatch.setattr(password_hasher, "_rounds", 4)
+    res = client.post('/login', json={"username": fresh_user_data["email"],
+                                      "password": fresh_user_data["password"]})
+    assert res.status_code == 200
+    db.session.expire_all()
+    assert hash_rounds(db.session.get(User, user.id)._password) == 4
+
+    monkeypatch.undo()
+    assert client.post('/login', json={"username": fresh_user_data["username"],
+                                       "password": fresh_user_data["password"]}).status_code == 200
+    db.session.expire_all()
+    assert db.session.get(User, user.id)._password != original
+    assert hash_rounds(db.session.get(User, user.id)._password) == password_hasher.rounds
+
+
+def test_workers_one_round_apart_do_not_rehash_each_others_hashes():
+    low, high, higher = PasswordHasher(), PasswordHasher(), PasswordHasher()
+    low._rounds, high._rounds, higher._rounds = 4, 5, 6
+    low_hash, high_hash = low.hash("password123"), high.hash("password123")
+    assert not high.needs_rehash(low_hash) and not low.needs_rehash(high_hash)
+    assert higher.needs_rehash(low_hash)
+    assert low.needs_rehash("not-a-bcrypt-hash")
+
+
+def test_login_answers_503_when_hashing_is_saturated(client, fresh_user_data, monkeypatch):
+    client.post('/signup', json=fresh_user_data)
+
+    def busy(*args):
+        raise HasherBusy("full")
+    monkeypatch.setattr(password_hasher, "verify", busy)
+    res = client.post('/login', json={"username": fresh_user_data["username"],
+                                      "password": fresh_user_data["password"]})
+    assert res.status_code == 503 and res.headers["Retry-After"] == "1"
+
+
+def test_calibration_clamps_and_pool_hashes_match_inline():
+    assert calibrate(1e-9, min_rounds=4, max_rounds=6) == 4
+    assert calibrate(1e9, min_rounds=4, max_rounds=6) == 6
+
+    hasher = PasswordHasher()
+    hasher._rounds, hasher.workers = 4, 1
+    try:
+        hashed = hasher.hash("password123")
+        assert hash_rounds(hashed) == 4
+        assert hasher.verify(hashed, "password123") and not hasher.verify(hashed, "nope")
+        assert not hasher.verify("not-a-bcrypt-hash", "password123")
+    finally:
+        hasher.shutdown()
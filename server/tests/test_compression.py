@@ -0,0 +1,89 @@
+"""Tests for negotiated response compression."""
+import gzip
+import pytest
+from server import compression
+from server.tests.test_parcels import create_admin_user, create_normal_user, create_parcel, get_token
+
+
+def decode(response):
+    coding = response.headers.get("Content-Encoding")
+    if coding == "gzip":
+        return gzip.decompress(response.data)
+    if coding == "br":
+        return compression.brotli.decompress(response.data)
+    if coding == "zstd":
+        return compression.zstandard.ZstdDecompressor().decompressobj().decompress(response.data)
+    return response.data
+
+
+@pytest.fixture
+def admin_headers(client):
+    owner = create_normal_user()
+    for _ in range(20):
+        create_parcel(owner)
+    return {"Authorization": f"Bearer {get_token(client, create_admin_user())}"}
+
+
+def test_large_json_is_gzipped_and_small_bodies_are_not(client, admin_headers):
+    plain = client.get('/admin/parcels', headers=admin_headers)
+    zipped = client.get('/admin/parcels', headers=dict(admin_headers, **{"Accept-Encoding": "gzip"}))
+
+    assert "Content-Encoding" not in plain.headers
+    assert zipped.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in zipped.headers["Vary"]
+    assert decode(zipped) == plain.data
+    assert len(zipped.data) * 4 < len(plain.data)
+
+    small = client.get('/admin/stats', headers=dict(admin_headers, **{"Accept-Encoding": "gzip"}))
+    assert len(small.data) < compression.MIN_SIZE and "Content-Encoding" not in small.headers
+
+
+def test_negotiation_honours_q_values_and_prefers_stronger_codecs(client, admin_headers):
+    codings = compression.available_codings()
+    best = client.get('/admin/parcels', headers=dict(admin_headers, **{"Accept-Encoding": "gzip, br, zstd"}))
+    assert best.headers["Content-Encoding"] == codings[0]
+    assert decode(best) == client.get('/admin/parcels', headers=admin_headers).data
+
+    gzip_first = client.get('/admin/parcels',
+                            headers=dict(admin_headers, **{"Accept-Encoding": "br;q=0.5, zstd;q=0.5, gzip"}))
+    assert gzip_first.headers["Content-Encoding"] == "gzip"
+    refused = client.get('/admin/parcels', headers=dict(admin_headers, **{"Accept-Encoding": "gzip;q=0"}))
+    assert "Content-Encoding" not in refused.headers
+
+
+def test_streamed_exports_are_compressed_chunk_by_chunk(client, admin_headers):
+    plain = client.get('/admin/parcels?format=ndjson', headers=admin_headers)
+    for coding in compression.available_codings():
+        zipped = client.get('/admin/parcels?format=ndjson',
+                            headers=dict(admin_headers, **{"Accept-Encoding": coding}))
+        assert zipped.headers["Content-Encoding"] == coding
+        assert "Content-Length" not in zipped.headers
+        assert decode(zipped) == plain.data
+
+
+def test_compressed_etag_is_weak_and_still_revalidates(client, admin_headers):
+    headers = dict(admin_headers, **{"Accept-Encoding": "gzip"})
+    first = client.get('/admin/parcels', headers=headers)
+    assert first.headers["ETag"].startswith('W/"')
+
+    again = client.get('/admin/parcels', headers=dict(headers, **{"If-None-Match": first.headers["ETag"]}))
+    assert again.status_code == 304
+
+
+def test_swagger_spec_is_served_precompressed(client):
+    app = client.application
+    view = app.view_functions['flasgger.apispec_1']
+    calls = []
+
+    def counting_view(*args, **kwargs):
+        calls.append(1)
+        return view(*args, **kwargs)
+
+    app.view_functions['flasgger.apispec_1'] = counting_view
+    try:
+        first = client.get('/apispec_1.json', headers={"Accept-Encoding": "gzip"})
+        second = client.get('/apispec_1.json', headers={"Accept-Encoding": "gzip"})
+    finally:
+        app.view_functions['flasgger.apispec_1'] = view
+    assert second.headers["Content-Encoding"] == "gzip"
+    assert second.data == first.data and len(calls) == 1
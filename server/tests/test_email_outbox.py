@@ -0,0 +1,49 @@
+"""Tests for the transactional email outbox and its worker."""
+from server.models import db, EmailOutbox
+from server.services.email_outbox import DEAD, PENDING, SENT, OutboxWorker, enqueue_email
+from server.services.email_service import send_welcome_email
+
+
+def test_send_email_only_queues(client):
+    send_welcome_email("queued@deliveroo.com", "queued")
+
+    row = EmailOutbox.query.filter_by(recipient="queued@deliveroo.com").one()
+    assert row.status == PENDING
+    assert "queued" in row.html_body
+
+
+def test_rolled_back_change_queues_nothing(client):
+    enqueue_email("Never sent", ["ghost@deliveroo.com"], "<p>hi</p>")
+    db.session.rollback()
+
+    assert EmailOutbox.query.filter_by(recipient="ghost@deliveroo.com").count() == 0
+
+
+def test_worker_delivers_retries_and_dead_letters(client):
+    delivered = []
+
+    def flaky(messages):
+        results = {}
+        for m in messages:
+            if m['recipient'].startswith("bad"):
+                results[m['id']] = "mailbox unavailable"
+            else:
+                delivered.append(m['recipient'])
+                results[m['id']] = None
+        return results
+
+    enqueue_email("Hello", ["good@deliveroo.com", "bad@deliveroo.com"], "<p>hi</p>", commit=True)
+    worker = OutboxWorker(client.application, concurrency=2, max_attempts=2,
+                          base_backoff=0, transports={'smtp': flaky})
+
+    worker.run_once()
+    good = EmailOutbox.query.filter_by(recipient="good@deliveroo.com").one()
+    bad = EmailOutbox.query.filter_by(recipient="bad@deliveroo.com").one()
+    assert good.status == SENT
+    assert bad.status == PENDING and bad.attempts == 1
+
+    worker.run_once()
+    db.session.refresh(bad)
+    assert bad.status == DEAD
+    assert bad.last_error == "mailbox unavailable"
+    assert delivered.count("good@deliveroo.com") == 1
@@ -0,0 +1,54 @@
+"""Tests for the precompiled email templates."""
+from server.models import EmailOutbox
+from server.services.email_service import send_parcel_digests, send_status_update_email
+from server.services.email_templates import EmailTemplates, email_templates
+
+
+def test_every_template_renders_all_variants(client):
+    context = {
+        'parcel': {'id': 7, 'status': 'pending'}, 'username': 'amina', 'old_status': 'pending',
+        'new_status': 'in_transit', 'new_location': 'Thika', 'reset_token': 'tok', 'parcels': [],
+    }
+    for name in email_templates.names():
+        email = email_templates.render(name, **context)
+        assert email.subject and email.html.startswith('<html>') and email.text
+
+
+def test_html_is_escaped_but_text_and_subject_are_not(client):
+    email = email_templates.render(
+        'branded/parcel_created',
+        parcel={'id': 1, 'pickup_location_text': '<script>x</script>'}, username='Tom & Jerry'
+    )
+    assert '&lt;script&gt;' in email.html and '<script>' not in email.html
+    assert 'Tom &amp; Jerry' in email.html
+    assert 'Tom & Jerry' in email.text and '<script>x</script>' in email.text
+
+
+def test_frontend_url_is_read_once_at_load(client, monkeypatch):
+    templates = EmailTemplates(frontend_url='https://deliveroo.example/').load()
+    monkeypatch.setenv('FRONTEND_URL', 'https://changed.example')
+
+    email = templates.render('parcel_created', parcel={'id': 3})
+    assert 'https://deliveroo.example/track/3' in email.html
+    assert 'https://deliveroo.example/track/3' in email.text
+
+
+def test_senders_queue_html_and_text(client):
+    send_status_update_email("variants@deliveroo.com", {'id': 9}, 'pending', 'delivered')
+
+    row = EmailOutbox.query.filter_by(recipient="variants@deliveroo.com").one()
+    assert row.subject == "Parcel #9 Status Updated"
+    assert 'delivered' in row.html_body and 'delivered' in row.text_body
+
+
+def test_digests_render_in_one_batch(client):
+    send_parcel_digests([
+        ("digest1@deliveroo.com", "one", [{'id': 1, 'status': 'pending'}]),
+        ("digest2@deliveroo.com", "two", [{'id': 2, 'status': 'delivered'}, {'id': 3}]),
+    ])
+
+    first = EmailOutbox.query.filter_by(recipient="digest1@deliveroo.com").one()
+    second = EmailOutbox.query.filter_by(recipient="digest2@deliveroo.com").one()
+    assert first.subject.endswith("1 update")
+    assert second.subject.endswith("2 updates")
+    assert '#3' in second.text_body
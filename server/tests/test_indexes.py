@@ -0,0 +1,108 @@
+"""Query-plan tests for the indexes behind the hot parcel/history queries."""
+from datetime import datetime
+from sqlalchemy import text
+from server.models import db, Parcel, ParcelHistory, User
+from server.pagination import keyset_after
+
+
+def query_plan(query):
+    """Return SQLite's EXPLAIN QUERY PLAN for an ORM query as one string."""
+    sql = query.statement.compile(db.engine, compile_kwargs={"literal_binds": True})
+    rows = db.session.execute(text(f"EXPLAIN QUERY PLAN {sql}")).fetchall()
+    return " | ".join(row[-1] for row in rows)
+
+
+def test_my_parcels_uses_user_index(client):
+    plan = query_plan(
+        Parcel.query.filter_by(user_id=1).order_by(Parcel.created_at, Parcel.id).limit(11)
+    )
+    assert "ix_parcels_user_id_created_at" in plan
+    assert "TEMP B-TREE" not in plan
+
+
+def test_my_parcels_by_status_uses_composite_index(client):
+    plan = query_plan(
+        Parcel.query.filter_by(user_id=1, status="pending")
+        .order_by(Parcel.created_at, Parcel.id).limit(11)
+    )
+    assert "ix_parcels_user_id_status_created_at" in plan
+
+
+def test_admin_cursor_page_uses_created_at_index(client):
+    plan = query_plan(
+        Parcel.query.filter(keyset_after(Parcel.created_at, Parcel.id, datetime(2025, 1, 1), 10))
+        .order_by(Parcel.created_at, Parcel.id).limit(11)
+    )
+    assert "ix_parcels_created_at" in plan
+
+
+def test_courier_lookup_uses_courier_index(client):
+    plan = query_plan(Parcel.query.filter_by(courier_id=3))
+    assert "ix_parcels_courier_id" in plan
+
+
+def test_collection_etag_reads_newest_update_from_index(client):
+    plan = query_plan(db.session.query(db.func.max(Parcel.updated_at)).filter(Parcel.user_id == 1))
+    assert "COVERING INDEX ix_parcels_user_id_updated_at" in plan
+    plan = query_plan(db.session.query(db.func.max(Parcel.updated_at)))
+    assert "ix_parcels_updated_at" in plan
+
+
+def test_parcel_history_lookup_uses_parcel_index(client):
+    plan = query_plan(
+        ParcelHistory.query.filter_by(parcel_id=1).order_by(ParcelHistory.timestamp)
+    )
+    assert "ix_parcel_histories_parcel_id_timestamp" in plan
+    assert "TEMP B-TREE" not in plan
+
+
+def test_timestamps_are_taken_per_insert(client):
+    user = User(username="ts_user", email="ts_user@deliveroo.com", phone_number="0700000099")
+    user.password = "userpass123"
+    db.session.add(user)
+    db.session.commit()
+
+    first = Parcel(user_id=user.id, description="first")
+    db.session.add(first)
+    db.session.commit()
+    second = Parcel(user_id=user.id, description="second")
+    db.session.add(second)
+    db.session.commit()
+
+    assert second.created_at > first.created_at
+
+
+def test_parcel_timeline_uses_parcel_index_backwards(client):
+    plan = query_plan(
+        ParcelHistory.query.filter_by(parcel_id=1)
+        .order_by(ParcelHistory.timestamp.desc(), ParcelHistory.id.desc()).limit(51)
+    )
+    assert "ix_parcel_histories_parcel_id_timestamp" in plan
+    assert "TEMP B-TREE" not in plan
+
+
+def test_history_by_updater_and_type_use_their_indexes(client):
+    for column, index in ((ParcelHistory.updated_by, "ix_parcel_histories_updated_by_timestamp"),
+                          (ParcelHistory.update_type, "ix_parcel_histories_update_type_timestamp")):
+        plan = query_plan(
+            ParcelHistory.query.filter(column == 1)
+            .order_by(ParcelHistory.timestamp, ParcelHistory.id).limit(51)
+        )
+        assert index in plan
+        assert "TEMP B-TREE" not in plan
+
+
+def test_nearby_pickups_prune_by_geohash_index(client):
+    plan = query_plan(
+        Parcel.query.filter(Parcel.status == "pending",
+                            Parcel.pickup_geohash >= "kzf0m", Parcel.pickup_geohash < "kzf0m{")
+    )
+    assert "ix_parcels_status_pickup_geohash" in plan
+
+
+def test_login_lookup_uses_unique_indexes(client):
+    plan = query_plan(User.query.filter(
+        db.or_(User.username == "jane", User.email == "jane@example.com")
+    ))
+    assert "MULTI-INDEX OR" in plan
+    assert "SCAN users" not in plan
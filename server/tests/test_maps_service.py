@@ -0,0 +1,151 @@
+"""Tests for MapsService caching, batching and routing fallbacks."""
+import time
+from server.services.maps_cache import MapsCache, normalize_address, route_key
+from server.services.distance_matrix import GOOGLE_LIMITS, FakeMatrixProvider, plan_tiles
+from server.services.geo import bbox_around, geohash_cover, geohash_encode
+from server.services.maps_service import MapsService
+from server.services.routing import CircuitBreaker, FakeRoutingProvider, Router
+
+
+class FakeMapsClient:
+    """Stands in for googlemaps.Client and counts upstream calls."""
+
+    def __init__(self):
+        self.geocode_calls = 0
+        self.matrix_calls = 0
+
+    def geocode(self, address):
+        self.geocode_calls += 1
+        return [{'geometry': {'location': {'lat': -1.2921, 'lng': 36.8219}}}]
+
+    def distance_matrix(self, origins, destinations, **kwargs):
+        self.matrix_calls += 1
+        return {'rows': [{'elements': [{
+            'status': 'OK',
+            'distance': {'value': 480000},
+            'duration': {'value': 25200},
+        }]}]}
+
+
+def test_addresses_are_normalized():
+    assert normalize_address("  Moi Avenue ,Nairobi.  ") == normalize_address("moi avenue, nairobi")
+
+
+def test_route_keys_round_coordinates():
+    assert route_key((-1.29211, 36.82191), "Mombasa") == route_key((-1.29209, 36.82189), " mombasa ")
+
+
+def test_geocode_hits_memory_then_db(client):
+    fake = FakeMapsClient()
+    cache = MapsCache()
+    service = MapsService(client=fake, cache=cache)
+
+    assert service.geocode("Moi Avenue, Nairobi") == (-1.2921, 36.8219)
+    assert service.geocode("moi avenue,  nairobi") == (-1.2921, 36.8219)
+    assert fake.geocode_calls == 1
+
+    # A fresh process has an empty LRU but still finds the persisted entry.
+    cache.memory.clear()
+    assert service.geocode("Moi Avenue, Nairobi") == (-1.2921, 36.8219)
+    assert fake.geocode_calls == 1
+
+    stats = cache.stats()
+    assert stats["memory_hits"] == 1
+    assert stats["db_hits"] == 1
+    assert stats["misses"] == 1
+
+
+def test_route_metrics_are_cached(client):
+    fake = FakeMapsClient()
+    service = MapsService(client=fake, cache=MapsCache(persistent=False))
+
+    assert service.get_route_metrics("Nairobi", "Mombasa") == (480000, 25200)
+    assert service.get_route_metrics("nairobi", "mombasa") == (480000, 25200)
+    assert fake.matrix_calls == 1
+
+
+def test_plan_tiles_respects_limits_and_covers_every_pair():
+    pairs = [((i, 0), (j, 1)) for i in range(30) for j in range(7)]
+    pairs += [((100, 0), (200 + j, 1)) for j in range(60)]
+
+    tiles = plan_tiles(pairs)
+
+    covered = set()
+    for tile in tiles:
+        assert len(tile.origins) <= GOOGLE_LIMITS.max_origins
+        assert len(tile.destinations) <= GOOGLE_LIMITS.max_destinations
+        assert len(tile.origins) * len(tile.destinations) <= GOOGLE_LIMITS.max_elements
+        covered.update((o, d) for o in tile.origins for d in tile.destinations)
+    assert set(pairs) <= covered
+    assert len(tiles) < len(pairs) / 10
+
+
+def test_batch_route_metrics_dedupes_and_runs_tiles_concurrently(client):
+    provider = FakeMatrixProvider(latency=0.02)
+    service = MapsService(client=FakeMapsClient(), cache=MapsCache(persistent=False),
+                          matrix_provider=provider)
+    origins = [(-1.28 + i * 0.01, 36.8) for i in range(20)]
+    destinations = [(-4.04 + j * 0.01, 39.6) for j in range(20)]
+    pairs = [(o, d) for o in origins for d in destinations]
+
+    results = service.get_route_metrics_batch(pairs + pairs[:50])
+
+    assert len(results) == len(pairs) + 50
+    assert all(distance and duration for distance, duration in results)
+    assert results[:50] == results[-50:]
+    assert sum(len(o) * len(d) for o, d in provider.calls) == len(pairs)
+    assert len(provider.calls) == 4
+    assert provider.max_in_flight > 1
+
+    # Everything is cached now, so a second batch never reaches the provider.
+    service.get_route_metrics_batch(pairs)
+    assert len(provider.calls) == 4
+
+
+def test_breaker_opens_and_router_falls_back(client):
+    failing = FakeRoutingProvider(fail=True)
+    router = Router(primary=failing, breaker=CircuitBreaker(failure_threshold=2, reset_timeout=60))
+    nairobi, mombasa = (-1.2921, 36.8219), (-4.0435, 39.6682)
+
+    for _ in range(5):
+        estimate = router.route(nairobi, mombasa)
+        assert estimate.source == "estimate"
+        assert 400_000 < estimate.distance_m < 800_000
+
+    assert failing.calls == 2
+    assert router.breaker.state == CircuitBreaker.OPEN
+
+
+def test_router_deadline_bounds_slow_upstream(client):
+    slow = FakeRoutingProvider(latency=1.0)
+    router = Router(primary=slow, deadline=0.05)
+
+    start = time.perf_counter()
+    estimate = router.route((-1.2921, 36.8219), (-1.3, 36.9))
+
+    assert time.perf_counter() - start < 0.5
+    assert estimate.source == "estimate"
+
+
+def test_half_open_breaker_recovers(client):
+    provider = FakeRoutingProvider(fail=True)
+    router = Router(primary=provider, breaker=CircuitBreaker(failure_threshold=1, reset_timeout=0))
+    router.route((0, 0), (0, 1))
+
+    provider.fail = False
+    assert router.route((0, 0), (0, 1)).source == "fake"
+    assert router.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_geohash_cover_contains_every_point_in_the_box():
+    assert geohash_encode(57.64911, 10.40744, 11) == "u4pruydqqvj"
+    south, west, north, east = bbox_around(-1.2921, 36.8219, 3000)
+    cells = geohash_cover(south, west, north, east)
+    assert 0 < len(cells) <= 32
+    for lat in (south, -1.2921, north):
+        for lng in (west, 36.8219, east):
+            assert any(geohash_encode(lat, lng).startswith(c) for c in cells)
+
+    across = geohash_cover(-1, 179, 1, -179)
+    assert any(geohash_encode(0, 179.5).startswith(c) for c in across)
+    assert any(geohash_encode(0, -179.5).startswith(c) for c in across)
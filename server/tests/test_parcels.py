@@ -1,9 +1,17 @@
 """Tests for parcel-related endpoints in Deliveroo app."""
+import csv
+import io
+import json
 import sys
 import os
 from uuid import uuid4
-from server.models import db, User, Parcel, ParcelHistory
+from server.models import db, User, Parcel, ParcelCount, ParcelHistory, ParcelStat
 from server.app import app
+from server.authorization import token_versions
+from server.config import parcel_events
+from server.events import DatabaseEventBackend, ParcelEventBus
+from server.services.geo import geohash_encode
+from flask_jwt_extended import decode_token
 
 
 
@@ -158,3 +166,514 @@ def test_admin_can_view_parcel_history(client):
     assert response.status_code == 200
     data = response.get_json()
     assert any(h["parcel_id"] == parcel.id for h in data)
+
+
+def test_cursor_pagination_walks_every_parcel_once(client):
+    user = create_normal_user()
+    created = {create_parcel(user).id for _ in range(7)}
+    token = get_token(client, user)
+    headers = {"Authorization": f"Bearer {token}"}
+
+    seen = []
+    cursor = ""
+    while True:
+        response = client.get(f'/parcels?cursor={cursor}&per_page=3', headers=headers)
+        assert response.status_code == 200
+        body = response.get_json()
+        assert body["total"] == 7
+        seen.extend(p["id"] for p in body["parcels"])
+        cursor = body["next_cursor"]
+        if not cursor:
+            break
+
+    assert len(seen) == len(set(seen))
+    assert set(seen) == created
+
+
+def test_cursor_pagination_rejects_garbage_cursor(client):
+    user = create_normal_user()
+    token = get_token(client, user)
+
+    response = client.get('/parcels?cursor=not-a-cursor', headers={
+        "Authorization": f"Bearer {token}"
+    })
+    assert response.status_code == 400
+
+
+def test_parcel_counts_follow_status_changes(client):
+    admin = create_admin_user()
+    user = create_normal_user()
+    parcel = create_parcel(user)
+    create_parcel(user)
+    token = get_token(client, admin)
+
+    assert ParcelCount.total(user_id=user.id) == 2
+    assert ParcelCount.total(user_id=user.id, status="pending") == 2
+
+    client.patch(f'/admin/parcels/{parcel.id}/status',
+                 headers={"Authorization": f"Bearer {token}"},
+                 json={"status": "in-transit"})
+
+    assert ParcelCount.total(user_id=user.id) == 2
+    assert ParcelCount.total(user_id=user.id, status="pending") == 1
+    assert ParcelCount.total(user_id=user.id, status="in-transit") == 1
+
+    user_token = get_token(client, user)
+    response = client.get('/parcels?page=1&per_page=10&status=pending', headers={
+        "Authorization": f"Bearer {user_token}"
+    })
+    assert response.get_json()["total"] == 1
+
+
+def test_admin_stats_follow_orm_and_bulk_writes(client):
+    admin = create_admin_user()
+    user = create_normal_user()
+    admin_headers = {"Authorization": f"Bearer {get_token(client, admin)}"}
+    user_headers = {"Authorization": f"Bearer {get_token(client, user)}"}
+    ParcelStat.reconcile()
+    before = client.get('/admin/stats', headers=admin_headers).get_json()["totals"]
+
+    parcel = create_parcel(user)
+    create_parcel(user)
+    client.patch(f'/admin/parcels/{parcel.id}/status', headers=admin_headers, json={"status": "in-transit"})
+    client.post('/parcels/bulk', headers=user_headers, json=[
+        {"pickup_location_text": "Nairobi", "destination_location_text": "Nakuru", "weight": 2, "cost": 40},
+    ])
+    client.post('/admin/parcels/scan', headers=admin_headers,
+                json=[{"parcel_id": parcel.id, "status": "delivered"}])
+    client.patch(f'/parcels/{parcel.id + 1}/cancel', headers=user_headers)
+
+    body = client.get('/admin/stats', headers=admin_headers).get_json()
+    after = body["totals"]
+    assert after["count"] - before["count"] == 3
+    assert after["revenue"] - before["revenue"] == 790.0
+    assert after["weight_kg"] - before["weight_kg"] == 7.0
+    for status, added in (("delivered", 1), ("cancelled", 1), ("pending", 1)):
+        previous = before["by_status"].get(status, {"count": 0})["count"]
+        assert after["by_status"][status]["count"] - previous == added
+    assert body["by_day"][-1]["day"] == body["until"]
+    assert ParcelStat.reconcile() == 0
+
+    db.session.query(ParcelStat).filter_by(status="cancelled").update({"count": 99})
+    db.session.commit()
+    assert ParcelStat.reconcile() == 1
+    assert client.get('/admin/stats', headers=admin_headers).get_json()["totals"] == after
+    assert client.get('/admin/stats?since=2026-01-01&until=2025-01-01',
+                      headers=admin_headers).status_code == 400
+
+
+def test_count_rebuild_counts_null_status_as_pending(client):
+    user = create_normal_user()
+    parcel = create_parcel(user)
+    create_parcel(user)
+    user_id = user.id
+    db.session.query(Parcel).filter_by(id=parcel.id).update({"status": None})
+    db.session.commit()
+
+    ParcelCount.rebuild()
+    assert ParcelCount.total(user_id=user_id, status='pending') == 2
+
+    response = client.get('/parcels?status=pending', headers={
+        "Authorization": f"Bearer {get_token(client, db.session.get(User, user_id))}"
+    })
+    body = response.get_json()
+    assert len(body["parcels"]) == body["total"] == 2
+
+
+def test_stats_reconcile_counts_null_status_as_pending(client):
+    user = create_normal_user()
+    parcel = create_parcel(user)
+    create_parcel(user)
+    ParcelStat.reconcile()
+
+    db.session.query(Parcel).filter_by(id=parcel.id).update({"status": None})
+    db.session.commit()
+    assert ParcelStat.reconcile() == 0
+
+
+def test_parcel_etag_revalidates_without_loading_the_row(client):
+    admin = create_admin_user()
+    user = create_normal_user()
+    parcel = create_parcel(user)
+    headers = {"Authorization": f"Bearer {get_token(client, user)}"}
+    admin_headers = {"Authorization": f"Bearer {get_token(client, admin)}"}
+
+    first = client.get(f'/parcels/{parcel.id}', headers=headers)
+    etag = first.headers["ETag"]
+    assert first.status_code == 200 and first.get_json()["version"] == 1
+    again = client.get(f'/parcels/{parcel.id}', headers=dict(headers, **{"If-None-Match": etag}))
+    assert again.status_code == 304 and again.data == b"" and again.headers["ETag"] == etag
+    detail = client.get(f'/admin/parcels/{parcel.id}', headers=dict(admin_headers, Origin="https://app.example.com"))
+    assert detail.headers["ETag"] == etag and "ETag" in detail.headers["Access-Control-Expose-Headers"]
+    other = {"Authorization": f"Bearer {get_token(client, create_normal_user())}", "If-None-Match": etag}
+    assert client.get(f'/parcels/{parcel.id}', headers=other).status_code == 403
+
+    client.patch(f'/admin/parcels/{parcel.id}/status', headers=admin_headers, json={"status": "in-transit"})
+    changed = client.get(f'/parcels/{parcel.id}', headers=dict(headers, **{"If-None-Match": etag}))
+    assert changed.status_code == 200 and changed.get_json()["version"] == 2
+    client.post('/admin/parcels/scan', headers=admin_headers,
+                json=[{"parcel_id": parcel.id, "location": "Nakuru Hub"}])
+    scanned = client.get(f'/admin/parcels/{parcel.id}',
+                         headers=dict(admin_headers, **{"If-None-Match": changed.headers["ETag"]}))
+    assert scanned.status_code == 200 and scanned.get_json()["version"] == 3
+
+
+def test_parcel_list_etag_changes_with_the_collection(client):
+    user = create_normal_user()
+    create_parcel(user)
+    headers = {"Authorization": f"Bearer {get_token(client, user)}"}
+
+    first = client.get('/parcels?page=1', headers=headers)
+    etag = first.headers["ETag"]
+    conditional = dict(headers, **{"If-None-Match": etag})
+    assert client.get('/parcels?page=1', headers=conditional).status_code == 304
+    assert client.get('/parcels?page=2', headers=conditional).status_code == 200
+
+    create_parcel(user)
+    assert client.get('/parcels?page=1', headers=conditional).status_code == 200
+
+
+def test_admin_can_stream_parcels_as_ndjson(client):
+    admin = create_admin_user()
+    user = create_normal_user()
+    parcel = create_parcel(user)
+    token = get_token(client, admin)
+
+    response = client.get('/admin/parcels', headers={
+        "Authorization": f"Bearer {token}",
+        "Accept": "application/x-ndjson"
+    })
+
+    assert response.status_code == 200
+    assert response.mimetype == "application/x-ndjson"
+    lines = response.get_data(as_text=True).splitlines()
+    rows = [json.loads(line) for line in lines]
+    assert any(r["id"] == parcel.id for r in rows)
+
+
+def test_admin_can_export_histories_as_csv(client):
+    admin = create_admin_user()
+    user = create_normal_user()
+    parcel = create_parcel(user)
+    token = get_token(client, admin)
+    headers = {"Authorization": f"Bearer {token}"}
+
+    client.patch(f'/admin/parcels/{parcel.id}/status', headers=headers, json={"status": "in-transit"})
+
+    response = client.get('/admin/histories?format=csv', headers=headers)
+
+    assert response.status_code == 200
+    assert response.mimetype == "text/csv"
+    rows = list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+    assert any(r["parcel_id"] == str(parcel.id) and r["new_value"] == "in-transit" for r in rows)
+
+
+def test_admin_token_carries_role_claims(client):
+    admin = create_admin_user()
+    token = get_token(client, admin)
+
+    claims = decode_token(token)
+    assert claims["admin"] is True
+    assert claims["ver"] == admin.token_version
+
+
+def test_demoted_admin_token_stops_working(client):
+    admin = create_admin_user()
+    token = get_token(client, admin)
+    headers = {"Authorization": f"Bearer {token}"}
+    assert client.get('/admin/parcels', headers=headers).status_code == 200
+
+    admin.admin = False
+    db.session.commit()
+    token_versions.invalidate(admin.id)  # what the cache TTL does on other workers
+
+    assert client.get('/admin/parcels', headers=headers).status_code == 401
+
+
+def test_quote_and_create_use_offline_estimate_without_maps_key(client):
+    user = create_normal_user()
+    token = get_token(client, user)
+    headers = {"Authorization": f"Bearer {token}"}
+    payload = {
+        "pickup_location_text": "Nairobi",
+        "destination_location_text": "Mombasa",
+        "pick_up_latitude": -1.2921, "pick_up_longitude": 36.8219,
+        "destination_latitude": -4.0435, "destination_longitude": 39.6682,
+        "weight": 2,
+    }
+
+    quote = client.post('/parcels/quote', headers=headers, json=payload)
+    assert quote.status_code == 200
+    assert quote.get_json()["source"] == "estimate"
+    assert quote.get_json()["cost"] == 300
+
+    created = client.post('/parcels', headers=headers, json=payload)
+    assert created.status_code == 201
+    assert created.get_json()["distance"] == quote.get_json()["distance"]
+
+
+def test_bulk_create_reports_per_item_errors(client):
+    user = create_normal_user()
+    token = get_token(client, user)
+    base = {"pickupLocationText": " Nairobi ", "destination_location_text": "Nakuru",
+            "pickup_latitude": -1.2921, "pickup_longitude": 36.8219,
+            "destination_latitude": -0.3031, "destination_longitude": 36.0800}
+
+    response = client.post('/parcels/bulk', headers={"Authorization": f"Bearer {token}"}, json=[
+        dict(base, weight="2"),
+        {"pickup_location_text": "Nairobi"},
+        dict(base, user_id=999, colour="red"),
+        "not an object",
+        dict(base, status="in_transit", cost=10),
+    ])
+    assert response.status_code == 207
+    body = response.get_json()
+    assert (body["created"], body["failed"]) == (2, 3)
+    results = body["results"]
+    assert "destination_location_text" in results[1]["error"]
+    assert "colour" in results[2]["error"]
+    assert "object" in results[3]["error"]
+
+    first = db.session.get(Parcel, results[0]["id"])
+    assert first.user_id == user.id
+    assert first.pickup_location_text == "Nairobi"
+    assert first.cost == 300 and first.distance > 0
+    assert db.session.get(Parcel, results[4]["id"]).cost == 10
+    assert ParcelCount.total(user_id=user.id) == 2
+    assert ParcelCount.total(user_id=user.id, status="in_transit") == 1
+
+
+def test_bulk_create_accepts_ndjson(client):
+    user = create_normal_user()
+    token = get_token(client, user)
+    lines = [json.dumps({"pickup_location_text": "Nairobi", "destination_location_text": f"Stop {i}"})
+             for i in range(3)]
+    body = "\n".join(lines[:2] + ["{broken", "", lines[2]]) + "\n"
+
+    response = client.post('/parcels/bulk', data=body, content_type='application/x-ndjson',
+                           headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 207
+    results = response.get_json()["results"]
+    assert [("id" in r) for r in results] == [True, True, False, True]
+    assert "Invalid JSON" in results[2]["error"]
+    assert Parcel.query.filter_by(user_id=user.id).count() == 3
+
+
+def test_bulk_create_rejects_oversized_and_empty_batches(client):
+    user = create_normal_user()
+    token = get_token(client, user)
+    headers = {"Authorization": f"Bearer {token}"}
+    item = {"pickup_location_text": "A", "destination_location_text": "B"}
+
+    client.application.config['PARCEL_BULK_MAX_ITEMS'] = 2
+    try:
+        assert client.post('/parcels/bulk', headers=headers, json=[item] * 3).status_code == 400
+    finally:
+        client.application.config.pop('PARCEL_BULK_MAX_ITEMS')
+    assert client.post('/parcels/bulk', headers=headers, json=[]).status_code == 400
+    assert client.post('/parcels/bulk', headers=headers, json={"parcels": [item]}).status_code == 201
+
+
+def test_bulk_create_isolates_rows_the_database_rejects(client):
+    user = create_normal_user()
+    token = get_token(client, user)
+    item = {"pickup_location_text": "A", "destination_location_text": "B"}
+
+    response = client.post('/parcels/bulk', headers={"Authorization": f"Bearer {token}"},
+                           json=[item, dict(item, courier_id={"not": "bindable"}), item])
+    assert response.status_code == 207
+    results = response.get_json()["results"]
+    assert "Database rejected" in results[1]["error"]
+    assert Parcel.query.filter_by(user_id=user.id).count() == 2
+    assert ParcelCount.total(user_id=user.id) == 2
+
+
+def test_bulk_scan_applies_updates_and_reports_failures(client):
+    admin = create_admin_user()
+    user = create_normal_user()
+    first, second = create_parcel(user), create_parcel(user)
+    token = get_token(client, admin)
+
+    response = client.post('/admin/parcels/scan', headers={"Authorization": f"Bearer {token}"}, json=[
+        {"parcel_id": first.id, "status": "in-transit", "location": "Nakuru Hub", "lat": -0.30, "lng": 36.08},
+        {"parcel_id": 10**9, "status": "in-transit"},
+        {"parcel_id": second.id},
+        {"parcel_id": second.id, "location": "Kisumu Hub"},
+        {"parcel_id": first.id, "status": "delivered"},
+    ])
+    assert response.status_code == 207
+    body = response.get_json()
+    assert (body["updated"], body["failed"]) == (3, 2)
+    assert body["results"][1] == {"index": 1, "error": "Parcel not found", "code": 404}
+    assert body["results"][2]["code"] == 400
+
+    db.session.expire_all()
+    updated = db.session.get(Parcel, first.id)
+    assert (updated.status, updated.current_location) == ("delivered", "Nakuru Hub")
+    assert updated.current_location_latitude == -0.30
+    assert db.session.get(Parcel, second.id).current_location == "Kisumu Hub"
+
+    statuses = (ParcelHistory.query.filter_by(parcel_id=first.id, update_type="status")
+                .order_by(ParcelHistory.id).all())
+    assert [(h.old_value, h.new_value) for h in statuses] == [
+        ("pending", "in-transit"), ("in-transit", "delivered")
+    ]
+    assert ParcelCount.total(user_id=user.id, status="pending") == 1
+    assert ParcelCount.total(user_id=user.id, status="delivered") == 1
+
+
+def test_bulk_scan_requires_admin_and_a_list(client):
+    user = create_normal_user()
+    token = get_token(client, user)
+    assert client.post('/admin/parcels/scan', headers={"Authorization": f"Bearer {token}"},
+                       json=[]).status_code == 403
+
+    admin_token = get_token(client, create_admin_user())
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    assert client.post('/admin/parcels/scan', headers=headers, json={"parcel_id": 1}).status_code == 400
+    assert client.post('/admin/parcels/scan', headers=headers, json={"scans": []}).status_code == 400
+
+
+def test_parcel_event_stream_replays_and_pushes_updates(client):
+    admin = create_admin_user()
+    user = create_normal_user()
+    parcel = create_parcel(user)
+    admin_headers = {"Authorization": f"Bearer {get_token(client, admin)}"}
+    client.patch(f'/admin/parcels/{parcel.id}/status', headers=admin_headers, json={"status": "in-transit"})
+
+    token = get_token(client, user)
+    assert client.get(f'/parcels/{parcel.id}/events', headers={
+        "Authorization": f"Bearer {get_token(client, create_normal_user())}"
+    }).status_code == 403
+
+    response = client.get(f'/parcels/{parcel.id}/events', buffered=False, headers={
+        "Authorization": f"Bearer {token}", "Last-Event-ID": "0"
+    })
+    assert response.status_code == 200
+    assert response.mimetype == "text/event-stream"
+    chunks = iter(response.response)
+    assert next(chunks).startswith(b"retry:")
+    replayed = next(chunks).decode()
+    assert "event: status" in replayed and '"new_value":"in-transit"' in replayed
+
+    client.patch(f'/admin/parcels/{parcel.id}/location', headers=admin_headers,
+                 json={"current_location": "Nakuru Hub"})
+    live = next(chunks).decode()
+    assert "event: location" in live and '"new_value":"Nakuru Hub"' in live
+    response.close()
+    assert not parcel_events.has_subscribers()
+
+
+def test_user_event_stream_sends_heartbeats_and_cancellations(client):
+    user = create_normal_user()
+    parcel = create_parcel(user)
+    token = get_token(client, user)
+
+    heartbeat, parcel_events.heartbeat = parcel_events.heartbeat, 0.05
+    try:
+        response = client.get(f'/parcels/events?jwt={token}', buffered=False)
+        chunks = iter(response.response)
+        assert next(chunks).startswith(b"retry:")
+        assert next(chunks) == b": keep-alive\n\n"
+
+        client.patch(f'/parcels/{parcel.id}/cancel', headers={"Authorization": f"Bearer {token}"})
+        event = next(chunks).decode()
+        assert '"new_value":"cancelled"' in event and f'"parcel_id":{parcel.id}' in event
+        response.close()
+    finally:
+        parcel_events.heartbeat = heartbeat
+
+
+def test_database_poller_does_not_replay_rows_written_while_idle(client):
+    admin_headers = {"Authorization": f"Bearer {get_token(client, create_admin_user())}"}
+    user = create_normal_user()
+    parcel = create_parcel(user)
+    user_id, parcel_id = user.id, parcel.id
+    bus, poller = ParcelEventBus(), DatabaseEventBackend(client.application)
+
+    poller.poll(bus)
+    client.patch(f'/admin/parcels/{parcel_id}/status', headers=admin_headers, json={"status": "in-transit"})
+    poller.poll(bus)  # nobody subscribed yet
+    with bus.subscribe(user_id=user_id) as sub:
+        poller.poll(bus)
+        assert sub.get(timeout=0) is None
+
+        client.patch(f'/admin/parcels/{parcel_id}/location', headers=admin_headers,
+                     json={"current_location": "Nakuru Hub"})
+        poller.poll(bus)
+        event = sub.get(timeout=0)
+        assert event["update_type"] == "location" and event["new_value"] == "Nakuru Hub"
+        assert sub.get(timeout=0) is None
+
+
+def test_history_filters_and_keyset_pages(client):
+    admin = create_admin_user()
+    user = create_normal_user()
+    parcel, other = create_parcel(user), create_parcel(user)
+    headers = {"Authorization": f"Bearer {get_token(client, admin)}"}
+    for hub in ("A", "B", "C"):
+        client.patch(f'/admin/parcels/{parcel.id}/location', headers=headers, json={"current_location": hub})
+    client.patch(f'/admin/parcels/{parcel.id}/status', headers=headers, json={"status": "in-transit"})
+    client.patch(f'/admin/parcels/{other.id}/status', headers=headers, json={"status": "in-transit"})
+
+    response = client.get(f'/admin/histories?parcel_id={parcel.id}&update_type=location', headers=headers)
+    assert [h["new_value"] for h in response.get_json()] == ["A", "B", "C"]
+
+    seen, cursor = [], ""
+    while True:
+        body = client.get(f'/admin/histories?updated_by={admin.id}&cursor={cursor}&per_page=2',
+                          headers=headers).get_json()
+        seen.extend(h["id"] for h in body["histories"])
+        cursor = body["next_cursor"]
+        if not cursor:
+            break
+    assert len(seen) == 5 and seen == sorted(seen)
+
+    detail = client.get(f'/admin/histories/{seen[0]}', headers=headers)
+    assert detail.status_code == 200 and detail.get_json()["id"] == seen[0]
+    assert client.get('/admin/histories?since=yesterday', headers=headers).status_code == 400
+    assert client.get('/admin/histories?until=2000-01-01T00:00:00Z', headers=headers).get_json() == []
+
+
+def test_parcel_timeline_pages_newest_first(client):
+    admin = create_admin_user()
+    parcel = create_parcel(create_normal_user())
+    headers = {"Authorization": f"Bearer {get_token(client, admin)}"}
+    for hub in ("A", "B", "C"):
+        client.patch(f'/admin/parcels/{parcel.id}/location', headers=headers, json={"current_location": hub})
+
+    first = client.get(f'/admin/parcels/{parcel.id}/history?per_page=2', headers=headers).get_json()
+    assert [h["new_value"] for h in first["histories"]] == ["C", "B"]
+    rest = client.get(f'/admin/parcels/{parcel.id}/history?per_page=2&cursor={first["next_cursor"]}',
+                      headers=headers).get_json()
+    assert [h["new_value"] for h in rest["histories"]] == ["A"]
+    assert rest["next_cursor"] is None
+    assert client.get('/admin/parcels/999999/history', headers=headers).status_code == 404
+
+
+def test_nearby_and_bbox_queries_use_synced_geohashes(client):
+    admin = create_admin_user()
+    user = create_normal_user()
+    headers = {"Authorization": f"Bearer {get_token(client, admin)}"}
+    near = create_parcel(user)  # pickup and current location at Nairobi CBD
+    far = create_parcel(user)
+    far.pick_up_latitude, far.pick_up_longitude = -4.0435, 39.6682  # Mombasa
+    db.session.commit()
+    assert near.pickup_geohash == geohash_encode(-1.2921, 36.8219)
+    assert far.pickup_geohash == geohash_encode(-4.0435, 39.6682)
+
+    response = client.get('/admin/parcels/nearby?lat=-1.2864&lng=36.8172&radius_m=3000&status=pending',
+                          headers=headers)
+    assert response.status_code == 200
+    found = response.get_json()["parcels"]
+    assert near.id in [p["id"] for p in found] and far.id not in [p["id"] for p in found]
+    assert all(p["distance_m"] <= 3000 for p in found)
+
+    client.post('/admin/parcels/scan', headers=headers,
+                json=[{"parcel_id": near.id, "location": "Mombasa Hub", "lat": -4.05, "lng": 39.67}])
+    db.session.expire_all()
+    assert db.session.get(Parcel, near.id).current_geohash == geohash_encode(-4.05, 39.67)
+
+    box = client.get('/admin/parcels/within?south=-4.1&west=39.6&north=-4.0&east=39.7', headers=headers)
+    assert near.id in [p["id"] for p in box.get_json()["parcels"]]
+    assert client.get('/admin/parcels/nearby?lat=abc&lng=1', headers=headers).status_code == 400
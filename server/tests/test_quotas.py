@@ -0,0 +1,106 @@
+"""Tests for cost-weighted per-user quotas."""
+import time
+import jwt
+from server.config import db, quotas
+from server.models import QuotaBucket
+from server.quotas import DatabaseQuotaBackend
+from server.tests.test_parcels import create_admin_user, create_normal_user, create_parcel, get_token
+
+
+def auth(client, user):
+    return {"Authorization": f"Bearer {get_token(client, user)}"}
+
+
+def test_responses_carry_quota_headers_and_row_cost(client):
+    owner = create_normal_user()
+    for _ in range(5):
+        create_parcel(owner)
+    response = client.get('/admin/parcels', headers=auth(client, create_admin_user()))
+
+    rows = len(response.get_json())
+    assert float(response.headers["X-RateLimit-Cost"]) == 1 + rows * quotas.costs['row']
+    assert response.headers["X-RateLimit-Limit"] == str(quotas.roles['admin']['capacity'])
+    assert int(response.headers["X-RateLimit-Remaining"]) < quotas.roles['admin']['capacity']
+    assert "X-RateLimit-Cost" not in client.get('/').headers  # anonymous: limiter only
+
+    cross_origin = client.get('/admin/parcels', headers=dict(auth(client, create_admin_user()),
+                                                             Origin="https://app.example.com"))
+    exposed = cross_origin.headers["Access-Control-Expose-Headers"]
+    assert all(name in exposed for name in ("X-RateLimit-Remaining", "X-RateLimit-Cost", "Retry-After"))
+
+
+def test_expensive_client_is_throttled_while_others_keep_reading(client, monkeypatch):
+    monkeypatch.setitem(quotas.roles, 'admin', {'capacity': 10, 'refill': 0.01})
+    monkeypatch.setitem(quotas.costs, 'row', 1)
+    owner = create_normal_user()
+    parcel = create_parcel(owner)
+    for _ in range(10):
+        create_parcel(owner)
+    heavy = auth(client, create_admin_user())
+
+    export = client.get('/admin/parcels?format=ndjson', headers=heavy)
+    assert export.status_code == 200 and export.data  # charged row by row while streaming
+
+    throttled = client.get('/admin/stats', headers=heavy)
+    assert throttled.status_code == 429
+    assert int(throttled.headers["Retry-After"]) > 0
+    assert throttled.headers["X-RateLimit-Remaining"] == "0"
+
+    reader = auth(client, owner)
+    for _ in range(3):
+        assert client.get(f'/parcels/{parcel.id}', headers=reader).status_code == 200
+
+
+def test_bulk_items_are_charged(client, monkeypatch):
+    monkeypatch.setitem(quotas.costs, 'item', 2)
+    user = create_normal_user()
+    items = [{
+        "pickupLocationText": "Westlands", "destinationLocationText": "Kilimani",
+        "pickup_latitude": -1.2676, "pickup_longitude": 36.8108,
+        "destination_latitude": -1.2921, "destination_longitude": 36.7856,
+        "weight": "2.5", "description": "Quota parcel",
+    }] * 3
+    response = client.post('/parcels/bulk', json=items, headers=auth(client, user))
+    assert response.status_code == 201
+    assert float(response.headers["X-RateLimit-Cost"]) >= 1 + 3 * 2
+
+
+def test_database_backend_refills_up_to_capacity(client):
+    backend = DatabaseQuotaBackend()
+    assert backend.spend({'test:1': (3, 10, 1)}, now=100.0) == {'test:1': 7}
+    assert backend.spend({'test:1': (0, 10, 1)}, now=102.0) == {'test:1': 9}
+    assert backend.spend({'test:1': (25, 10, 1)}, now=500.0) == {'test:1': -15}
+    # A stale clock never refills backwards.
+    assert backend.spend({'test:1': (0, 10, 1)}, now=400.0) == {'test:1': -15}
+
+
+def test_unverified_tokens_are_never_charged(client):
+    user = create_normal_user()
+    token = get_token(client, user)
+    forged = token[:-4] + ("AAAA" if not token.endswith("AAAA") else "BBBB")
+    response = client.get('/parcels', headers={"Authorization": f"Bearer {forged}"})
+    assert response.status_code in (401, 422)
+    assert "X-RateLimit-Cost" not in response.headers
+
+
+def test_only_verified_requests_write_bucket_rows(client, monkeypatch):
+    backend = DatabaseQuotaBackend()
+    monkeypatch.setattr(quotas, 'backend', backend)
+    monkeypatch.setattr(quotas, '_buckets', {})
+    for n in range(5):
+        forged = jwt.encode({'sub': f'forged{n}', 'type': 'access'}, 'not-the-secret', algorithm='HS256')
+        assert client.get('/parcels', headers={"Authorization": f"Bearer {forged}"}).status_code in (401, 422)
+    quotas.sync()
+    assert db.session.query(QuotaBucket).filter(QuotaBucket.identity.like('%forged%')).count() == 0
+
+    user = create_normal_user()
+    assert client.get('/parcels', headers=auth(client, user)).status_code == 200
+    quotas.sync()
+    identity = f"user:{user.id}"
+    assert db.session.get(QuotaBucket, identity) is not None
+
+    # Purged once refilled; a missing bucket reads as full.
+    backend.purge(quotas.roles, now=time.time() + 3600)
+    db.session.expire_all()
+    assert db.session.get(QuotaBucket, identity) is None
+    assert backend.peek(identity, 300, 1, time.time()) == 300
@@ -0,0 +1,59 @@
+"""Tests for the shared sliding-window rate-limit storage and per-route limits."""
+import itertools
+from server import ratelimit
+from server.models import RateLimitWindow
+from server.ratelimit import SlidingWindowStorage
+from server.tests.test_parcels import create_normal_user
+
+
+def test_workers_share_one_limit_through_the_database(client):
+    workers = [SlidingWindowStorage(sync_seconds=0) for _ in range(2)]
+    accepted = sum(
+        worker.acquire_entry('test/shared', 10, 3600)
+        for worker in itertools.islice(itertools.cycle(workers), 30)
+    )
+    # Each worker may hold one unflushed hit the other has not seen yet.
+    assert 10 <= accepted <= 11
+    assert RateLimitWindow.query.filter_by(key='test/shared').one().hits == accepted
+
+    newcomer = SlidingWindowStorage(sync_seconds=0)
+    assert not newcomer.acquire_entry('test/shared', 10, 3600)
+    assert newcomer.get_moving_window('test/shared', 10, 3600)[1] >= 10
+
+
+def test_previous_window_is_weighted_by_overlap(client, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(ratelimit.time, 'time', lambda: now[0])
+    storage = SlidingWindowStorage(sync_seconds=3600)
+
+    assert sum(storage.acquire_entry('test/slide', 10, 100) for _ in range(15)) == 10
+    now[0] = 1050.0
+    assert not storage.acquire_entry('test/slide', 10, 100)
+
+    # Half of the previous window still overlaps: 10 * 0.5 hits remain in use.
+    now[0] = 1150.0
+    assert sum(storage.acquire_entry('test/slide', 10, 100) for _ in range(10)) == 5
+
+
+def test_batched_hits_reach_the_database_on_sync(client):
+    storage = SlidingWindowStorage(sync_seconds=3600)
+    for _ in range(4):
+        assert storage.acquire_entry('test/batch', 100, 3600)
+    # The first hit went to the database; the rest wait for the next sync.
+    assert RateLimitWindow.query.filter_by(key='test/batch').one().hits == 1
+    storage.sync()
+    assert RateLimitWindow.query.filter_by(key='test/batch').one().hits == 4
+
+
+def test_route_limits_come_from_config(client):
+    user = create_normal_user()
+    routes = client.application.config['RATELIMIT_ROUTES']
+    routes['login'] = '2 per minute'
+    try:
+        codes = [
+            client.post('/login', json={"username": user.username, "password": "userpass123"}).status_code
+            for _ in range(3)
+        ]
+    finally:
+        routes.pop('login')
+    assert codes == [200, 200, 429]
@@ -0,0 +1,83 @@
+"""Tests for courier route planning and the route endpoint."""
+import random
+from server.models import db, Parcel
+from server.services.route_plan import Stop, plan_cache, plan_route, travel_matrix
+from server.services.routing import FakeRoutingProvider, Router
+from server.tests.test_parcels import create_admin_user, create_normal_user, create_parcel, get_token
+
+
+def random_manifest(rng, parcels):
+    stops = []
+    for pid in range(parcels):
+        stops.append(Stop(pid, 'pickup', rng.uniform(-0.1, 0.1), rng.uniform(-0.1, 0.1)))
+        stops.append(Stop(pid, 'delivery', rng.uniform(-0.1, 0.1), rng.uniform(-0.1, 0.1)))
+    return stops
+
+
+def pickups_come_first(plan):
+    picked = set()
+    for stop in plan.stops:
+        if stop.kind == 'pickup':
+            picked.add(stop.parcel_id)
+        elif stop.parcel_id not in picked:
+            return False
+    return True
+
+
+def test_plan_keeps_pickups_before_deliveries_and_improves():
+    stops = random_manifest(random.Random(3), 60)
+
+    greedy = plan_route(stops, start=(0.0, 0.0), improve_seconds=0)
+    improved = plan_route(stops, start=(0.0, 0.0), improve_seconds=5)
+    assert sorted(improved.stops) == sorted(stops)
+    assert pickups_come_first(greedy) and pickups_come_first(improved)
+    assert improved.duration_s <= greedy.duration_s
+    assert improved.duration_s == sum(t for _, t in improved.legs)
+
+
+def test_on_board_parcels_only_need_delivering():
+    stops = [Stop(1, 'delivery', 0.0, 0.02), Stop(2, 'pickup', 0.0, 0.01), Stop(2, 'delivery', 0.0, 0.03)]
+
+    plan = plan_route(stops, start=(0.0, 0.0))
+    assert [(s.parcel_id, s.kind) for s in plan.stops] == [(2, 'pickup'), (1, 'delivery'), (2, 'delivery')]
+
+
+def test_matrix_looks_up_each_distinct_location_pair_once(client):
+    provider = FakeRoutingProvider(distance_m=500, duration_s=60)
+    points = [(0.0, 0.0), (0.0, 0.00001), (1.0, 1.0), (2.0, 2.0)]
+
+    distance, duration = travel_matrix(points, Router(primary=provider))
+    assert provider.calls == 6  # three distinct locations
+    assert distance[0][1] == 0 and distance[0][2] == 500 and duration[3][1] == 60
+
+
+def test_route_endpoint_caches_until_a_parcel_changes(client):
+    plan_cache.clear()
+    admin = create_admin_user()
+    owner = create_normal_user()
+    parcels = [create_parcel(owner) for _ in range(3)]
+    for parcel in parcels:
+        parcel.courier_id = 77
+    parcels[2].status = 'in transit'
+    parcels[2].destination_latitude = None
+    db.session.commit()
+    headers = {"Authorization": f"Bearer {get_token(client, admin)}"}
+
+    response = client.get('/admin/couriers/77/route?lat=-1.29&lng=36.82', headers=headers)
+    body = response.get_json()
+    assert response.status_code == 200
+    assert body["cached"] is False
+    assert body["skipped"] == [parcels[2].id]
+    assert [s["kind"] for s in body["stops"]][:2] == ['pickup', 'pickup']
+    assert [s["sequence"] for s in body["stops"]] == [1, 2, 3, 4]
+
+    again = client.get('/admin/couriers/77/route?lat=-1.29&lng=36.82', headers=headers).get_json()
+    assert again["cached"] is True and again["stops"] == body["stops"]
+
+    db.session.get(Parcel, parcels[0].id).status = 'in transit'
+    db.session.commit()
+    changed = client.get('/admin/couriers/77/route?lat=-1.29&lng=36.82', headers=headers).get_json()
+    assert changed["cached"] is False
+    assert len(changed["stops"]) == 3
+
+    assert client.get('/admin/couriers/77/route?lat=abc', headers=headers).status_code == 400
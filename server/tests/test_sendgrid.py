@@ -0,0 +1,57 @@
+"""Tests for the pooled SendGrid client against the local stub server."""
+import time
+import pytest
+from server.services.sendgrid_service import SendGridService
+from server.services.sendgrid_stub import SendGridStub
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    monkeypatch.setenv('SENDGRID_API_KEY', 'test-key')
+    with SendGridStub() as server:
+        yield server
+
+
+def test_bulk_send_packs_recipients_into_one_request(stub):
+    service = SendGridService(base_url=stub.url)
+    recipients = [
+        {'email': f'user{i}@deliveroo.com', 'substitutions': {'-username-': f'user{i}'}}
+        for i in range(25)
+    ]
+
+    results = service.send_bulk("Your digest", "<p>Hi -username-</p>", recipients, "Hi -username-")
+
+    assert results == [True] * 25
+    assert len(stub.requests) == 1
+    request = stub.requests[0]
+    assert len(request['personalizations']) == 25
+    assert request['personalizations'][3]['substitutions'] == {'-username-': 'user3'}
+    assert [c['type'] for c in request['content']] == ['text/plain', 'text/html']
+
+
+def test_sequential_sends_reuse_one_connection(stub):
+    service = SendGridService(base_url=stub.url)
+
+    for i in range(5):
+        assert service.deliver(f'user{i}@deliveroo.com', "Hi", "<p>Hi</p>")
+
+    assert len(stub.requests) == 5
+    assert len(stub.connections) == 1
+
+
+def test_bulk_send_is_throttled_per_recipient(stub):
+    # Rate 97 so no other test shares this process-wide bucket.
+    service = SendGridService(base_url=stub.url, max_emails_per_second=97)
+    recipients = [f'user{i}@deliveroo.com' for i in range(150)]
+
+    began = time.monotonic()
+    assert service.send_bulk("Hi", "<p>Hi</p>", recipients) == [True] * 150
+    # A full bucket covers 97 recipients; the other 53 wait for the refill.
+    assert time.monotonic() - began >= (150 - 97) / 97 * 0.9
+
+
+def test_rejected_request_fails_every_recipient(monkeypatch):
+    monkeypatch.setenv('SENDGRID_API_KEY', 'test-key')
+    with SendGridStub(status=400) as server:
+        service = SendGridService(base_url=server.url)
+        assert service.send_bulk("Hi", "<p>Hi</p>", ['a@deliveroo.com', 'b@deliveroo.com']) == [False, False]
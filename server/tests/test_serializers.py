@@ -0,0 +1,34 @@
+"""Tests for the compiled model serializers."""
+import pytest
+from server.models import db, User, Parcel
+from server.serializers import serializer_for
+
+
+def make_parcel():
+    user = User(username="ser_user", email="ser_user@deliveroo.com", phone_number="0700000042")
+    user.password = "userpass123"
+    db.session.add(user)
+    db.session.commit()
+    parcel = Parcel(user_id=user.id, description="Serialized", weight=1.0, cost=150.0)
+    db.session.add(parcel)
+    db.session.commit()
+    return parcel
+
+
+def test_to_dict_matches_columns_and_formats_datetimes(client):
+    parcel = make_parcel()  # committed, so every attribute is expired
+
+    data = parcel.to_dict()
+
+    assert set(data) == {c.name for c in Parcel.__table__.c}
+    assert data["description"] == "Serialized"
+    assert data["created_at"] == parcel.created_at.isoformat()
+    assert parcel.to_dict() == data  # loaded path agrees with the expired path
+
+
+def test_column_subset(client):
+    parcel = Parcel.query.first()
+
+    assert parcel.to_dict(columns=("id", "status")) == {"id": parcel.id, "status": parcel.status}
+    with pytest.raises(ValueError):
+        serializer_for(Parcel, ("id", "no_such_column"))